@@ -2,16 +2,50 @@
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import bisect
+import collections
+import dataclasses
+import hashlib
+import heapq
+import itertools
+import json
 import logging
 import logging.config
 import os
 import pathlib
 import site
+import socket
+import subprocess
 import sys
+import threading
+import time
+import urllib.parse
+from typing import IO, Any, Sequence
 
 BUNDLE_DIR = pathlib.Path(__file__).parent.parent
 logger = logging.getLogger(__name__)
 
+# The number of `ruff-lsp` processes to start. With more than one worker, this script
+# runs a proxy that assigns each document to one of the workers.
+WORKERS_ENV = "RUFF_LSP_WORKERS"
+
+# The number of `ruff` results to cache. Caching is disabled by default.
+CACHE_SIZE_ENV = "RUFF_LSP_CACHE_SIZE"
+
+# The number of "Fix All" and "Organize Imports" edits to cache. Caching is disabled by
+# default.
+CODE_ACTION_CACHE_SIZE_ENV = "RUFF_LSP_CODE_ACTION_CACHE_SIZE"
+
+# The maximum number of concurrent `ruff` processes. Defaults to the number of CPUs;
+# `0` removes the limit.
+MAX_CONCURRENCY_ENV = "RUFF_LSP_MAX_CONCURRENCY"
+
+# The notification the extension sends with the URIs of the documents that are visible
+# in an editor.
+VISIBLE_DOCUMENTS_METHOD = "ruff/visibleDocuments"
+
 
 def update_sys_path(path_to_add: str) -> None:
     """Add given path to `sys.path`."""
@@ -25,9 +59,8 @@ def update_sys_path(path_to_add: str) -> None:
         site.addsitedir(path_to_add)
 
 
-def main():
-    from ruff_lsp import server
-
+def configure_logging() -> None:
+    """Log to stderr, which is captured by the extension's output channel."""
     logging.config.dictConfig(
         {
             "version": 1,
@@ -53,15 +86,1254 @@ def main():
         }
     )
 
+
+def main():
+    from ruff_lsp import server
+
     if not hasattr(server, "set_bundle"):
         raise RuntimeError("ruff-vscode needs at least ruff-lsp v0.0.6")
 
     server.set_bundle(os.fspath(BUNDLE_DIR / "libs" / "bin" / server.TOOL_MODULE))
+
+    max_concurrency = int_from_env(MAX_CONCURRENCY_ENV, os.cpu_count() or 1)
+    if max_concurrency > 0:
+        install_run_pool(server, max_concurrency)
+
+    # Install the cache last, so that cached results don't wait for the pool.
+    cache_size = int_from_env(CACHE_SIZE_ENV, 0)
+    if cache_size > 0:
+        install_run_cache(server, cache_size)
+
+    code_action_cache_size = int_from_env(CODE_ACTION_CACHE_SIZE_ENV, 0)
+    if code_action_cache_size > 0:
+        install_code_action_cache(server, code_action_cache_size)
+
     server.start()
 
 
+def int_from_env(name: str, default: int) -> int:
+    """Return the integer value of the environment variable `name`."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+def _document_path(argv: Sequence[str]) -> str | None:
+    """Return the path of the document that `ruff` is run on, if any."""
+    if "--stdin-filename" not in argv:
+        return None
+    return argv[argv.index("--stdin-filename") + 1]
+
+
+###
+# Run pool.
+###
+
+
+class RunPool:
+    """Limits the number of concurrent `ruff` processes.
+
+    Runs that can't start immediately wait in a queue ordered by priority, then by
+    arrival. Saturation is reported when runs start waiting, along with a summary once
+    the queue drains.
+    """
+
+    def __init__(self, size: int, log: Any) -> None:
+        self._size = size
+        self._log = log
+        self._running = 0
+        self._queue: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._sequence = itertools.count()
+        self._saturated_since: float | None = None
+        self._waited = 0
+        self._peak_queue = 0
+
+    async def acquire(self, priority: int) -> None:
+        """Wait for a slot; lower values of `priority` are served first."""
+        if self._running < self._size and not self._queue:
+            self._running += 1
+            return
+
+        if self._saturated_since is None:
+            self._saturated_since = time.monotonic()
+            self._log(
+                f"All {self._size} ruff process slots are in use; "
+                f"queuing runs (set {MAX_CONCURRENCY_ENV} to change the limit)"
+            )
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        self._waited += 1
+        self._peak_queue = max(self._peak_queue, len(self._queue))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled runs stay in the queue and are skipped by `release`, unless the
+            # slot was handed over before the cancellation arrived.
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Hand the slot over to the next queued run, if any."""
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._running -= 1
+        if self._saturated_since is not None:
+            self._log(
+                f"Ruff process queue drained after "
+                f"{time.monotonic() - self._saturated_since:.2f}s: {self._waited} runs "
+                f"waited, at most {self._peak_queue} at once"
+            )
+            self._saturated_since = None
+            self._waited = 0
+            self._peak_queue = 0
+
+
+def install_run_pool(server: Any, size: int) -> None:
+    """Limit the number of `ruff` processes that `ruff-lsp` runs at once.
+
+    Runs for documents that are visible in an editor are started before runs for
+    documents in the background.
+    """
+    pool = RunPool(size, server.log_to_output)
+    visible_paths: set[str] = set()
+    run_path = server.run_path
+
+    @server.LSP_SERVER.feature(VISIBLE_DOCUMENTS_METHOD)
+    def visible_documents(params: Any) -> None:
+        uris = params.get("uris") if isinstance(params, dict) else params.uris
+        visible_paths.clear()
+        for uri in uris:
+            # Match the paths that `ruff-lsp` passes to `--stdin-filename`.
+            path = server.uris.to_fs_path(uri)
+            if path is not None:
+                visible_paths.add(path)
+
+    async def pooled_run_path(
+        program: str,
+        argv: Sequence[str],
+        *,
+        source: str,
+        cwd: str | None = None,
+    ) -> Any:
+        path = _document_path(argv)
+        await pool.acquire(0 if path is None or path in visible_paths else 1)
+        try:
+            return await run_path(program, argv, source=source, cwd=cwd)
+        finally:
+            pool.release()
+
+    server.run_path = pooled_run_path
+    logger.info(f"Running up to {size} ruff processes at once")
+
+
+###
+# Run cache.
+###
+
+# Files that can change the result of running `ruff` on a file in the same directory
+# or below it.
+CONFIG_FILE_NAMES = ("pyproject.toml", "ruff.toml", ".ruff.toml", ".gitignore")
+
+
+class LRUCache:
+    """A bounded cache that evicts the least recently used entry when it's full."""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._entries: collections.OrderedDict[tuple[Any, ...], Any] = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[Any, ...]) -> Any | None:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple[Any, ...], value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+
+class RunCache(LRUCache):
+    """A bounded LRU cache of the results of running `ruff` on a document.
+
+    The key includes everything that can change the result: the executable, the
+    arguments (which include the settings and the document's path), the working
+    directory, a hash of the document's contents, and the modification times of the
+    configuration files that apply to the document.
+    """
+
+    def key(
+        self, program: str, argv: Sequence[str], source: str, cwd: str | None
+    ) -> tuple[Any, ...] | None:
+        """Return the cache key for a run, or `None` if the run can't be cached."""
+        path = _document_path(argv)
+        if path is None:
+            return None
+        executable = _modification_time(program)
+        if executable is None:
+            return None
+        return (
+            program,
+            executable,
+            tuple(argv),
+            cwd,
+            hashlib.sha256(source.encode("utf-8")).hexdigest(),
+            tuple(
+                _modification_time(config_file)
+                for config_file in _config_files(path, argv, cwd)
+            ),
+        )
+
+
+def _modification_time(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _config_files(path: str, argv: Sequence[str], cwd: str | None) -> list[str]:
+    """Return the configuration files that may apply to the document at `path`."""
+    config_files = []
+
+    # Files passed with `--config`, unless the argument is an inline setting.
+    for index, arg in enumerate(argv):
+        if arg == "--config" and index + 1 < len(argv):
+            value = argv[index + 1]
+        elif arg.startswith("--config="):
+            value = arg[len("--config=") :]
+        else:
+            continue
+        config_files.append(os.path.join(cwd or os.getcwd(), value))
+
+    # Files in the document's directory and its ancestors.
+    directory = pathlib.Path(os.path.abspath(path)).parent
+    for ancestor in (directory, *directory.parents):
+        config_files.extend(os.fspath(ancestor / name) for name in CONFIG_FILE_NAMES)
+
+    # The user-level configuration.
+    user_config_dirs = [
+        os.getenv("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"),
+        os.path.expanduser("~/Library/Application Support"),
+    ]
+    if os.getenv("APPDATA"):
+        user_config_dirs.append(os.environ["APPDATA"])
+    for user_config_dir in user_config_dirs:
+        config_files.extend(
+            os.path.join(user_config_dir, "ruff", name) for name in CONFIG_FILE_NAMES
+        )
+
+    return config_files
+
+
+def install_run_cache(server: Any, size: int) -> None:
+    """Cache the results of the `ruff` invocations of `ruff-lsp`."""
+    cache = RunCache(size)
+    run_path = server.run_path
+
+    async def cached_run_path(
+        program: str,
+        argv: Sequence[str],
+        *,
+        source: str,
+        cwd: str | None = None,
+    ) -> Any:
+        key = cache.key(program, argv, source, cwd)
+        if key is None:
+            return await run_path(program, argv, source=source, cwd=cwd)
+
+        result = cache.get(key)
+        if result is not None:
+            server.log_to_output(
+                f"Using cached result for {program} {argv} "
+                f"(cache hits: {cache.hits}, misses: {cache.misses})"
+            )
+            return result
+
+        result = await run_path(program, argv, source=source, cwd=cwd)
+        # An exit code of 2 indicates an error, which may be transient.
+        if result.exit_code in (0, 1):
+            cache.put(key, result)
+            server.log_to_output(
+                f"Cached result for {program} {argv} "
+                f"(cache hits: {cache.hits}, misses: {cache.misses})"
+            )
+        return result
+
+    server.run_path = cached_run_path
+    logger.info(f"Caching up to {size} ruff results")
+
+
+###
+# Code action cache.
+###
+
+
+def install_code_action_cache(server: Any, size: int) -> None:
+    """Cache the edits of "Fix All" and "Organize Imports".
+
+    With resolve support, `ruff-lsp` lists these actions without edits and runs `ruff`
+    whenever one is resolved, e.g., every time the editor previews it, and again when
+    it runs on save. The edits are cached per version of the document instead.
+
+    The key includes the document's version, a hash of its contents, the settings, and
+    the rules that are fixed, so an edit is never reused after the document or the
+    settings changed.
+    """
+    cache = LRUCache(size)
+    fix_document_impl = server._fix_document_impl
+
+    async def cached_fix_document_impl(
+        document: Any, settings: Any, *, only: Sequence[str] | None = None
+    ) -> Any:
+        key = (
+            document.uri,
+            document.version,
+            hashlib.sha256(document.source.encode("utf-8")).hexdigest(),
+            json.dumps(settings, sort_keys=True, default=str),
+            None if only is None else tuple(only),
+        )
+        edit = cache.get(key)
+        if edit is not None:
+            server.log_to_output(
+                f"Using cached edit for {document.uri} "
+                f"(cache hits: {cache.hits}, misses: {cache.misses})"
+            )
+            return edit
+
+        edit = await fix_document_impl(document, settings, only=only)
+        # `None` means that there's nothing to fix or that `ruff` failed, which may be
+        # transient.
+        if edit is not None:
+            cache.put(key, edit)
+        return edit
+
+    # Like `run_path`, `ruff-lsp` looks the function up whenever it's called.
+    server._fix_document_impl = cached_fix_document_impl
+    logger.info(f"Caching up to {size} code action edits")
+
+
+###
+# Sharding.
+###
+
+
+def read_message(stream: IO[bytes]) -> dict[str, Any] | None:
+    """Read a JSON-RPC message from `stream`, or `None` at the end of the stream."""
+    content_length: int | None = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if content_length is None:
+                # Skip blank lines between messages.
+                continue
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value)
+
+    body = stream.read(content_length)
+    if len(body) < content_length:
+        return None
+    return json.loads(body)
+
+
+def write_message(stream: IO[bytes], message: dict[str, Any]) -> None:
+    """Write a JSON-RPC message to `stream`."""
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    stream.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    stream.flush()
+
+
+def document_key(message: dict[str, Any]) -> str | None:
+    """Return the key used to assign the document targeted by `message` to a worker.
+
+    The key is the path of the document's URI, which is shared by a notebook and its
+    cells. Returns `None` for messages that don't target a single document.
+    """
+    params = message.get("params")
+    if not isinstance(params, dict):
+        return None
+
+    uri: object = None
+    for field in ("textDocument", "notebookDocument"):
+        document = params.get(field)
+        if isinstance(document, dict):
+            uri = document.get("uri")
+            break
+    else:
+        method = message.get("method")
+        if method == "workspace/executeCommand":
+            arguments = params.get("arguments") or []
+            if arguments and isinstance(arguments[0], dict):
+                uri = arguments[0].get("uri")
+        elif method == "codeAction/resolve":
+            # `ruff-lsp` stores the document URI in the code action's data.
+            uri = params.get("data")
+
+    if not isinstance(uri, str):
+        return None
+    return urllib.parse.unquote(urllib.parse.urlsplit(uri).path)
+
+
+class HashRing:
+    """Assigns keys to workers using consistent hashing."""
+
+    def __init__(self, workers: int, replicas: int = 64) -> None:
+        ring = sorted(
+            (_stable_hash(f"{worker}:{replica}"), worker)
+            for worker in range(workers)
+            for replica in range(replicas)
+        )
+        self._hashes = [hash_ for hash_, _ in ring]
+        self._workers = [worker for _, worker in ring]
+
+    def worker(self, key: str) -> int:
+        """Return the index of the worker that owns `key`."""
+        index = bisect.bisect(self._hashes, _stable_hash(key)) % len(self._hashes)
+        return self._workers[index]
+
+
+def _stable_hash(value: str) -> int:
+    # The built-in `hash` is randomized per process.
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+
+
+@dataclasses.dataclass
+class PendingRequest:
+    """A client request that was forwarded to one or more workers."""
+
+    workers: set[int]
+    """The workers that haven't responded yet."""
+
+    responses: list[dict[str, Any]] = dataclasses.field(default_factory=list)
+    """The responses received so far."""
+
+
+def merge_responses(responses: list[dict[str, Any]]) -> dict[str, Any]:
+    """Merge the responses of all workers to a request that was sent to every worker."""
+    results = [response for response in responses if "error" not in response]
+    if not results:
+        return responses[0]
+    if all(isinstance(response.get("result"), list) for response in results):
+        return {
+            **results[0],
+            "result": [item for response in results for item in response["result"]],
+        }
+    # Responses to lifecycle requests such as `initialize` are identical for all
+    # workers.
+    return results[0]
+
+
+class ShardedServer:
+    """Fronts several `ruff-lsp` workers over a single stdio connection.
+
+    Requests and notifications for a document are routed to the worker that owns the
+    document, which also publishes its diagnostics. Messages that don't target a single
+    document are sent to every worker, and their responses are merged.
+    """
+
+    def __init__(
+        self,
+        command: Sequence[str],
+        workers: int,
+        client_in: IO[bytes],
+        client_out: IO[bytes],
+    ) -> None:
+        self._ring = HashRing(workers)
+        self._client_in = client_in
+        self._client_out = client_out
+        self._client_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._exiting = threading.Event()
+        self._requests: dict[int | str, PendingRequest] = {}
+        self._worker_requests: dict[str, tuple[int, int | str]] = {}
+
+        env = {**os.environ, WORKERS_ENV: "1"}
+        self._workers = [
+            subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env
+            )
+            for _ in range(workers)
+        ]
+        self._worker_locks = [threading.Lock() for _ in self._workers]
+        logger.info(f"Started {workers} ruff-lsp workers")
+
+    def serve(self) -> int:
+        """Forward messages until the client exits, returning the exit code."""
+        for index in range(len(self._workers)):
+            threading.Thread(
+                target=self._forward_worker_messages, args=(index,), daemon=True
+            ).start()
+
+        while not self._exiting.is_set():
+            message = read_message(self._client_in)
+            if message is None:
+                self._exiting.set()
+                break
+            self._handle_client_message(message)
+
+        return self._wait_for_workers()
+
+    def _handle_client_message(self, message: dict[str, Any]) -> None:
+        method = message.get("method")
+        if method is None:
+            # A response to a request sent by a worker.
+            with self._lock:
+                target = self._worker_requests.pop(message.get("id"), None)
+            if target is not None:
+                index, request_id = target
+                self._send_to_worker(index, {**message, "id": request_id})
+            return
+
+        if method == "$/cancelRequest":
+            with self._lock:
+                request = self._requests.get(message["params"]["id"])
+                workers = sorted(request.workers) if request else []
+        else:
+            key = document_key(message)
+            if key is None:
+                workers = list(range(len(self._workers)))
+            else:
+                workers = [self._ring.worker(key)]
+
+            if "id" in message:
+                with self._lock:
+                    self._requests[message["id"]] = PendingRequest(set(workers))
+            elif method == "exit":
+                self._exiting.set()
+
+        for index in workers:
+            self._send_to_worker(index, message)
+
+    def _forward_worker_messages(self, index: int) -> None:
+        stdout = self._workers[index].stdout
+        assert stdout is not None
+        while True:
+            message = read_message(stdout)
+            if message is None:
+                break
+            if "method" not in message:
+                self._handle_worker_response(index, message)
+            elif "id" in message:
+                self._handle_worker_request(index, message)
+            else:
+                self._send_to_client(message)
+
+        if not self._exiting.is_set():
+            # Exit so that the client notices the failure and restarts the server.
+            logger.error(f"ruff-lsp worker {index} exited unexpectedly")
+            for worker in self._workers:
+                worker.kill()
+            os._exit(1)
+
+    def _handle_worker_response(self, index: int, message: dict[str, Any]) -> None:
+        with self._lock:
+            request = self._requests.get(message.get("id"))
+            if request is None:
+                return
+            request.workers.discard(index)
+            request.responses.append(message)
+            if request.workers:
+                return
+            del self._requests[message["id"]]
+        self._send_to_client(merge_responses(request.responses))
+
+    def _handle_worker_request(self, index: int, message: dict[str, Any]) -> None:
+        if index != 0 and message["method"] in (
+            "client/registerCapability",
+            "client/unregisterCapability",
+        ):
+            # All workers register the same capabilities; forward the first worker's.
+            self._send_to_worker(
+                index, {"jsonrpc": "2.0", "id": message["id"], "result": None}
+            )
+            return
+
+        # Request IDs are only unique per worker.
+        client_id = f"ruff-worker-{index}-{message['id']}"
+        with self._lock:
+            self._worker_requests[client_id] = (index, message["id"])
+        self._send_to_client({**message, "id": client_id})
+
+    def _send_to_client(self, message: dict[str, Any]) -> None:
+        with self._client_lock:
+            write_message(self._client_out, message)
+
+    def _send_to_worker(self, index: int, message: dict[str, Any]) -> None:
+        stdin = self._workers[index].stdin
+        assert stdin is not None
+        try:
+            with self._worker_locks[index]:
+                write_message(stdin, message)
+        except OSError as error:
+            logger.error(f"Failed to send message to ruff-lsp worker {index}: {error}")
+
+    def _wait_for_workers(self, timeout: float = 5) -> int:
+        exit_code = 0
+        for worker in self._workers:
+            try:
+                exit_code = max(exit_code, worker.wait(timeout))
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                exit_code = 1
+        return exit_code
+
+
+def worker_count() -> int:
+    """Return the number of workers configured by the `RUFF_LSP_WORKERS` variable."""
+    return max(int_from_env(WORKERS_ENV, 1), 1)
+
+
+###
+# Sharing a server between editor windows.
+###
+
+# How long a shared server keeps running after the last window disconnected.
+SHARED_SERVER_IDLE_TIMEOUT = 300
+
+
+def offset_at(text: str, position: dict[str, int]) -> int:
+    """Return the index in `text` of an LSP position, whose characters are UTF-16 code
+    units."""
+    offset = 0
+    for _ in range(position["line"]):
+        newline = text.find("\n", offset)
+        if newline == -1:
+            return len(text)
+        offset = newline + 1
+
+    line_end = text.find("\n", offset)
+    if line_end == -1:
+        line_end = len(text)
+    units = position["character"]
+    while units > 0 and offset < line_end:
+        units -= 2 if ord(text[offset]) > 0xFFFF else 1
+        offset += 1
+    return offset
+
+
+def apply_text_changes(text: str, changes: list[dict[str, Any]]) -> str:
+    """Apply the content changes of a `textDocument/didChange` notification."""
+    for change in changes:
+        range_ = change.get("range")
+        if range_ is None:
+            text = change["text"]
+        else:
+            start = offset_at(text, range_["start"])
+            end = offset_at(text, range_["end"])
+            text = text[:start] + change["text"] + text[end:]
+    return text
+
+
+class SharedConnection:
+    """The connection of an editor window to a shared server."""
+
+    def __init__(self, index: int, connection: socket.socket) -> None:
+        self.index = index
+        self.reader = connection.makefile("rb")
+        self._writer = connection.makefile("wb")
+        self._connection = connection
+        self._lock = threading.Lock()
+
+    def send(self, message: dict[str, Any]) -> None:
+        try:
+            with self._lock:
+                write_message(self._writer, message)
+        except OSError:
+            # The window disconnected; its reader thread cleans up.
+            pass
+
+    def close(self) -> None:
+        try:
+            self._connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._connection.close()
+
+
+@dataclasses.dataclass
+class SharedDocument:
+    """A document that is open in one or more windows."""
+
+    owner: int
+    """The window whose contents the server has."""
+
+    versions: dict[int, tuple[int, str | None]]
+    """The version and text of the document in each window. Notebooks have no text."""
+
+    notebook: bool
+
+    cells: set[str] = dataclasses.field(default_factory=set)
+    """The URIs of a notebook's cells."""
+
+
+class SharedServer:
+    """Shares one language server between the editor windows of a project.
+
+    Windows connect over a Unix domain socket. The first window's `initialize` request
+    starts the session, and later windows receive the same result; `shutdown` and `exit`
+    only end a window's connection. Requests are forwarded with IDs that are unique per
+    window, and server requests go to the window that sent the last message.
+
+    A document that is open in several windows is only opened once in the server. When
+    another window changes it, or sends a request about it, the server receives that
+    window's full text first. Diagnostics are only sent to the windows whose text they
+    were computed for. The server shuts down once no window has been connected for
+    `idle_timeout` seconds.
+    """
+
+    def __init__(
+        self, command: Sequence[str], socket_path: str, idle_timeout: float
+    ) -> None:
+        self._command = command
+        self._socket_path = socket_path
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._server_lock = threading.RLock()
+        self._closing = False
+        self._clients: dict[int, SharedConnection] = {}
+        self._client_indices = itertools.count()
+        self._active_client: int | None = None
+        self._requests: dict[str, tuple[int, int | str]] = {}
+        self._initialize_response: dict[str, Any] | None = None
+        self._initialize_waiters: list[tuple[SharedConnection, int | str]] = []
+        self._initialized = False
+        self._registrations: dict[str, dict[str, Any]] = {}
+        self._registration_ids = itertools.count()
+        self._documents: dict[str, SharedDocument] = {}
+        self._cells: dict[str, str] = {}
+        self._process: subprocess.Popen[bytes] | None = None
+
+    def serve(self) -> int:
+        """Serve windows until the server is idle, returning the exit code."""
+        lock = _acquire_socket_lock(self._socket_path)
+        if lock is None:
+            return 0
+
+        with lock:
+            if os.path.exists(self._socket_path):
+                # Left behind by a shared server that didn't shut down cleanly.
+                os.unlink(self._socket_path)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            umask = os.umask(0o177)
+            try:
+                listener.bind(self._socket_path)
+            finally:
+                os.umask(umask)
+            listener.listen()
+
+            self._process = subprocess.Popen(
+                self._command, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+            logger.info(
+                f"Sharing {' '.join(self._command)} on {self._socket_path} "
+                f"(pid {self._process.pid})"
+            )
+            threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+            threading.Thread(target=self._forward_server_messages, daemon=True).start()
+
+            with self._changed:
+                while True:
+                    if self._clients:
+                        self._changed.wait()
+                    elif not self._changed.wait_for(
+                        lambda: self._clients, self._idle_timeout
+                    ):
+                        self._closing = True
+                        break
+
+            logger.info(
+                f"No window connected for {self._idle_timeout:.0f}s; shutting down"
+            )
+            listener.close()
+            os.unlink(self._socket_path)
+            return self._shutdown_server()
+
+    def _accept(self, listener: socket.socket) -> None:
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                if self._closing:
+                    connection.close()
+                    return
+                client = SharedConnection(next(self._client_indices), connection)
+                self._clients[client.index] = client
+                if self._active_client is None:
+                    self._active_client = client.index
+                self._changed.notify_all()
+            logger.info(f"Window {client.index} connected")
+            threading.Thread(
+                target=self._serve_client, args=(client,), daemon=True
+            ).start()
+
+    def _serve_client(self, client: SharedConnection) -> None:
+        try:
+            while True:
+                message = read_message(client.reader)
+                if message is None or message.get("method") == "exit":
+                    break
+                self._handle_client_message(client, message)
+        except (OSError, ValueError) as error:
+            logger.error(f"Failed to read from window {client.index}: {error}")
+        finally:
+            self._disconnect(client)
+
+    def _handle_client_message(
+        self, client: SharedConnection, message: dict[str, Any]
+    ) -> None:
+        method = message.get("method")
+        if method is None:
+            # A response to a server request; replayed registrations aren't answered
+            # to the server.
+            if not str(message.get("id")).startswith("shared-registration-"):
+                self._send_to_server(message)
+            return
+
+        with self._lock:
+            self._active_client = client.index
+
+        if "id" in message:
+            if method == "initialize":
+                self._initialize(client, message)
+            elif method == "shutdown":
+                client.send({"jsonrpc": "2.0", "id": message["id"], "result": None})
+            else:
+                server_id = f"shared-{client.index}-{message['id']}"
+                with self._lock:
+                    self._requests[server_id] = (client.index, message["id"])
+                # No other window can take the document over before the request.
+                with self._server_lock:
+                    for server_message in self._sync_request(client, message):
+                        self._send_to_server(server_message)
+                    self._send_to_server({**message, "id": server_id})
+        elif method == "initialized":
+            with self._lock:
+                initialized, self._initialized = self._initialized, True
+            if not initialized:
+                self._send_to_server(message)
+        elif method == "$/cancelRequest":
+            server_id = f"shared-{client.index}-{message['params']['id']}"
+            self._send_to_server({**message, "params": {"id": server_id}})
+        elif method.startswith(("textDocument/did", "notebookDocument/did")):
+            for server_message in self._sync_document(client, message):
+                self._send_to_server(server_message)
+        else:
+            self._send_to_server(message)
+
+    def _initialize(self, client: SharedConnection, message: dict[str, Any]) -> None:
+        with self._lock:
+            response = self._initialize_response
+            if response is None:
+                first = not self._initialize_waiters
+                self._initialize_waiters.append((client, message["id"]))
+        if response is not None:
+            logger.info(f"Window {client.index} joined the running server")
+            self._send_initialize_response(client, message["id"], response)
+        elif first:
+            self._send_to_server({**message, "id": "shared-initialize"})
+
+    def _send_initialize_response(
+        self,
+        client: SharedConnection,
+        request_id: int | str,
+        response: dict[str, Any],
+    ) -> None:
+        client.send({**response, "id": request_id})
+        with self._lock:
+            registrations = list(self._registrations.values())
+        for registration in registrations:
+            client.send(self._registration_request([registration]))
+
+    def _registration_request(
+        self, registrations: list[dict[str, Any]]
+    ) -> dict[str, Any]:
+        return {
+            "jsonrpc": "2.0",
+            "id": f"shared-registration-{next(self._registration_ids)}",
+            "method": "client/registerCapability",
+            "params": {"registrations": registrations},
+        }
+
+    def _sync_document(
+        self, client: SharedConnection, message: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        """Return the messages that bring the server up to date with `message`."""
+        method = message["method"]
+        params = message["params"]
+        is_notebook = method.startswith("notebookDocument/")
+        document = params["notebookDocument" if is_notebook else "textDocument"]
+        uri = document["uri"]
+
+        with self._lock:
+            shared = self._documents.get(uri)
+            if method.endswith("/didOpen"):
+                version = (document.get("version", 0), document.get("text"))
+                if shared is None:
+                    shared = SharedDocument(
+                        client.index, {client.index: version}, is_notebook
+                    )
+                    self._documents[uri] = shared
+                    if is_notebook:
+                        cells = {cell["uri"] for cell in params["cellTextDocuments"]}
+                        self._track_cells(uri, shared, cells, set())
+                    return [message]
+                # The server already has the document.
+                shared.versions[client.index] = version
+                return [] if is_notebook else self._take_over(uri, shared, client.index)
+
+            if shared is None or client.index not in shared.versions:
+                return [message]
+
+            if method.endswith("/didChange"):
+                if is_notebook:
+                    structure = params["change"].get("cells", {}).get("structure") or {}
+                    self._track_cells(
+                        uri,
+                        shared,
+                        {cell["uri"] for cell in structure.get("didOpen") or []},
+                        {cell["uri"] for cell in structure.get("didClose") or []},
+                    )
+                    return [message]
+                _, text = shared.versions[client.index]
+                text = apply_text_changes(text or "", params["contentChanges"])
+                shared.versions[client.index] = (document["version"], text)
+                if shared.owner != client.index:
+                    return self._take_over(uri, shared, client.index)
+                return [message]
+
+            if method.endswith("/didClose"):
+                del shared.versions[client.index]
+                if not shared.versions:
+                    self._forget(uri)
+                    return [message]
+                if shared.owner == client.index and not is_notebook:
+                    return self._take_over(uri, shared, next(iter(shared.versions)))
+                return []
+
+            return [message]
+
+    def _sync_request(
+        self, client: SharedConnection, message: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        """Return the messages that give the server the requesting window's text."""
+        params = message.get("params")
+        document = params.get("textDocument") if isinstance(params, dict) else None
+        if not isinstance(document, dict):
+            return []
+
+        with self._lock:
+            shared = self._documents.get(document.get("uri"))
+            if (
+                shared is None
+                or shared.notebook
+                or shared.owner == client.index
+                or client.index not in shared.versions
+            ):
+                return []
+            # Windows with the same text can share the owner's contents.
+            if shared.versions[client.index][1] == shared.versions[shared.owner][1]:
+                return []
+            return self._take_over(document["uri"], shared, client.index)
+
+    def _take_over(
+        self, uri: str, shared: SharedDocument, index: int
+    ) -> list[dict[str, Any]]:
+        """Replace the server's contents of `uri` with those of window `index`."""
+        shared.owner = index
+        version, text = shared.versions[index]
+        return [
+            {
+                "jsonrpc": "2.0",
+                "method": "textDocument/didChange",
+                "params": {
+                    "textDocument": {"uri": uri, "version": version},
+                    "contentChanges": [{"text": text}],
+                },
+            }
+        ]
+
+    def _track_cells(
+        self, uri: str, shared: SharedDocument, opened: set[str], closed: set[str]
+    ) -> None:
+        shared.cells |= opened
+        shared.cells -= closed
+        for cell in opened:
+            self._cells[cell] = uri
+        for cell in closed:
+            self._cells.pop(cell, None)
+
+    def _forget(self, uri: str) -> None:
+        shared = self._documents.pop(uri)
+        for cell in shared.cells:
+            self._cells.pop(cell, None)
+
+    def _disconnect(self, client: SharedConnection) -> None:
+        messages = []
+        with self._lock:
+            del self._clients[client.index]
+            if self._active_client == client.index:
+                self._active_client = next(iter(self._clients), None)
+            for uri, shared in list(self._documents.items()):
+                if client.index not in shared.versions:
+                    continue
+                del shared.versions[client.index]
+                if shared.versions:
+                    if shared.owner == client.index and not shared.notebook:
+                        messages.extend(
+                            self._take_over(uri, shared, next(iter(shared.versions)))
+                        )
+                    continue
+                # The last window with the document disconnected.
+                if shared.notebook:
+                    messages.append(
+                        {
+                            "jsonrpc": "2.0",
+                            "method": "notebookDocument/didClose",
+                            "params": {
+                                "notebookDocument": {"uri": uri},
+                                "cellTextDocuments": [
+                                    {"uri": cell} for cell in sorted(shared.cells)
+                                ],
+                            },
+                        }
+                    )
+                else:
+                    messages.append(
+                        {
+                            "jsonrpc": "2.0",
+                            "method": "textDocument/didClose",
+                            "params": {"textDocument": {"uri": uri}},
+                        }
+                    )
+                self._forget(uri)
+            self._changed.notify_all()
+
+        client.close()
+        for message in messages:
+            self._send_to_server(message)
+        logger.info(f"Window {client.index} disconnected")
+
+    def _forward_server_messages(self) -> None:
+        assert self._process is not None and self._process.stdout is not None
+        while True:
+            message = read_message(self._process.stdout)
+            if message is None:
+                break
+            if "method" not in message:
+                self._handle_server_response(message)
+            elif "id" in message:
+                self._handle_server_request(message)
+            elif message["method"] == "textDocument/publishDiagnostics":
+                self._send_to_clients(
+                    self._diagnostic_clients(message["params"]["uri"]), message
+                )
+            else:
+                self._send_to_clients(None, message)
+
+        if not self._closing:
+            # Exit so that the windows notice the failure and restart the server.
+            logger.error("The shared server exited unexpectedly")
+            os.unlink(self._socket_path)
+            os._exit(1)
+
+    def _handle_server_response(self, message: dict[str, Any]) -> None:
+        server_id = message.get("id")
+        if server_id == "shared-initialize":
+            with self._lock:
+                self._initialize_response = message
+                waiters, self._initialize_waiters = self._initialize_waiters, []
+            for client, request_id in waiters:
+                self._send_initialize_response(client, request_id, message)
+            return
+
+        with self._lock:
+            target = self._requests.pop(str(server_id), None)
+            client = self._clients.get(target[0]) if target else None
+        if client is not None and target is not None:
+            client.send({**message, "id": target[1]})
+
+    def _handle_server_request(self, message: dict[str, Any]) -> None:
+        method = message["method"]
+        with self._lock:
+            if method == "client/registerCapability":
+                for registration in message["params"]["registrations"]:
+                    self._registrations[registration["id"]] = registration
+            elif method == "client/unregisterCapability":
+                for unregistration in message["params"]["unregisterations"]:
+                    self._registrations.pop(unregistration["id"], None)
+            active = (
+                None
+                if self._active_client is None
+                else self._clients.get(self._active_client)
+            )
+            others = [
+                client for client in self._clients.values() if client is not active
+            ]
+
+        if active is None:
+            self._send_to_server(
+                {
+                    "jsonrpc": "2.0",
+                    "id": message["id"],
+                    "error": {"code": -32803, "message": "No window is connected"},
+                }
+            )
+            return
+
+        active.send(message)
+        if method in ("client/registerCapability", "client/unregisterCapability"):
+            # Every window needs the same capabilities.
+            for client in others:
+                client.send(
+                    {
+                        **message,
+                        "id": f"shared-registration-{next(self._registration_ids)}",
+                    }
+                )
+
+    def _diagnostic_clients(self, uri: str) -> list[SharedConnection] | None:
+        """Return the windows that diagnostics for `uri` apply to.
+
+        These are the window whose text the server has and the windows with the same
+        text, or every window with a notebook open, as the changes of all windows are
+        applied to it. Returns `None` if `uri` isn't tracked.
+        """
+        with self._lock:
+            shared = self._documents.get(self._cells.get(uri, uri))
+            if shared is None:
+                return None
+            _, text = shared.versions.get(shared.owner, (0, None))
+            return [
+                self._clients[index]
+                for index, (_, other) in shared.versions.items()
+                if index in self._clients
+                and (shared.notebook or index == shared.owner or other == text)
+            ]
+
+    def _send_to_clients(
+        self, clients: list[SharedConnection] | None, message: dict[str, Any]
+    ) -> None:
+        if clients is None:
+            with self._lock:
+                clients = list(self._clients.values())
+        for client in clients:
+            client.send(message)
+
+    def _send_to_server(self, message: dict[str, Any]) -> None:
+        assert self._process is not None and self._process.stdin is not None
+        try:
+            with self._server_lock:
+                write_message(self._process.stdin, message)
+        except OSError as error:
+            logger.error(f"Failed to send message to the shared server: {error}")
+
+    def _shutdown_server(self, timeout: float = 5) -> int:
+        assert self._process is not None
+        self._send_to_server(
+            {"jsonrpc": "2.0", "id": "shared-shutdown", "method": "shutdown"}
+        )
+        self._send_to_server({"jsonrpc": "2.0", "method": "exit"})
+        try:
+            return self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            return 1
+
+
+def _acquire_socket_lock(socket_path: str, timeout: float = 10) -> IO[str] | None:
+    """Lock the socket path for this process.
+
+    Returns `None` if another shared server is accepting connections on the socket,
+    e.g., because another window started one at the same time.
+    """
+    import fcntl
+
+    lock = open(f"{socket_path}.lock", "w")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock
+        except OSError:
+            pass
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+        except OSError:
+            # The other server is still starting or already shutting down.
+            if time.monotonic() > deadline:
+                lock.close()
+                raise
+            time.sleep(0.1)
+        else:
+            logger.info(f"A shared server is already running on {socket_path}")
+            lock.close()
+            return None
+
+
 # Start the server.
 if __name__ == "__main__":
+    configure_logging()
+
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(
+            description="Share a language server between editor windows."
+        )
+        parser.add_argument(
+            "--shared",
+            metavar="SOCKET",
+            required=True,
+            help="The Unix domain socket that the windows connect to.",
+        )
+        parser.add_argument(
+            "--idle-timeout",
+            type=float,
+            default=SHARED_SERVER_IDLE_TIMEOUT,
+            help="Seconds to keep running after the last window disconnected.",
+        )
+        parser.add_argument("command", nargs="+", help="The server to share.")
+        args = parser.parse_args()
+        sys.exit(SharedServer(args.command, args.shared, args.idle_timeout).serve())
+
+    workers = worker_count()
+    if workers > 1:
+        sharded_server = ShardedServer(
+            [sys.executable, os.fspath(pathlib.Path(__file__).resolve())],
+            workers,
+            sys.stdin.buffer,
+            sys.stdout.buffer,
+        )
+        sys.exit(sharded_server.serve())
+
     # Ensure that we can import LSP libraries, and other bundled libraries.
     update_sys_path(os.fspath(BUNDLE_DIR / "libs"))
     main()
@@ -0,0 +1,193 @@
+"""Look up the latest versions of projects in a simple repository index.
+
+Used by `release.py`. Only depends on the standard library and `packaging`, so that it
+can be imported and tested without the release script's dependencies.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from urllib.request import url2pathname
+
+from packaging.utils import (
+    InvalidSdistFilename,
+    InvalidWheelFilename,
+    canonicalize_name,
+    parse_sdist_filename,
+    parse_wheel_filename,
+)
+from packaging.version import Version
+
+DEFAULT_INDEX_URL = "https://pypi.org/simple"
+INDEX_CACHE_PATH = (
+    Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "ruff-vscode-release"
+)
+DEFAULT_INDEX_CACHE_TTL = 3600
+
+SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+SIMPLE_HTML_CONTENT_TYPE = "text/html"
+
+
+@dataclass(frozen=True)
+class ProjectPage:
+    """A project's page in a simple repository index (PEP 503 or PEP 691)."""
+
+    content_type: str
+    text: str
+
+    def filenames(self) -> list[str]:
+        """Return the names of the project's files that weren't yanked."""
+        if self.content_type == SIMPLE_JSON_CONTENT_TYPE:
+            return [
+                file["filename"]
+                for file in json.loads(self.text)["files"]
+                if not file.get("yanked")
+            ]
+        parser = _AnchorParser()
+        parser.feed(self.text)
+        return parser.filenames
+
+
+class _AnchorParser(HTMLParser):
+    """Collect the file names linked from a PEP 503 project page."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.filenames: list[str] = []
+        self._yanked = False
+        self._text: list[str] | None = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "a":
+            self._yanked = any(name == "data-yanked" for name, _ in attrs)
+            self._text = []
+
+    def handle_data(self, data: str) -> None:
+        if self._text is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "a" and self._text is not None:
+            if not self._yanked:
+                self.filenames.append("".join(self._text).strip())
+            self._text = None
+
+
+def _file_version(filename: str) -> Version | None:
+    """Return the version of a distribution file, or `None` if it isn't one."""
+    try:
+        if filename.endswith(".whl"):
+            return parse_wheel_filename(filename)[1]
+        return parse_sdist_filename(filename)[1]
+    except (InvalidWheelFilename, InvalidSdistFilename):
+        return None
+
+
+@dataclass(frozen=True)
+class PackageIndex:
+    """A simple repository index that project pages are read from.
+
+    Pages of a remote index are cached in `cache_path` for `cache_ttl` seconds. In
+    offline mode, cached pages are used regardless of their age. Pages of a local index,
+    given as a directory or a `file://` URL, are never cached.
+    """
+
+    url: str
+    cache_path: Path = INDEX_CACHE_PATH
+    cache_ttl: float = DEFAULT_INDEX_CACHE_TTL
+    offline: bool = False
+
+    @property
+    def local_path(self) -> Path | None:
+        """The directory of a local index, or `None` for a remote index."""
+        scheme = urlsplit(self.url).scheme
+        if scheme == "file":
+            return Path(url2pathname(urlsplit(self.url).path))
+        if scheme in ("http", "https"):
+            return None
+        return Path(self.url)
+
+    def project_page(self, project_name: str) -> ProjectPage:
+        """Return the page of `project_name`."""
+        project_name = canonicalize_name(project_name)
+        local_path = self.local_path
+        if local_path is not None:
+            for filename, content_type in (
+                ("index.json", SIMPLE_JSON_CONTENT_TYPE),
+                ("index.html", SIMPLE_HTML_CONTENT_TYPE),
+            ):
+                path = local_path / project_name / filename
+                if path.exists():
+                    return ProjectPage(content_type, path.read_text())
+            raise SystemExit(f"{project_name} isn't in the local index {local_path}")
+
+        url = urljoin(self.url.rstrip("/") + "/", f"{project_name}/")
+        cache_file = self.cache_path / (
+            hashlib.sha256(url.encode()).hexdigest() + ".json"
+        )
+        if cache_file.exists() and (
+            self.offline or time.time() - cache_file.stat().st_mtime < self.cache_ttl
+        ):
+            return ProjectPage(**json.loads(cache_file.read_text()))
+        if self.offline:
+            raise SystemExit(
+                f"No cached index page for {project_name}; "
+                "run without `--offline` to fetch it."
+            )
+
+        request = urllib.request.Request(
+            url,
+            headers={
+                "Accept": f"{SIMPLE_JSON_CONTENT_TYPE}, "
+                f"{SIMPLE_HTML_CONTENT_TYPE};q=0.1"
+            },
+        )
+        # Raises `HTTPError` for error responses.
+        with urllib.request.urlopen(request, timeout=30) as response:
+            content_type = response.headers.get_content_type()
+            text = response.read().decode(
+                response.headers.get_content_charset() or "utf-8"
+            )
+        page = ProjectPage(
+            SIMPLE_JSON_CONTENT_TYPE
+            if content_type == SIMPLE_JSON_CONTENT_TYPE
+            else SIMPLE_HTML_CONTENT_TYPE,
+            text,
+        )
+        if self.cache_ttl > 0:
+            self.cache_path.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(
+                json.dumps({"content_type": page.content_type, "text": page.text})
+            )
+        return page
+
+    def latest_version(self, project_name: str) -> Version:
+        """Determine the latest stable version of `project_name` in the index."""
+        versions = {
+            version
+            for version in map(
+                _file_version, self.project_page(project_name).filenames()
+            )
+            if version is not None and not version.is_prerelease
+        }
+        if not versions:
+            raise SystemExit(f"No releases of {project_name} found in {self.url}")
+        return max(versions)
+
+    def latest_versions(self, project_names: list[str]) -> dict[str, Version]:
+        """Determine the latest versions of `project_names` concurrently."""
+        if not project_names:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(project_names)) as executor:
+            return dict(
+                zip(project_names, executor.map(self.latest_version, project_names))
+            )
@@ -6,11 +6,19 @@ This script does the following things:
 - Bumps the `ruff` and `ruff-lsp` dependency pins in `pyproject.toml`
 - Updates the changelog and README
 - Updates the package's lockfiles
+- Optionally, compares the performance of the new pins against the existing ones
+
+The latest versions are looked up in a simple repository index (PyPI by default), and
+the index pages are cached on disk. To run without network access, pass `--offline` to
+only use cached pages, or point `--index-url` at a local directory laid out like a
+simple index (`<index>/<project>/index.html` or `index.json`). A local index is only
+used to look up the versions; the lockfiles are always resolved against a remote index,
+so that they don't record local paths.
 """
 
 # /// script
 # requires-python = ">=3.12"
-# dependencies = ["packaging", "requests", "rich-argparse", "tomli", "tomlkit"]
+# dependencies = ["packaging", "rich-argparse", "tomli", "tomlkit"]
 #
 # [tool.uv]
 # exclude-newer = "P7D"
@@ -21,16 +29,18 @@ from __future__ import annotations
 import argparse
 import datetime as dt
 import json
+import os
 import re
 import subprocess
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
-import requests
 import tomli
 import tomlkit
 import tomlkit.items
+from package_index import DEFAULT_INDEX_CACHE_TTL, DEFAULT_INDEX_URL, PackageIndex
 from packaging.requirements import Requirement
 from packaging.specifiers import SpecifierSet
 from packaging.version import Version
@@ -40,6 +50,7 @@ PYPROJECT_TOML_PATH = Path("pyproject.toml")
 PACKAGE_JSON_PATH = Path("package.json")
 README_PATH = Path("README.md")
 CHANGELOG_PATH = Path("CHANGELOG.md")
+BENCHMARK_BASELINES_PATH = Path("tests/benchmarks/baselines")
 
 
 @dataclass(frozen=True)
@@ -63,14 +74,8 @@ def existing_dependency_pin(
     return Version(single_specifier.version)
 
 
-def latest_pypi_version(project_name: str) -> Version:
-    """Determine the latest version of `project_name` that has been uploaded to PyPI."""
-    pypi_json = requests.get(f"https://pypi.org/pypi/{project_name}/json")
-    pypi_json.raise_for_status()
-    return Version(pypi_json.json()["info"]["version"])
-
-
 def get_ruff_versions(
+    index: PackageIndex,
     *,
     new_ruff_vscode_version: Version | None,
     new_ruff_version: Version | None,
@@ -94,13 +99,24 @@ def get_ruff_versions(
         for requirement in map(Requirement, pyproject_toml["project"]["dependencies"])
     }
 
+    latest = index.latest_versions(
+        [
+            project_name
+            for project_name, version in (
+                ("ruff", new_ruff_version),
+                ("ruff-lsp", new_ruff_lsp_version),
+            )
+            if version is None
+        ]
+    )
+
     return RuffVersions(
         existing_vscode_version=existing_ruff_vscode_version,
         new_vscode_version=new_ruff_vscode_version,
         existing_ruff_pin=existing_dependency_pin(dependencies, "ruff"),
-        latest_ruff=(new_ruff_version or latest_pypi_version("ruff")),
+        latest_ruff=(new_ruff_version or latest["ruff"]),
         existing_ruff_lsp_pin=existing_dependency_pin(dependencies, "ruff-lsp"),
-        latest_ruff_lsp=(new_ruff_lsp_version or latest_pypi_version("ruff-lsp")),
+        latest_ruff_lsp=(new_ruff_lsp_version or latest["ruff-lsp"]),
     )
 
 
@@ -218,18 +234,35 @@ def update_changelog(versions: RuffVersions) -> None:
     CHANGELOG_PATH.write_text("".join(changelog_lines))
 
 
-def lock_requirements() -> None:
-    """Update this package's lockfiles."""
+def lock_requirements(index: PackageIndex) -> None:
+    """Update this package's lockfiles.
+
+    The Python and npm lockfiles don't depend on each other, so they're updated in
+    parallel.
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(lock_python_requirements, index),
+            executor.submit(lock_npm_requirements),
+        ]
+        for future in futures:
+            future.result()
+
+
+def lock_python_requirements(index: PackageIndex) -> None:
+    """Update `uv.lock` and `requirements.txt`.
+
+    A local index would be recorded as the source of every package, so the lockfiles
+    are resolved against uv's default index instead.
+    """
+    index_args = [] if index.local_path is not None else ["--default-index", index.url]
     Path("requirements.txt").unlink()
-    subprocess.run(
-        ["uv", "lock", "--default-index", "https://pypi.org/simple"], check=True
-    )
+    subprocess.run(["uv", "lock", *index_args], check=True)
     subprocess.run(
         [
             "uv",
             "export",
-            "--default-index",
-            "https://pypi.org/simple",
+            *index_args,
             "--format",
             "requirements-txt",
             "--no-dev",
@@ -240,12 +273,46 @@ def lock_requirements() -> None:
         ],
         check=True,
     )
+
+
+def lock_npm_requirements() -> None:
+    """Update `package-lock.json`."""
     subprocess.run(
         ["npm", "install", "--package-lock-only", "--ignore-scripts"],
         check=True,
     )
 
 
+def sync_bundled_libs() -> None:
+    """Install the locked requirements into `bundled/libs`, which the server uses."""
+    subprocess.run(
+        [
+            "uv",
+            "pip",
+            "sync",
+            "--require-hashes",
+            "./requirements.txt",
+            "--target",
+            "./bundled/libs",
+        ],
+        check=True,
+    )
+
+
+def run_benchmarks(*args: str) -> int:
+    """Run the language server benchmarks, returning their exit code."""
+    return subprocess.run(
+        ["uv", "run", "--dev", "python", "-m", "tests.benchmarks", *args]
+    ).returncode
+
+
+def benchmark_baseline_path(versions: RuffVersions) -> Path:
+    """Return the path of the benchmark baseline for the existing pins."""
+    return BENCHMARK_BASELINES_PATH / (
+        f"ruff-{versions.existing_ruff_pin}-ruff-lsp-{versions.existing_ruff_lsp_pin}.json"
+    )
+
+
 def commit_changes(versions: RuffVersions) -> None:
     """Create a new `git` branch, check it out, and commit the changes."""
     original_branch = subprocess.run(
@@ -276,13 +343,38 @@ def commit_changes(versions: RuffVersions) -> None:
         raise
 
 
-def prepare_release(versions: RuffVersions, *, prepare_pr: bool) -> None:
+def prepare_release(
+    versions: RuffVersions,
+    index: PackageIndex,
+    *,
+    prepare_pr: bool,
+    benchmark: bool,
+) -> None:
     """Make all necessary changes for a new `ruff-vscode` release."""
+    baseline = benchmark_baseline_path(versions)
+    if benchmark:
+        # Record a baseline with the existing pins before bumping them.
+        sync_bundled_libs()
+        if baseline.exists():
+            print(f"Using the existing benchmark baseline in {baseline}")
+        elif run_benchmarks("record", "--output", str(baseline)) != 0:
+            raise SystemExit("Failed to record a benchmark baseline")
+
     update_pyproject_toml(versions)
     bump_package_json_version(versions.new_vscode_version)
     update_readme(versions.latest_ruff)
     update_changelog(versions)
-    lock_requirements()
+    lock_requirements(index)
+
+    if benchmark:
+        sync_bundled_libs()
+        exit_code = run_benchmarks("compare", "--baseline", str(baseline))
+        if exit_code != 0:
+            raise SystemExit(
+                "The benchmarks regressed or failed with the new pins; "
+                "the changes were not committed."
+            )
+
     if prepare_pr:
         commit_changes(versions)
 
@@ -309,7 +401,7 @@ def main() -> None:
         type=Version,
         help=(
             "Which version to bump the `ruff` dependency pin to. "
-            "Defaults to the latest version available on PyPI."
+            "Defaults to the latest version in the index."
         ),
     )
     parser.add_argument(
@@ -317,16 +409,59 @@ def main() -> None:
         type=Version,
         help=(
             "Which version to bump the `ruff-lsp` dependency pin to. "
-            "Defaults to the latest version available on PyPI."
+            "Defaults to the latest version in the index."
+        ),
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help=(
+            "Compare the performance of the language server with the new pins "
+            "against the existing pins, and stop if it regressed"
+        ),
+    )
+    parser.add_argument(
+        "--index-url",
+        default=DEFAULT_INDEX_URL,
+        help=(
+            "The simple repository index to look up and lock the dependencies with. "
+            "Can be a local directory laid out like a simple index, which is only "
+            "used to look up the versions."
+        ),
+    )
+    parser.add_argument(
+        "--index-cache-ttl",
+        type=float,
+        default=DEFAULT_INDEX_CACHE_TTL,
+        help=(
+            "How many seconds index pages are cached for. `0` always fetches the pages."
+        ),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Don't access the network: use cached index pages regardless of their "
+            "age, and let `uv` and `npm` only use their caches"
         ),
     )
     args = parser.parse_args()
+    if args.offline:
+        # Inherited by every `uv` and `npm` invocation.
+        os.environ["UV_OFFLINE"] = "1"
+        os.environ["npm_config_offline"] = "true"
+    index = PackageIndex(
+        args.index_url, cache_ttl=args.index_cache_ttl, offline=args.offline
+    )
     versions = get_ruff_versions(
+        index,
         new_ruff_vscode_version=args.new_version,
         new_ruff_version=args.new_ruff,
         new_ruff_lsp_version=args.new_ruff_lsp,
     )
-    prepare_release(versions, prepare_pr=args.prepare_pr)
+    prepare_release(
+        versions, index, prepare_pr=args.prepare_pr, benchmark=args.benchmark
+    )
 
 
 if __name__ == "__main__":
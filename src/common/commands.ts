@@ -1,9 +1,10 @@
 import * as vscode from "vscode";
 import { ExecuteCommandRequest, LanguageClient } from "vscode-languageclient/node";
-import { getConfiguration } from "./vscodeapi";
-import { ISettings } from "./settings";
+import { logger } from "./logger";
+import { openDeferredDocument } from "./documentSync";
+import { flushPendingChanges } from "./largeDocuments";
 
-const ISSUE_TRACKER = "https://github.com/astral-sh/ruff/issues";
+export const ISSUE_TRACKER = "https://github.com/astral-sh/ruff/issues";
 
 export async function executeAutofix(lsClient: LanguageClient, serverId: string) {
   await executeCommand(lsClient, `${serverId}.applyAutofix`);
@@ -23,6 +24,9 @@ async function executeCommand(lsClient: LanguageClient, command: string) {
     return;
   }
 
+  await openDeferredDocument(textEditor.document);
+  await flushPendingChanges(textEditor.document);
+
   const textDocument = {
     uri: textEditor.document.uri.toString(),
     version: textEditor.document.version,
@@ -40,84 +44,20 @@ async function executeCommand(lsClient: LanguageClient, command: string) {
 }
 
 /**
- * Creates a debug information provider for the `ruff.printDebugInformation` command.
- *
- * This will open a new editor window with the debug information considering the active editor.
+ * Save the log messages that the extension keeps in memory to a file chosen by the user.
  */
-export function createDebugInformationProvider(
-  getClient: () => LanguageClient | undefined,
-  serverId: string,
-  context: vscode.ExtensionContext,
-) {
-  const configuration = getConfiguration(serverId) as unknown as ISettings;
-  if (configuration.nativeServer === false || configuration.nativeServer === "off") {
-    return async () => {
-      vscode.window.showInformationMessage(
-        "Debug information is only available when using the native server",
-      );
-    };
+export async function exportLogs() {
+  const timestamp = new Date().toISOString().replace(/[:.]/g, "-");
+  const uri = await vscode.window.showSaveDialog({
+    defaultUri: vscode.Uri.joinPath(
+      vscode.workspace.workspaceFolders?.[0]?.uri ?? vscode.Uri.file(process.cwd()),
+      `ruff-${timestamp}.log`,
+    ),
+    filters: { Logs: ["log"] },
+  });
+  if (uri == null) {
+    return;
   }
-
-  const contentProvider = new (class implements vscode.TextDocumentContentProvider {
-    readonly uri = vscode.Uri.parse("ruff-server-debug://debug");
-    readonly eventEmitter = new vscode.EventEmitter<vscode.Uri>();
-
-    async provideTextDocumentContent(): Promise<string> {
-      const lsClient = getClient();
-      if (!lsClient) {
-        return "";
-      }
-      const textEditor = vscode.window.activeTextEditor;
-      const notebookEditor = vscode.window.activeNotebookEditor;
-      const params = {
-        command: `${serverId}.printDebugInformation`,
-        arguments: [
-          {
-            textDocument: notebookEditor
-              ? { uri: notebookEditor.notebook.uri.toString() }
-              : textEditor
-                ? { uri: textEditor.document.uri.toString() }
-                : undefined,
-          },
-        ],
-      };
-      return await lsClient.sendRequest(ExecuteCommandRequest.type, params).then(
-        (result) => {
-          if (typeof result === "string") {
-            return result;
-          }
-          // For older Ruff version, we don't return a string but log the information.
-          return "";
-        },
-        async () => {
-          vscode.window.showErrorMessage(
-            `Failed to print debug information. Please consider opening an issue at ${ISSUE_TRACKER} with steps to reproduce.`,
-          );
-          return "";
-        },
-      );
-    }
-
-    get onDidChange(): vscode.Event<vscode.Uri> {
-      return this.eventEmitter.event;
-    }
-  })();
-
-  context.subscriptions.push(
-    vscode.workspace.registerTextDocumentContentProvider("ruff-server-debug", contentProvider),
-  );
-
-  return async () => {
-    contentProvider.eventEmitter.fire(contentProvider.uri);
-    const document = await vscode.workspace.openTextDocument(contentProvider.uri);
-    const content = document.getText();
-
-    // Show the document only if it has content.
-    if (content.length > 0) {
-      void (await vscode.window.showTextDocument(document, {
-        viewColumn: vscode.ViewColumn.Two,
-        preserveFocus: true,
-      }));
-    }
-  };
+  await vscode.workspace.fs.writeFile(uri, Buffer.from(logger.buffer.format(), "utf8"));
+  vscode.window.showInformationMessage(`Exported the Ruff logs to ${uri.fsPath}`);
 }
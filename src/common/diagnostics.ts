@@ -0,0 +1,205 @@
+import { Diagnostic, DiagnosticSeverity, Disposable, Range, Uri, window, workspace } from "vscode";
+import { Middleware, vsdiag } from "vscode-languageclient";
+import { ISettings } from "./settings";
+
+type PendingDiagnostics = {
+  uri: Uri;
+  diagnostics: Diagnostic[];
+  next: (uri: Uri, diagnostics: Diagnostic[]) => void;
+  timer: NodeJS.Timeout;
+};
+
+type AppliedDiagnostics = {
+  keys: string[];
+  items: Diagnostic[];
+};
+
+/**
+ * The source of the summary of omitted diagnostics. It differs from the server's, which treats the
+ * diagnostics of its own source in code action requests as its own and reads their `data`.
+ */
+const SUMMARY_SOURCE = "Ruff (extension)";
+
+function getDiagnosticKey(diagnostic: Diagnostic): string {
+  const { code, range, message, severity, source, tags } = diagnostic;
+  const { start, end } = range;
+  return JSON.stringify([
+    typeof code === "object" ? code.value : code,
+    start.line,
+    start.character,
+    end.line,
+    end.character,
+    message,
+    severity,
+    source,
+    tags ?? [],
+    // Set by the language client from the server's diagnostic, e.g., Ruff's fix.
+    "data" in diagnostic ? diagnostic.data : undefined,
+  ]);
+}
+
+/**
+ * Reduces the cost of rendering diagnostics for documents with many of them, if
+ * `ruff.diagnostics.optimize` is enabled.
+ *
+ * - Diagnostics that are identical to one in the previous update of a document are reused, and an
+ *   update that doesn't change any diagnostic isn't applied at all.
+ * - Published diagnostics of documents that aren't visible are applied at most once per
+ *   `ruff.diagnostics.backgroundDelay` milliseconds.
+ * - At most `ruff.diagnostics.maxPerFile` diagnostics are shown per document, followed by a
+ *   summary of the omitted ones.
+ */
+export class DiagnosticsPolicy implements Disposable {
+  private readonly maxPerFile: number;
+  private readonly backgroundDelay: number;
+  private readonly applied = new Map<string, AppliedDiagnostics>();
+  private readonly pending = new Map<string, PendingDiagnostics>();
+  private readonly disposables: Disposable[] = [];
+
+  readonly middleware: Middleware;
+
+  constructor(settings: ISettings["diagnostics"]) {
+    this.maxPerFile = settings.maxPerFile;
+    this.backgroundDelay = settings.backgroundDelay;
+    if (!settings.optimize) {
+      this.middleware = {};
+      return;
+    }
+
+    this.disposables.push(
+      window.onDidChangeVisibleTextEditors(() => this.flushVisible()),
+      window.onDidChangeVisibleNotebookEditors(() => this.flushVisible()),
+      workspace.onDidCloseTextDocument((document) => {
+        this.applied.delete(document.uri.toString());
+      }),
+    );
+
+    this.middleware = {
+      handleDiagnostics: (uri, diagnostics, next) => {
+        const key = uri.toString();
+        const pending = this.pending.get(key);
+
+        // Always clear diagnostics right away, e.g., when a document is closed.
+        if (diagnostics.length === 0 || this.backgroundDelay <= 0 || this.isVisible(key)) {
+          if (pending != null) {
+            clearTimeout(pending.timer);
+            this.pending.delete(key);
+          }
+          this.apply(uri, diagnostics, next);
+          return;
+        }
+
+        this.pending.set(key, {
+          uri,
+          diagnostics,
+          next,
+          // Keep the timer of an earlier update so that a document that is republished more often
+          // than the delay still gets updated.
+          timer: pending?.timer ?? setTimeout(() => this.flush(key), this.backgroundDelay),
+        });
+      },
+      provideDiagnostics: async (document, previousResultId, token, next) => {
+        const report = await next(document, previousResultId, token);
+        if (report?.kind !== vsdiag.DocumentDiagnosticReportKind.full) {
+          return report;
+        }
+        const uri = document instanceof Uri ? document : document.uri;
+        const { items, changed } = this.update(uri.toString(), report.items);
+        if (!changed && report.resultId != null) {
+          return { kind: vsdiag.DocumentDiagnosticReportKind.unChanged, resultId: report.resultId };
+        }
+        return { ...report, items };
+      },
+    };
+  }
+
+  /**
+   * Returns the diagnostics to show for the document with the given URI, reusing the unchanged
+   * ones, and whether any of them changed since the previous update.
+   */
+  private update(
+    key: string,
+    diagnostics: Diagnostic[],
+  ): { items: Diagnostic[]; changed: boolean } {
+    const previous = this.applied.get(key);
+    const keys = diagnostics.map(getDiagnosticKey);
+    // Each previous diagnostic is reused at most once, even if the update has duplicates.
+    const unused = new Map<string, Diagnostic[]>();
+    previous?.keys.forEach((diagnosticKey, index) => {
+      const pool = unused.get(diagnosticKey) ?? [];
+      pool.push(previous.items[index]);
+      unused.set(diagnosticKey, pool);
+    });
+    const items = diagnostics.map(
+      (diagnostic, index) => unused.get(keys[index])?.shift() ?? diagnostic,
+    );
+    const changed =
+      previous == null ||
+      previous.keys.length !== keys.length ||
+      keys.some((diagnosticKey, index) => diagnosticKey !== previous.keys[index]);
+
+    this.applied.set(key, { keys, items });
+    return { items: this.cap(items), changed };
+  }
+
+  private cap(diagnostics: Diagnostic[]): Diagnostic[] {
+    if (this.maxPerFile <= 0 || diagnostics.length <= this.maxPerFile) {
+      return diagnostics;
+    }
+    const summary = new Diagnostic(
+      new Range(0, 0, 0, 0),
+      `${diagnostics.length - this.maxPerFile} more diagnostics are not shown because the file ` +
+        `has more than 'ruff.diagnostics.maxPerFile' (${this.maxPerFile}).`,
+      DiagnosticSeverity.Information,
+    );
+    summary.source = SUMMARY_SOURCE;
+    return [...diagnostics.slice(0, this.maxPerFile), summary];
+  }
+
+  private apply(
+    uri: Uri,
+    diagnostics: Diagnostic[],
+    next: (uri: Uri, diagnostics: Diagnostic[]) => void,
+  ) {
+    const { items, changed } = this.update(uri.toString(), diagnostics);
+    if (changed) {
+      next(uri, items);
+    }
+  }
+
+  private flush(key: string) {
+    const pending = this.pending.get(key);
+    if (pending == null) {
+      return;
+    }
+    clearTimeout(pending.timer);
+    this.pending.delete(key);
+    this.apply(pending.uri, pending.diagnostics, pending.next);
+  }
+
+  private flushVisible() {
+    for (const key of [...this.pending.keys()]) {
+      if (this.isVisible(key)) {
+        this.flush(key);
+      }
+    }
+  }
+
+  private isVisible(key: string): boolean {
+    return (
+      window.visibleTextEditors.some((editor) => editor.document.uri.toString() === key) ||
+      window.visibleNotebookEditors.some((editor) =>
+        editor.notebook.getCells().some((cell) => cell.document.uri.toString() === key),
+      )
+    );
+  }
+
+  dispose(): void {
+    for (const pending of this.pending.values()) {
+      clearTimeout(pending.timer);
+    }
+    this.pending.clear();
+    this.applied.clear();
+    this.disposables.forEach((disposable) => disposable.dispose());
+  }
+}
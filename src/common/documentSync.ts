@@ -0,0 +1,179 @@
+import { Disposable, TextDocument, Uri, window, workspace } from "vscode";
+import { Middleware } from "vscode-languageclient";
+import { logger } from "./logger";
+import { composeMiddleware } from "./middleware";
+import { ISettings } from "./settings";
+
+const _schedulers = new Set<DocumentSyncScheduler>();
+
+/**
+ * Open the given document in the servers that deferred opening it.
+ *
+ * This should be called before sending a request for the document outside of the language
+ * client's middleware, e.g., when executing a command.
+ */
+export async function openDeferredDocument(document: TextDocument): Promise<void> {
+  await Promise.all([..._schedulers].map((scheduler) => scheduler.open(document.uri.toString())));
+}
+
+/**
+ * Orders the synchronization of the documents that are already open when a server starts.
+ *
+ * The language client opens these documents in the server in the order the editor lists them, so
+ * the document the user is looking at can wait behind every background tab. Instead, the active
+ * editor's document is opened first, followed by the other visible documents. The documents in
+ * background tabs are opened at `ruff.backgroundSync.rate` documents per second while the user
+ * isn't editing, or as soon as they become visible, are changed, or a request is sent for them.
+ *
+ * Documents that are opened after the server started are never deferred.
+ */
+export class DocumentSyncScheduler implements Disposable {
+  readonly middleware: Middleware;
+
+  private readonly interval: number;
+  private readonly initial: WeakSet<TextDocument>;
+  private readonly deferred = new Map<string, () => Promise<void>>();
+  private readonly disposables: Disposable[];
+  private timer: NodeJS.Timeout | undefined;
+  private lastChange = Date.now();
+
+  constructor(settings: ISettings["backgroundSync"], inner: Middleware) {
+    this.interval = settings.rate > 0 ? 1000 / settings.rate : 0;
+    this.initial = new WeakSet(workspace.textDocuments);
+    this.disposables = [
+      window.onDidChangeVisibleTextEditors(() => this.openVisible()),
+      window.onDidChangeActiveTextEditor(() => this.openVisible()),
+    ];
+
+    const open = (document: TextDocument | Uri) =>
+      this.open((document instanceof Uri ? document : document.uri).toString());
+    this.middleware = composeMiddleware(inner, {
+      didOpen: (document, next) => {
+        if (!this.initial.delete(document)) {
+          return next(document);
+        }
+        this.deferred.set(document.uri.toString(), () => next(document));
+        this.schedule(0);
+        return Promise.resolve();
+      },
+      didChange: async (event, next) => {
+        this.lastChange = Date.now();
+        // Opening the document sends its current text, which already includes the change.
+        if (await open(event.document)) {
+          return;
+        }
+        await next(event);
+      },
+      didSave: async (document, next) => {
+        await open(document);
+        await next(document);
+      },
+      didClose: async (document, next) => {
+        // The server never saw the document, so there's nothing to close.
+        if (this.deferred.delete(document.uri.toString())) {
+          return;
+        }
+        await next(document);
+      },
+      // Requests for a deferred document open it first.
+      provideCodeActions: async (document, range, context, token, next) => {
+        await open(document);
+        return next(document, range, context, token);
+      },
+      provideDocumentFormattingEdits: async (document, options, token, next) => {
+        await open(document);
+        return next(document, options, token);
+      },
+      provideDocumentRangeFormattingEdits: async (document, range, options, token, next) => {
+        await open(document);
+        return next(document, range, options, token);
+      },
+      provideHover: async (document, position, token, next) => {
+        await open(document);
+        return next(document, position, token);
+      },
+      provideDiagnostics: async (document, previousResultId, token, next) => {
+        await open(document);
+        return next(document, previousResultId, token);
+      },
+    });
+    _schedulers.add(this);
+  }
+
+  /**
+   * The number of documents that weren't sent to the server yet.
+   */
+  get pending(): number {
+    return this.deferred.size;
+  }
+
+  private schedule(delay: number) {
+    if (this.timer == null) {
+      this.timer = setTimeout(() => this.drain(), delay);
+    }
+  }
+
+  private drain() {
+    this.timer = undefined;
+    this.openVisible();
+    if (this.deferred.size === 0) {
+      return;
+    }
+
+    if (this.interval === 0) {
+      logger.debug(() => `Opening ${this.deferred.size} background document(s)`);
+      for (const key of [...this.deferred.keys()]) {
+        void this.open(key);
+      }
+      return;
+    }
+
+    // Leave the server to the user's edits; background documents can wait.
+    if (Date.now() - this.lastChange >= this.interval) {
+      const [key] = this.deferred.keys();
+      logger.debug(() => `Opening background document '${key}'`);
+      void this.open(key);
+    }
+    if (this.deferred.size > 0) {
+      this.schedule(this.interval);
+    }
+  }
+
+  private openVisible() {
+    const documents = [
+      window.activeTextEditor?.document,
+      ...window.visibleTextEditors.map((editor) => editor.document),
+    ];
+    for (const document of documents) {
+      if (document != null) {
+        void this.open(document.uri.toString());
+      }
+    }
+  }
+
+  /**
+   * Open the document with the given URI in the server if it was deferred, returning whether it
+   * was.
+   */
+  async open(key: string): Promise<boolean> {
+    const open = this.deferred.get(key);
+    if (open == null) {
+      return false;
+    }
+    this.deferred.delete(key);
+    try {
+      await open();
+    } catch (error) {
+      logger.error(`Failed to open '${key}' in the server: ${error}`);
+    }
+    return true;
+  }
+
+  dispose(): void {
+    clearTimeout(this.timer);
+    this.timer = undefined;
+    this.deferred.clear();
+    this.disposables.forEach((disposable) => disposable.dispose());
+    _schedulers.delete(this);
+  }
+}
@@ -0,0 +1,225 @@
+import { execFile } from "child_process";
+import * as fsapi from "fs-extra";
+import { platform } from "os";
+import { CancellationTokenSource, Disposable, TextDocument, window } from "vscode";
+import { HoverRequest, State } from "vscode-languageclient";
+import { LanguageClient } from "vscode-languageclient/node";
+import { logger } from "./logger";
+import { ISettings } from "./settings";
+
+/** The number of consecutive failed probes after which the server is restarted. */
+const UNHEALTHY_PROBES = 3;
+
+/** At most `MAX_RESTARTS` restarts within `RESTART_WINDOW_MS`, to avoid restart loops. */
+const MAX_RESTARTS = 3;
+const RESTART_WINDOW_MS = 15 * 60 * 1000;
+
+/** The number of probes that are included in an incident report. */
+const REPORTED_PROBES = 10;
+
+const _restarts: number[] = [];
+
+type Probe = {
+  time: Date;
+  /** The response time of the probe request, `null` if it timed out, `undefined` if not sent. */
+  latency: number | null | undefined;
+  /** The resident memory of the server process in MiB, if known. */
+  memory: number | null;
+  failure?: string;
+};
+
+/**
+ * Periodically checks that the server responds in time and doesn't use too much memory.
+ *
+ * Every `ruff.health.interval` milliseconds, the watchdog sends a hover request for the start of
+ * an open document, which both servers answer without running Ruff, and samples the resident
+ * memory of the server process. After `UNHEALTHY_PROBES` consecutive probes exceed
+ * `ruff.health.latencyThreshold` or `ruff.health.memoryThreshold`, the watchdog reports the
+ * incident and calls `onUnhealthy`, which restarts the server. Restarting reopens all documents.
+ */
+export class HealthWatchdog implements Disposable {
+  private readonly timer: NodeJS.Timeout | undefined;
+  private cancellation: CancellationTokenSource | undefined;
+  private readonly probes: Probe[] = [];
+  private failures = 0;
+  private probing = false;
+  private disposed = false;
+
+  constructor(
+    private readonly client: LanguageClient,
+    private readonly health: ISettings["health"],
+    private readonly getProbeDocument: () => TextDocument | undefined,
+    /** The ID of the server process, which doesn't exist for a shared server. */
+    private readonly getPid: () => number | undefined,
+    private readonly onUnhealthy: (reason: string) => void,
+  ) {
+    if (health.interval > 0) {
+      this.timer = setInterval(() => void this.probe(), health.interval);
+    }
+  }
+
+  async probe(): Promise<void> {
+    if (this.probing || this.disposed || this.client.state !== State.Running) {
+      return;
+    }
+
+    this.probing = true;
+    try {
+      const [latency, memory] = await Promise.all([this.measureLatency(), this.measureMemory()]);
+      if (this.disposed) {
+        return;
+      }
+
+      const probe: Probe = { time: new Date(), latency, memory };
+      const { latencyThreshold, memoryThreshold } = this.health;
+      if (latency === null) {
+        probe.failure = `no response within ${latencyThreshold} ms`;
+      } else if (memoryThreshold > 0 && memory !== null && memory > memoryThreshold) {
+        probe.failure = `${memory.toFixed(0)} MiB of memory exceeds ${memoryThreshold} MiB`;
+      }
+      this.probes.push(probe);
+      this.probes.splice(0, this.probes.length - REPORTED_PROBES);
+
+      if (probe.failure == null) {
+        if (this.failures > 0) {
+          logger.info(
+            `Server health recovered after ${this.failures} failed probe(s): responded in ${formatLatency(latency)}.`,
+          );
+        }
+        this.failures = 0;
+        return;
+      }
+
+      this.failures += 1;
+      logger.warn(
+        `Server health probe failed (${this.failures}/${UNHEALTHY_PROBES}): ${probe.failure}.`,
+      );
+      if (this.failures >= UNHEALTHY_PROBES) {
+        this.reportIncident(probe.failure);
+      }
+    } finally {
+      this.probing = false;
+    }
+  }
+
+  private reportIncident(reason: string) {
+    const history = this.probes
+      .map(
+        (probe) =>
+          `  ${probe.time.toISOString()}: latency ${formatLatency(probe.latency)}, memory ${
+            probe.memory === null ? "unknown" : `${probe.memory.toFixed(0)} MiB`
+          }`,
+      )
+      .join("\n");
+    logger.error(`Server is unhealthy: ${reason}. Recent probes:\n${history}`);
+    this.dispose();
+
+    const now = Date.now();
+    while (_restarts.length > 0 && _restarts[0] < now - RESTART_WINDOW_MS) {
+      _restarts.shift();
+    }
+    if (_restarts.length >= MAX_RESTARTS) {
+      const message =
+        `The Ruff server was restarted ${_restarts.length} times in ` +
+        `${RESTART_WINDOW_MS / 60_000} minutes because it was unhealthy; ` +
+        "not restarting it again. Run 'Ruff: Restart Server' to restart it manually.";
+      logger.error(message);
+      window.showWarningMessage(message);
+      return;
+    }
+    _restarts.push(now);
+    this.onUnhealthy(reason);
+  }
+
+  /**
+   * Send the probe request, returning its response time in milliseconds, or `null` if the server
+   * didn't respond within the latency threshold.
+   */
+  private async measureLatency(): Promise<number | undefined | null> {
+    const document = this.getProbeDocument();
+    if (document == null || !this.client.initializeResult?.capabilities.hoverProvider) {
+      return undefined;
+    }
+
+    // Cancel the request if it times out, so that unanswered probes don't pile up in the server.
+    const cancellation = new CancellationTokenSource();
+    this.cancellation = cancellation;
+    const start = performance.now();
+    let timeout: NodeJS.Timeout | undefined;
+    const responded = await Promise.race([
+      this.client
+        .sendRequest(
+          HoverRequest.type,
+          { textDocument: { uri: document.uri.toString() }, position: { line: 0, character: 0 } },
+          cancellation.token,
+        )
+        .then(
+          () => true,
+          // An error response still shows that the server is responsive.
+          () => true,
+        ),
+      new Promise<boolean>((resolve) => {
+        timeout = setTimeout(() => resolve(false), this.health.latencyThreshold);
+      }),
+    ]);
+    const latency = performance.now() - start;
+    clearTimeout(timeout);
+    if (!responded) {
+      cancellation.cancel();
+    }
+    cancellation.dispose();
+    if (this.cancellation === cancellation) {
+      this.cancellation = undefined;
+    }
+    return responded ? latency : null;
+  }
+
+  private async measureMemory(): Promise<number | null> {
+    const pid = this.getPid();
+    if (pid == null || this.health.memoryThreshold <= 0) {
+      return null;
+    }
+    const bytes = await getResidentMemory(pid);
+    return bytes === null ? null : bytes / 2 ** 20;
+  }
+
+  dispose(): void {
+    if (this.disposed) {
+      return;
+    }
+    this.disposed = true;
+    clearInterval(this.timer);
+    this.cancellation?.cancel();
+  }
+}
+
+function formatLatency(latency: number | undefined | null): string {
+  if (latency === undefined) {
+    return "not measured";
+  }
+  return latency === null ? "timed out" : `${latency.toFixed(0)} ms`;
+}
+
+/**
+ * Return the resident set size of a process in bytes, or `null` if it's unknown.
+ */
+async function getResidentMemory(pid: number): Promise<number | null> {
+  try {
+    if (platform() === "linux") {
+      const status = await fsapi.readFile(`/proc/${pid}/status`, "utf8");
+      const match = /^VmRSS:\s+(\d+) kB/m.exec(status);
+      return match ? parseInt(match[1], 10) * 1024 : null;
+    }
+    if (platform() === "darwin") {
+      const stdout = await new Promise<string>((resolve, reject) => {
+        execFile("ps", ["-o", "rss=", "-p", `${pid}`], (error, stdout) =>
+          error ? reject(error) : resolve(stdout),
+        );
+      });
+      return parseInt(stdout.trim(), 10) * 1024;
+    }
+  } catch (error) {
+    logger.debug(`Failed to read the memory usage of process ${pid}: ${error}`);
+  }
+  return null;
+}
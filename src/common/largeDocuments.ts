@@ -0,0 +1,199 @@
+import {
+  CodeActionTriggerKind,
+  Disposable,
+  TextDocument,
+  TextDocumentChangeEvent,
+  TextDocumentContentChangeEvent,
+  Uri,
+} from "vscode";
+import { DiagnosticPullMode, DiagnosticPullOptions, Middleware } from "vscode-languageclient";
+import { logger } from "./logger";
+import { ISettings } from "./settings";
+import { updateLargeDocumentCount } from "./status";
+
+type PendingChange = {
+  document: TextDocument;
+  contentChanges: TextDocumentContentChangeEvent[];
+  next: (event: TextDocumentChangeEvent) => Promise<void>;
+  timer: NodeJS.Timeout;
+};
+
+const _policies = new Set<LargeDocumentPolicy>();
+
+/**
+ * Send the changes that are held back for the given document to the server.
+ *
+ * This should be called before sending a request that operates on the document's content
+ * outside of the language client's middleware, e.g., when executing a command.
+ */
+export async function flushPendingChanges(document: TextDocument): Promise<void> {
+  await Promise.all([..._policies].map((policy) => policy.flush(document.uri.toString())));
+}
+
+/**
+ * Reduces the amount of work done for documents whose size exceeds `ruff.largeFile.threshold`.
+ *
+ * For large documents:
+ * - The native server only pulls diagnostics on save instead of on every change.
+ * - Changes sent to `ruff-lsp` are batched for `ruff.largeFile.debounce` milliseconds, as
+ *   every change triggers a new `ruff` invocation.
+ * - Code actions that are requested automatically (e.g., for the lightbulb) are skipped.
+ *
+ * Batched changes are sent before any request for the document, so that the server never answers
+ * based on outdated content.
+ */
+export class LargeDocumentPolicy implements Disposable {
+  private readonly threshold: number;
+  private readonly debounce: number;
+  private readonly sizes = new WeakMap<TextDocument, { version: number; size: number }>();
+  private readonly largeDocuments = new Set<string>();
+  private readonly pending = new Map<string, PendingChange>();
+
+  constructor(settings: ISettings["largeFile"], batchChanges: boolean) {
+    this.threshold = settings.threshold;
+    this.debounce = batchChanges ? settings.debounce : 0;
+    _policies.add(this);
+  }
+
+  readonly middleware: Middleware = {
+    didOpen: async (document, next) => {
+      this.isLarge(document);
+      await next(document);
+    },
+    didChange: async (event, next) => {
+      const key = event.document.uri.toString();
+      if (this.debounce === 0 || !this.isLarge(event.document)) {
+        await this.flush(key);
+        await next(event);
+        return;
+      }
+
+      // The changes of all batched events are sent in a single notification. The version of the
+      // document is captured when `next` is created, so use the callback of the latest event.
+      const pending = this.pending.get(key);
+      if (pending != null) {
+        clearTimeout(pending.timer);
+      }
+      this.pending.set(key, {
+        document: event.document,
+        contentChanges: [...(pending?.contentChanges ?? []), ...event.contentChanges],
+        next,
+        timer: setTimeout(() => {
+          this.flush(key).catch((error) => {
+            logger.error(`Failed to send batched changes for '${key}': ${error}`);
+          });
+        }, this.debounce),
+      });
+    },
+    didSave: async (document, next) => {
+      await this.flush(document.uri.toString());
+      await next(document);
+    },
+    didClose: async (document, next) => {
+      const key = document.uri.toString();
+      const pending = this.pending.get(key);
+      if (pending != null) {
+        clearTimeout(pending.timer);
+        this.pending.delete(key);
+      }
+      if (this.largeDocuments.delete(key)) {
+        updateLargeDocumentCount(this.largeDocuments.size);
+      }
+      await next(document);
+    },
+    provideCodeActions: async (document, range, context, token, next) => {
+      if (
+        context.triggerKind === CodeActionTriggerKind.Automatic &&
+        context.only == null &&
+        this.isLarge(document)
+      ) {
+        return [];
+      }
+      await this.flush(document.uri.toString());
+      return next(document, range, context, token);
+    },
+    provideDocumentFormattingEdits: async (document, options, token, next) => {
+      await this.flush(document.uri.toString());
+      return next(document, options, token);
+    },
+    provideDocumentRangeFormattingEdits: async (document, range, options, token, next) => {
+      await this.flush(document.uri.toString());
+      return next(document, range, options, token);
+    },
+    provideHover: async (document, position, token, next) => {
+      await this.flush(document.uri.toString());
+      return next(document, position, token);
+    },
+    provideDiagnostics: async (document, previousResultId, token, next) => {
+      const uri = document instanceof Uri ? document : document.uri;
+      await this.flush(uri.toString());
+      return next(document, previousResultId, token);
+    },
+  };
+
+  /**
+   * Pull the diagnostics of large documents when they're saved instead of on every change. Other
+   * documents keep the client's default of pulling on every change.
+   */
+  readonly diagnosticPullOptions: DiagnosticPullOptions = {
+    onChange: true,
+    onSave: true,
+    filter: (document, mode) =>
+      mode === DiagnosticPullMode.onType ? this.isLarge(document) : !this.isLarge(document),
+  };
+
+  /**
+   * Send the batched changes for the document with the given URI, if any.
+   */
+  async flush(key: string): Promise<void> {
+    const pending = this.pending.get(key);
+    if (pending == null) {
+      return;
+    }
+    clearTimeout(pending.timer);
+    this.pending.delete(key);
+    await pending.next({
+      document: pending.document,
+      contentChanges: pending.contentChanges,
+      reason: undefined,
+    });
+  }
+
+  private isLarge(document: TextDocument): boolean {
+    if (this.threshold <= 0) {
+      return false;
+    }
+
+    let cached = this.sizes.get(document);
+    if (cached == null || cached.version !== document.version) {
+      const end = document.lineAt(document.lineCount - 1).range.end;
+      cached = { version: document.version, size: document.offsetAt(end) };
+      this.sizes.set(document, cached);
+    }
+
+    const key = document.uri.toString();
+    const isLarge = cached.size > this.threshold;
+    if (isLarge && !this.largeDocuments.has(key)) {
+      this.largeDocuments.add(key);
+      logger.info(
+        `Document '${key}' has ${cached.size} characters, which exceeds 'ruff.largeFile.threshold' ` +
+          `(${this.threshold}); reducing how often it is linted.`,
+      );
+      updateLargeDocumentCount(this.largeDocuments.size);
+    } else if (!isLarge && this.largeDocuments.delete(key)) {
+      logger.info(`Document '${key}' no longer exceeds 'ruff.largeFile.threshold'.`);
+      updateLargeDocumentCount(this.largeDocuments.size);
+    }
+    return isLarge;
+  }
+
+  dispose(): void {
+    for (const pending of this.pending.values()) {
+      clearTimeout(pending.timer);
+    }
+    this.pending.clear();
+    this.largeDocuments.clear();
+    updateLargeDocumentCount(0);
+    _policies.delete(this);
+  }
+}
@@ -0,0 +1,125 @@
+import * as fsapi from "fs-extra";
+import * as vscode from "vscode";
+import { Disposable, OutputChannel } from "vscode";
+import { DocumentSelector } from "vscode-languageclient";
+import {
+  LanguageClient,
+  LanguageClientOptions,
+  RevealOutputChannelOn,
+} from "vscode-languageclient/node";
+import { DEBUG_SERVER_SCRIPT_PATH, RUFF_LSP_SERVER_SCRIPT_PATH } from "./constants";
+import { DiagnosticsPolicy } from "./diagnostics";
+import { DocumentSyncScheduler } from "./documentSync";
+import { LargeDocumentPolicy } from "./largeDocuments";
+import { composeMiddleware, excludeFolders } from "./middleware";
+import { logger } from "./logger";
+import { getDebuggerPath, type PythonCommand } from "./python";
+import type { IInitializationOptions } from "./server";
+import { ServerProcess, setServerProcess } from "./serverProcess";
+import type { ISettings } from "./settings";
+import { getServerOptions } from "./sharedServer";
+
+export async function createLegacyServer(
+  settings: ISettings,
+  serverId: string,
+  serverName: string,
+  outputChannel: OutputChannel,
+  traceOutputChannel: OutputChannel,
+  initializationOptions: IInitializationOptions,
+  documentSelector: DocumentSelector,
+  excludedFolders: readonly vscode.WorkspaceFolder[],
+  disposables: Disposable[],
+  interpreter: PythonCommand,
+): Promise<LanguageClient> {
+  const command = interpreter.executable;
+  const cwd = settings.cwd;
+
+  // Set debugger path needed for debugging python code.
+  const newEnv = { ...process.env };
+  let debuggerPath: string | undefined;
+  try {
+    debuggerPath = await getDebuggerPath();
+  } catch (error) {
+    logger.warn(`Unable to resolve the Python debugger path: ${error}`);
+  }
+  const isDebugScript = await fsapi.pathExists(DEBUG_SERVER_SCRIPT_PATH);
+  if (newEnv.USE_DEBUGPY && debuggerPath) {
+    newEnv.DEBUGPY_PATH = debuggerPath;
+  } else {
+    newEnv.USE_DEBUGPY = "False";
+  }
+
+  // Set notification type
+  newEnv.LS_SHOW_NOTIFICATION = settings.showNotifications;
+  // Signal `ruff-lsp` to not show deprecation warning as it's handled by the extension.
+  newEnv.LS_SHOW_DEPRECATION_WARNING = "False";
+
+  const args =
+    newEnv.USE_DEBUGPY === "False" || !isDebugScript
+      ? interpreter.args.concat([RUFF_LSP_SERVER_SCRIPT_PATH])
+      : interpreter.args.concat([DEBUG_SERVER_SCRIPT_PATH]);
+  logger.info(`Server run command: ${[command, ...args].join(" ")}`);
+
+  const serverProcess = new ServerProcess(
+    {
+      command,
+      args,
+      options: { cwd, env: newEnv },
+    },
+    settings.shutdown,
+  );
+  const serverOptions = await getServerOptions(
+    settings,
+    serverProcess,
+    interpreter,
+    initializationOptions,
+  );
+
+  // `ruff-lsp` runs `ruff` on every change, so batch the changes of large documents.
+  const largeDocuments = new LargeDocumentPolicy(settings.largeFile, true);
+  const diagnostics = new DiagnosticsPolicy(settings.diagnostics);
+  const documentSync = new DocumentSyncScheduler(
+    settings.backgroundSync,
+    composeMiddleware(largeDocuments.middleware, diagnostics.middleware),
+  );
+  disposables.push(largeDocuments, diagnostics, documentSync);
+
+  // Options to control the language client
+  const clientOptions: LanguageClientOptions = {
+    // Register the server for python documents
+    documentSelector,
+    outputChannel: outputChannel,
+    traceOutputChannel: traceOutputChannel,
+    revealOutputChannelOn: RevealOutputChannelOn.Never,
+    initializationOptions,
+    middleware: composeMiddleware(documentSync.middleware, excludeFolders(excludedFolders)),
+  };
+
+  const client = new LanguageClient(serverId, serverName, serverOptions, clientOptions);
+  setServerProcess(client, serverProcess);
+  return client;
+}
+
+/**
+ * The notification that tells `ruff-lsp` which documents are visible in an editor, so that the
+ * launcher in `bundled/tool/server.py` runs `ruff` on them before documents in the background.
+ */
+const VISIBLE_DOCUMENTS_METHOD = "ruff/visibleDocuments";
+
+export function notifyVisibleDocuments(client: LanguageClient): Disposable {
+  const notify = () => {
+    const uris = [
+      ...vscode.window.visibleTextEditors.map((editor) => editor.document.uri.toString()),
+      ...vscode.window.visibleNotebookEditors.map((editor) => editor.notebook.uri.toString()),
+    ];
+    client.sendNotification(VISIBLE_DOCUMENTS_METHOD, { uris }).catch((error) => {
+      logger.debug(`Failed to send the visible documents: ${error}`);
+    });
+  };
+
+  notify();
+  return Disposable.from(
+    vscode.window.onDidChangeVisibleTextEditors(notify),
+    vscode.window.onDidChangeVisibleNotebookEditors(notify),
+  );
+}
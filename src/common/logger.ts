@@ -1,6 +1,81 @@
 import * as util from "util";
 import * as vscode from "vscode";
 
+type LogLevelName = "trace" | "debug" | "info" | "warn" | "error";
+
+/**
+ * The levels in the order in which their entries are evicted from the log buffer.
+ */
+const LEVELS: LogLevelName[] = ["trace", "debug", "info", "warn", "error"];
+
+const CHANNEL_LEVELS: Record<LogLevelName, vscode.LogLevel> = {
+  trace: vscode.LogLevel.Trace,
+  debug: vscode.LogLevel.Debug,
+  info: vscode.LogLevel.Info,
+  warn: vscode.LogLevel.Warning,
+  error: vscode.LogLevel.Error,
+};
+
+/**
+ * The number of characters of log messages that are kept in memory.
+ */
+const LOG_BUFFER_CAPACITY = 1_000_000;
+
+type LogEntry = {
+  sequence: number;
+  time: Date;
+  level: LogLevelName;
+  message: string;
+};
+
+/**
+ * Keeps the most recent log messages in memory, up to `capacity` characters.
+ *
+ * When the buffer is full, the oldest entries of the least severe level are evicted first, so that
+ * warnings and errors outlive trace and debug messages. Messages longer than `maxMessageLength`
+ * are truncated.
+ */
+export class LogBuffer {
+  private readonly queues = new Map<LogLevelName, LogEntry[]>(LEVELS.map((level) => [level, []]));
+  private size = 0;
+  private sequence = 0;
+
+  constructor(
+    readonly capacity: number,
+    readonly maxMessageLength: number = Math.floor(capacity / 16),
+  ) {}
+
+  add(level: LogLevelName, message: string): void {
+    if (message.length > this.maxMessageLength) {
+      const truncated = message.length - this.maxMessageLength;
+      message = `${message.slice(0, this.maxMessageLength)}... (${truncated} characters truncated)`;
+    }
+
+    this.queues.get(level)!.push({ sequence: this.sequence++, time: new Date(), level, message });
+    this.size += message.length;
+
+    for (const evictedLevel of LEVELS) {
+      const queue = this.queues.get(evictedLevel)!;
+      while (this.size > this.capacity && queue.length > 0) {
+        this.size -= queue.shift()!.message.length;
+      }
+    }
+  }
+
+  /**
+   * Return the buffered entries in the order in which they were logged.
+   */
+  entries(): LogEntry[] {
+    return [...this.queues.values()].flat().sort((a, b) => a.sequence - b.sequence);
+  }
+
+  format(): string {
+    return this.entries()
+      .map((entry) => `${entry.time.toISOString()} [${entry.level}] ${entry.message}\n`)
+      .join("");
+  }
+}
+
 class ExtensionLogger {
   /**
    * The output channel used to log messages for the extension.
@@ -8,43 +83,59 @@ class ExtensionLogger {
   readonly channel = vscode.window.createOutputChannel("Ruff", { log: true });
 
   /**
-   * Whether the extension is running in a CI environment.
+   * The most recent messages, which can be exported with the `ruff.exportLogs` command.
    */
-  private readonly isCI = process.env.CI === "true";
+  readonly buffer = new LogBuffer(LOG_BUFFER_CAPACITY);
 
   /**
-   * Logs messages to the console if the extension is running in a CI environment.
+   * Whether the extension is running in a CI environment.
    */
-  private logForCI(...messages: unknown[]): void {
-    if (this.isCI) {
-      // eslint-disable-next-line no-console
-      console.log(...messages);
-    }
-  }
+  private readonly isCI = process.env.CI === "true";
 
   error(...messages: unknown[]): void {
-    this.logForCI(...messages);
-    this.channel.error(util.format(...messages));
+    this.log("error", messages);
   }
 
   warn(...messages: unknown[]): void {
-    this.logForCI(...messages);
-    this.channel.warn(util.format(...messages));
+    this.log("warn", messages);
   }
 
   info(...messages: unknown[]): void {
-    this.logForCI(...messages);
-    this.channel.info(util.format(...messages));
+    this.log("info", messages);
   }
 
   debug(...messages: unknown[]): void {
-    this.logForCI(...messages);
-    this.channel.debug(util.format(...messages));
+    this.log("debug", messages);
   }
 
   trace(...messages: unknown[]): void {
-    this.logForCI(...messages);
-    this.channel.trace(util.format(...messages));
+    this.log("trace", messages);
+  }
+
+  /**
+   * Log `messages` if `level` is enabled. Messages that are functions are called to create the
+   * message, so that large payloads (e.g., settings) aren't formatted at disabled levels.
+   */
+  private log(level: LogLevelName, messages: unknown[]): void {
+    const enabled =
+      this.channel.logLevel !== vscode.LogLevel.Off &&
+      CHANNEL_LEVELS[level] >= this.channel.logLevel;
+    if (!enabled && !this.isCI) {
+      return;
+    }
+
+    const message = util.format(
+      ...messages.map((message) => (typeof message === "function" ? message() : message)),
+    );
+    if (this.isCI) {
+      // Log messages to the console if the extension is running in a CI environment.
+      // eslint-disable-next-line no-console
+      console.log(message);
+    }
+    if (enabled) {
+      this.buffer.add(level, message);
+      this.channel[level](message);
+    }
   }
 }
 
@@ -0,0 +1,73 @@
+import { TextDocument, Uri, WorkspaceFolder, workspace } from "vscode";
+import { Middleware, vsdiag } from "vscode-languageclient";
+
+type Handler = (...args: unknown[]) => unknown;
+
+/**
+ * Combine middlewares that may intercept the same methods.
+ *
+ * Every middleware function receives `next` as its last argument. When several middlewares define
+ * the same function, the later ones wrap the earlier ones: their `next` calls the earlier
+ * middleware, which in turn calls the language client. Nested middlewares, such as `workspace`,
+ * are taken from the last middleware that defines them.
+ */
+export function composeMiddleware(...middlewares: Middleware[]): Middleware {
+  const composed: Record<string, unknown> = {};
+  for (const middleware of middlewares) {
+    for (const [name, handler] of Object.entries(middleware)) {
+      const inner = composed[name];
+      if (typeof handler !== "function" || typeof inner !== "function") {
+        composed[name] = handler;
+        continue;
+      }
+      composed[name] = (...args: unknown[]) => {
+        const next = args[args.length - 1] as Handler;
+        return (handler as Handler)(...args.slice(0, -1), (...nextArgs: unknown[]) =>
+          (inner as Handler)(...nextArgs, next),
+        );
+      };
+    }
+  }
+  return composed as Middleware;
+}
+
+/**
+ * Keep the documents of the given workspace folders away from a server whose document selector
+ * also matches them: they're not synchronized with the server, and requests for them aren't sent.
+ *
+ * This lets one server of a multi-root workspace handle every document that isn't handled by the
+ * servers of the other folders, as a document selector can't exclude documents.
+ */
+export function excludeFolders(folders: readonly WorkspaceFolder[]): Middleware {
+  const excluded = new Set(folders.map((folder) => folder.uri.toString()));
+  const isExcluded = (document: TextDocument | Uri) => {
+    if (excluded.size === 0) {
+      return false;
+    }
+    const uri = document instanceof Uri ? document : document.uri;
+    const folder = workspace.getWorkspaceFolder(uri);
+    return folder != null && excluded.has(folder.uri.toString());
+  };
+
+  return {
+    didOpen: (document, next) => (isExcluded(document) ? Promise.resolve() : next(document)),
+    didChange: (event, next) => (isExcluded(event.document) ? Promise.resolve() : next(event)),
+    willSave: (event, next) => (isExcluded(event.document) ? Promise.resolve() : next(event)),
+    willSaveWaitUntil: (event, next) =>
+      isExcluded(event.document) ? Promise.resolve([]) : next(event),
+    didSave: (document, next) => (isExcluded(document) ? Promise.resolve() : next(document)),
+    didClose: (document, next) => (isExcluded(document) ? Promise.resolve() : next(document)),
+    provideCodeActions: (document, range, context, token, next) =>
+      isExcluded(document) ? [] : next(document, range, context, token),
+    provideDocumentFormattingEdits: (document, options, token, next) =>
+      isExcluded(document) ? [] : next(document, options, token),
+    provideDocumentRangeFormattingEdits: (document, range, options, token, next) =>
+      isExcluded(document) ? [] : next(document, range, options, token),
+    provideHover: (document, position, token, next) =>
+      isExcluded(document) ? null : next(document, position, token),
+    provideDiagnostics: (document, previousResultId, token, next) =>
+      isExcluded(document)
+        ? { kind: vsdiag.DocumentDiagnosticReportKind.full, items: [] }
+        : next(document, previousResultId, token),
+  };
+}
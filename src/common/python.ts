@@ -182,7 +182,9 @@ class PythonEnvironmentExtension implements EnvironmentProvider {
 
     disposables.push(
       this.#extension.onDidChangeEnvironment((event) => {
-        logger.debug(`Python Environments didChangeEnvironment: ${JSON.stringify(event, null, 2)}`);
+        logger.debug(
+          () => `Python Environments didChangeEnvironment: ${JSON.stringify(event, null, 2)}`,
+        );
 
         const environment = event.new == null ? null : this.toEnvironmentDetails(event.new);
         const previousEnvironment = event.old == null ? null : this.toEnvironmentDetails(event.old);
@@ -1,20 +1,19 @@
 import * as fsapi from "fs-extra";
+import * as path from "path";
 import * as vscode from "vscode";
-import { platform } from "os";
+import { homedir, platform } from "os";
 import { Disposable, l10n, LanguageStatusSeverity, OutputChannel } from "vscode";
-import { State, ShowMessageNotification, MessageType } from "vscode-languageclient";
 import {
-  LanguageClient,
-  LanguageClientOptions,
-  RevealOutputChannelOn,
-  ServerOptions,
-} from "vscode-languageclient/node";
+  DocumentSelector,
+  State,
+  ShowMessageNotification,
+  MessageType,
+} from "vscode-languageclient";
+import { LanguageClient, RevealOutputChannelOn } from "vscode-languageclient/node";
 import {
   BUNDLED_RUFF_EXECUTABLE,
-  DEBUG_SERVER_SCRIPT_PATH,
   RUFF_SERVER_PREVIEW_ARGS,
   RUFF_SERVER_SUBCOMMAND,
-  RUFF_LSP_SERVER_SCRIPT_PATH,
   FIND_RUFF_BINARY_SCRIPT_PATH,
   RUFF_BINARY_NAME,
 } from "./constants";
@@ -22,15 +21,14 @@ import { logger } from "./logger";
 import {
   checkInterpreterVersion,
   type EnvironmentProvider,
-  getDebuggerPath,
   type PythonCommand,
   type PythonEnvironmentDetails,
 } from "./python";
 import {
   checkInlineConfigSupport,
-  getExtensionSettings,
   getGlobalSettings,
   getUserSetLegacyServerSettings,
+  getWorkspaceSettings,
   ISettings,
   LegacyServerSetting,
 } from "./settings";
@@ -43,7 +41,22 @@ import {
   NATIVE_SERVER_STABLE_VERSION,
 } from "./version";
 import { updateServerKind, updateStatus } from "./status";
-import { getDocumentSelector } from "./utilities";
+import { getProjectRoot } from "./utilities";
+import { getWorkspaceFolders } from "./vscodeapi";
+import { DiagnosticsPolicy } from "./diagnostics";
+import { DocumentSyncScheduler } from "./documentSync";
+import { LargeDocumentPolicy } from "./largeDocuments";
+import { createLegacyServer, notifyVisibleDocuments } from "./legacyServer";
+import { composeMiddleware, excludeFolders } from "./middleware";
+import {
+  DEFAULT_SHUTDOWN_TIMEOUT,
+  ExitDurations,
+  getServerProcess,
+  ServerProcess,
+  setServerProcess,
+  ShutdownDurations,
+} from "./serverProcess";
+import { getServerOptions } from "./sharedServer";
 import { execFile } from "child_process";
 // eslint-disable-next-line @typescript-eslint/no-require-imports
 import which = require("which");
@@ -81,10 +94,32 @@ function executeFile(file: string, args: string[] = []): Promise<string> {
   });
 }
 
+const ruffVersions = new Map<string, Promise<VersionInfo>>();
+
 /**
  * Get the version of the Ruff executable at the given path.
+ *
+ * Workspace folders are resolved in parallel and usually share a binary, so the version is only
+ * read once per binary and modification time.
  */
 async function getRuffVersion(executable: string): Promise<VersionInfo> {
+  let key: string;
+  try {
+    key = `${executable}:${(await fsapi.stat(executable)).mtimeMs}`;
+  } catch {
+    return readRuffVersion(executable);
+  }
+
+  let version = ruffVersions.get(key);
+  if (version == null) {
+    version = readRuffVersion(executable);
+    ruffVersions.set(key, version);
+    version.catch(() => ruffVersions.delete(key));
+  }
+  return version;
+}
+
+async function readRuffVersion(executable: string): Promise<VersionInfo> {
   const stdout = await executeFile(executable, ["--version"]);
   const version = stdout.trim().split(" ")[1];
   const [major, minor, patch] = version.split(".").map((x) => parseInt(x, 10));
@@ -99,9 +134,10 @@ async function getRuffVersion(executable: string): Promise<VersionInfo> {
  *    path is returned.
  * 2. If the 'importStrategy' setting is 'useBundled', return the bundled
  *    executable path.
- * 3. Execute a Python script that tries to locate the binary. This uses either
- *    the user-provided interpreter or the interpreter provided by the Python
- *    extension.
+ * 3. Look up the binary in the Python environment of either the user-provided
+ *    interpreter or the interpreter provided by the Python extension. Virtual and
+ *    conda environments are checked directly; for other environments, execute a
+ *    Python script that tries to locate the binary.
  * 4. If the Python script doesn't return a path, check the global environment
  *    which checks the PATH environment variable.
  * 5. If all else fails, return the bundled executable path.
@@ -156,6 +192,56 @@ export async function resolvePythonEnvironment(
   };
 }
 
+async function isFile(file: string): Promise<boolean> {
+  try {
+    return (await fsapi.stat(file)).isFile();
+  } catch {
+    return false;
+  }
+}
+
+/**
+ * Find the Ruff binary in a Python environment without spawning its interpreter.
+ *
+ * This mirrors `find_ruff_binary_path.py` for virtual and conda environments, whose scripts
+ * directories only depend on `sys.prefix`: it checks the environment's scripts directory, and then
+ * the user scheme's scripts directory.
+ *
+ * Returns `null` if the environment has no Ruff binary, and `undefined` if the layout of the
+ * environment isn't known, in which case the Python script has to be used.
+ */
+export async function findRuffBinaryInEnvironment(
+  environment: PythonEnvironmentDetails,
+): Promise<string | null | undefined> {
+  const sysPrefix = environment.sysPrefix;
+  const isVirtualEnvironment = await fsapi.pathExists(path.join(sysPrefix, "pyvenv.cfg"));
+  const isCondaEnvironment = await fsapi.pathExists(path.join(sysPrefix, "conda-meta"));
+  if (!isVirtualEnvironment && !isCondaEnvironment) {
+    return undefined;
+  }
+
+  const isWindows = platform() === "win32";
+  const scriptsPath = path.join(sysPrefix, isWindows ? "Scripts" : "bin", RUFF_BINARY_NAME);
+  if (await isFile(scriptsPath)) {
+    return scriptsPath;
+  }
+
+  // The user scheme depends on how Python was built on macOS, and on the exact Python version on
+  // Windows.
+  let userScriptsPath: string;
+  if (isWindows && environment.version != null) {
+    const userBase = process.env.PYTHONUSERBASE || path.join(process.env.APPDATA ?? "", "Python");
+    const { major, minor } = environment.version;
+    userScriptsPath = path.join(userBase, `Python${major}${minor}`, "Scripts", RUFF_BINARY_NAME);
+  } else if (!isWindows && platform() !== "darwin") {
+    const userBase = process.env.PYTHONUSERBASE || path.join(homedir(), ".local");
+    userScriptsPath = path.join(userBase, "bin", RUFF_BINARY_NAME);
+  } else {
+    return undefined;
+  }
+  return (await isFile(userScriptsPath)) ? userScriptsPath : null;
+}
+
 export async function findRuffBinaryPath(
   settings: ISettings,
   environmentProvider: EnvironmentProvider | null,
@@ -197,11 +283,17 @@ export async function findRuffBinaryPath(
     } else if (checkInterpreterVersion(environment)) {
       logger.info(`Resolved Python executable for Ruff lookup: '${command.executable}'`);
       try {
-        const stdout = await executeFile(command.executable, [
-          ...command.args,
-          FIND_RUFF_BINARY_SCRIPT_PATH,
-        ]);
-        ruffBinaryPath = stdout.trim();
+        const environmentPath = await findRuffBinaryInEnvironment(environment);
+        if (environmentPath !== undefined) {
+          ruffBinaryPath = environmentPath ?? undefined;
+        } else {
+          logger.debug(`Running '${FIND_RUFF_BINARY_SCRIPT_PATH}' for '${environment.sysPrefix}'`);
+          const stdout = await executeFile(command.executable, [
+            ...command.args,
+            FIND_RUFF_BINARY_SCRIPT_PATH,
+          ]);
+          ruffBinaryPath = stdout.trim();
+        }
       } catch (err) {
         vscode.window
           .showErrorMessage(
@@ -247,7 +339,11 @@ async function createNativeServer(
   outputChannel: OutputChannel,
   traceOutputChannel: OutputChannel,
   initializationOptions: IInitializationOptions,
+  documentSelector: DocumentSelector,
+  excludedFolders: readonly vscode.WorkspaceFolder[],
+  disposables: Disposable[],
   ruffExecutable: RuffExecutable,
+  python: PythonCommand | null,
 ): Promise<LanguageClient> {
   const { path: ruffBinaryPath, version: ruffVersion } = ruffExecutable;
 
@@ -287,79 +383,43 @@ async function createNativeServer(
   }
   logger.info(`Server run command: ${[ruffBinaryPath, ...ruffServerArgs].join(" ")}`);
 
-  const serverOptions = {
-    command: ruffBinaryPath,
-    args: ruffServerArgs,
-    options: { cwd: settings.cwd, env: process.env },
-  };
+  const serverProcess = new ServerProcess(
+    {
+      command: ruffBinaryPath,
+      args: ruffServerArgs,
+      options: { cwd: settings.cwd, env: process.env },
+    },
+    settings.shutdown,
+  );
+  const serverOptions = await getServerOptions(
+    settings,
+    serverProcess,
+    python,
+    initializationOptions,
+  );
+
+  const largeDocuments = new LargeDocumentPolicy(settings.largeFile, false);
+  const diagnostics = new DiagnosticsPolicy(settings.diagnostics);
+  const documentSync = new DocumentSyncScheduler(
+    settings.backgroundSync,
+    composeMiddleware(largeDocuments.middleware, diagnostics.middleware),
+  );
+  disposables.push(largeDocuments, diagnostics, documentSync);
 
   const clientOptions = {
     // Register the server for python documents
-    documentSelector: getDocumentSelector(),
+    documentSelector,
     outputChannel,
     traceOutputChannel,
     revealOutputChannelOn: RevealOutputChannelOn.Never,
     initializationOptions,
+    middleware: composeMiddleware(documentSync.middleware, excludeFolders(excludedFolders)),
+    diagnosticPullOptions: largeDocuments.diagnosticPullOptions,
   };
 
-  return new LanguageClient(serverId, serverName, serverOptions, clientOptions);
-}
-
-async function createLegacyServer(
-  settings: ISettings,
-  serverId: string,
-  serverName: string,
-  outputChannel: OutputChannel,
-  traceOutputChannel: OutputChannel,
-  initializationOptions: IInitializationOptions,
-  interpreter: PythonCommand,
-): Promise<LanguageClient> {
-  const command = interpreter.executable;
-  const cwd = settings.cwd;
-
-  // Set debugger path needed for debugging python code.
-  const newEnv = { ...process.env };
-  let debuggerPath: string | undefined;
-  try {
-    debuggerPath = await getDebuggerPath();
-  } catch (error) {
-    logger.warn(`Unable to resolve the Python debugger path: ${error}`);
-  }
-  const isDebugScript = await fsapi.pathExists(DEBUG_SERVER_SCRIPT_PATH);
-  if (newEnv.USE_DEBUGPY && debuggerPath) {
-    newEnv.DEBUGPY_PATH = debuggerPath;
-  } else {
-    newEnv.USE_DEBUGPY = "False";
-  }
-
-  // Set notification type
-  newEnv.LS_SHOW_NOTIFICATION = settings.showNotifications;
-  // Signal `ruff-lsp` to not show deprecation warning as it's handled by the extension.
-  newEnv.LS_SHOW_DEPRECATION_WARNING = "False";
-
-  const args =
-    newEnv.USE_DEBUGPY === "False" || !isDebugScript
-      ? interpreter.args.concat([RUFF_LSP_SERVER_SCRIPT_PATH])
-      : interpreter.args.concat([DEBUG_SERVER_SCRIPT_PATH]);
-  logger.info(`Server run command: ${[command, ...args].join(" ")}`);
-
-  const serverOptions: ServerOptions = {
-    command,
-    args,
-    options: { cwd, env: newEnv },
-  };
-
-  // Options to control the language client
-  const clientOptions: LanguageClientOptions = {
-    // Register the server for python documents
-    documentSelector: getDocumentSelector(),
-    outputChannel: outputChannel,
-    traceOutputChannel: traceOutputChannel,
-    revealOutputChannelOn: RevealOutputChannelOn.Never,
-    initializationOptions,
-  };
-
-  return new LanguageClient(serverId, serverName, serverOptions, clientOptions);
+  const client = new LanguageClient(serverId, serverName, serverOptions, clientOptions);
+  setServerProcess(client, serverProcess);
+  return client;
 }
 
 function showWarningMessage(message: string) {
@@ -391,8 +451,147 @@ type ServerResolution =
 export type ServerState = {
   client: LanguageClient;
   resolution: ServerResolution;
+  folders: vscode.WorkspaceFolder[];
 };
 
+/**
+ * Identify the server that a resolution starts: its kind, and the Ruff binary and version for the
+ * native server or the interpreter for `ruff-lsp`. Resolutions with the same fingerprint start the
+ * same server, so switching between them doesn't require a restart.
+ */
+export function getServerFingerprint(resolution: ServerResolution): string {
+  if (resolution.kind === "native") {
+    const { executable } = resolution;
+    return JSON.stringify(["native", executable.path, versionToString(executable.version)]);
+  }
+  const { executable, args } = resolution.interpreter;
+  return JSON.stringify(["legacy", executable, ...args]);
+}
+
+export type FolderResolution = {
+  folder: vscode.WorkspaceFolder;
+  settings: ISettings;
+  resolution: ServerResolution | null;
+  /** The interpreter that starts a shared server, see `ruff.sharedServer`. */
+  python?: PythonCommand | null;
+};
+
+/**
+ * The workspace folders that share a server, together with their settings.
+ */
+export type ServerGroup = {
+  resolution: ServerResolution;
+  folders: vscode.WorkspaceFolder[];
+  settings: ISettings[];
+  python: PythonCommand | null;
+};
+
+/**
+ * Group workspace folders by the server that they resolve to, so that folders using the same Ruff
+ * binary or interpreter share one server. Groups are ordered by their first folder, and folders
+ * that don't resolve to a server are left out.
+ */
+export function groupFolderResolutions(resolutions: FolderResolution[]): ServerGroup[] {
+  const groups = new Map<string, ServerGroup>();
+  for (const { folder, settings, resolution, python } of resolutions) {
+    if (resolution == null) {
+      continue;
+    }
+    const fingerprint = getServerFingerprint(resolution);
+    const group = groups.get(fingerprint);
+    if (group == null) {
+      groups.set(fingerprint, {
+        resolution: { ...resolution },
+        folders: [folder],
+        settings: [settings],
+        python: python ?? null,
+      });
+    } else {
+      group.folders.push(folder);
+      group.settings.push(settings);
+      group.python ??= python ?? null;
+      group.resolution.dependsOnActiveInterpreter ||= resolution.dependsOnActiveInterpreter;
+    }
+  }
+  return [...groups.values()];
+}
+
+/**
+ * Resolve the server of every workspace folder in parallel, and group the folders by server.
+ *
+ * The project root is resolved first so that its group is the first one. It's the only folder that
+ * shows warnings, as they would otherwise be repeated for every folder.
+ */
+export async function resolveServerGroups(
+  serverId: string,
+  environmentProvider: EnvironmentProvider | null,
+): Promise<ServerGroup[]> {
+  updateStatus(undefined, LanguageStatusSeverity.Information, true);
+
+  const projectRoot = await getProjectRoot();
+  const folders = [
+    projectRoot,
+    ...getWorkspaceFolders().filter(
+      (folder) => folder.uri.toString() !== projectRoot.uri.toString(),
+    ),
+  ];
+  const resolutions = await Promise.all(
+    folders.map(async (folder, index): Promise<FolderResolution> => {
+      const settings = await getWorkspaceSettings(serverId, folder);
+      const activeEnvironment =
+        (await environmentProvider?.getActiveEnvironment(folder.uri)) ?? null;
+      const resolution = await resolveServer(
+        settings,
+        folder,
+        serverId,
+        environmentProvider,
+        activeEnvironment,
+        index === 0,
+      );
+      let python: PythonCommand | null = null;
+      if (settings.sharedServer && resolution?.kind === "native") {
+        python = (
+          await resolvePythonEnvironment(
+            settings.interpreter,
+            settings.workspace,
+            environmentProvider,
+            activeEnvironment,
+          )
+        ).command;
+      }
+      return { folder, settings, resolution, python };
+    }),
+  );
+
+  const groups = groupFolderResolutions(resolutions);
+  if (groups.length > 1) {
+    for (const group of groups) {
+      logger.info(
+        `Using a ${group.resolution.kind} server for ${group.folders.map((folder) => folder.name).join(", ")}`,
+      );
+    }
+  }
+  return groups;
+}
+
+/**
+ * Get the server that handles the given document: the one of its workspace folder, or the first
+ * server for documents outside of the workspace folders.
+ */
+export function getServerStateForDocument(
+  states: ServerState[],
+  uri: vscode.Uri | undefined,
+): ServerState | undefined {
+  const folder = uri == null ? undefined : vscode.workspace.getWorkspaceFolder(uri);
+  const state =
+    folder == null
+      ? undefined
+      : states.find((state) =>
+          state.folders.some((candidate) => candidate.uri.toString() === folder.uri.toString()),
+        );
+  return state ?? states[0];
+}
+
 const RUFF_LSP_URL = "https://github.com/astral-sh/ruff-lsp";
 const LSP_MIGRATION_URL = "https://docs.astral.sh/ruff/editors/migration/";
 const LSP_DEPRECATION_DISCUSSION_MESSAGE =
@@ -651,7 +850,11 @@ async function createServer(
   outputChannel: OutputChannel,
   traceOutputChannel: OutputChannel,
   initializationOptions: IInitializationOptions,
+  documentSelector: DocumentSelector,
+  excludedFolders: readonly vscode.WorkspaceFolder[],
+  disposables: Disposable[],
   resolution: ServerResolution,
+  python: PythonCommand | null,
 ): Promise<LanguageClient> {
   updateServerKind(resolution.kind === "native");
   if (resolution.kind === "native") {
@@ -662,7 +865,11 @@ async function createServer(
       outputChannel,
       traceOutputChannel,
       initializationOptions,
+      documentSelector,
+      excludedFolders,
+      disposables,
       resolution.executable,
+      python,
     );
   } else {
     return createLegacyServer(
@@ -672,60 +879,80 @@ async function createServer(
       outputChannel,
       traceOutputChannel,
       initializationOptions,
+      documentSelector,
+      excludedFolders,
+      disposables,
       resolution.interpreter,
     );
   }
 }
 
-let _disposables: Disposable[] = [];
+const _disposables = new Map<LanguageClient, Disposable[]>();
+
+// The settings that were logged last, to avoid repeating them on every restart.
+const _loggedSettings = new Map<string, string>();
+
+function logSettings(name: string, settings: ISettings) {
+  const serialized = JSON.stringify(settings);
+  if (_loggedSettings.get(name) === serialized) {
+    logger.debug(`${name}: unchanged since the last start`);
+    return;
+  }
+  _loggedSettings.set(name, serialized);
+  logger.info(() => `${name}: ${JSON.stringify(settings, null, 4)}`);
+}
 
+/**
+ * Start the server of a group of workspace folders for the documents matched by `documentSelector`,
+ * except for those in `excludedFolders`.
+ */
 export async function startServer(
-  projectRoot: vscode.WorkspaceFolder,
-  workspaceSettings: ISettings,
+  group: ServerGroup,
+  documentSelector: DocumentSelector,
+  excludedFolders: readonly vscode.WorkspaceFolder[],
   serverId: string,
   serverName: string,
   outputChannel: OutputChannel,
   traceOutputChannel: OutputChannel,
-  environmentProvider: EnvironmentProvider | null,
 ): Promise<ServerState | null> {
-  updateStatus(undefined, LanguageStatusSeverity.Information, true);
+  const { resolution, folders, settings } = group;
 
-  const activeEnvironment =
-    (await environmentProvider?.getActiveEnvironment(projectRoot.uri)) ?? null;
-  const resolution = await resolveServer(
-    workspaceSettings,
-    projectRoot,
-    serverId,
-    environmentProvider,
-    activeEnvironment,
-    true,
-  );
-  if (resolution == null) {
-    return null;
-  }
-
-  const extensionSettings = await getExtensionSettings(serverId);
-  for (const settings of extensionSettings) {
-    logger.info(`Workspace settings for ${settings.cwd}: ${JSON.stringify(settings, null, 4)}`);
+  // Without workspace folders, the project root is the working directory, which the server
+  // already falls back to.
+  const extensionSettings = getWorkspaceFolders().length === 0 ? [] : settings;
+  for (const folderSettings of extensionSettings) {
+    logSettings(`Workspace settings for ${folderSettings.cwd}`, folderSettings);
   }
   const globalSettings = await getGlobalSettings(serverId);
-  logger.info(`Global settings: ${JSON.stringify(globalSettings, null, 4)}`);
+  logSettings("Global settings", globalSettings);
 
-  const newLSClient = await createServer(
-    workspaceSettings,
-    serverId,
-    serverName,
-    outputChannel,
-    traceOutputChannel,
-    {
-      settings: extensionSettings,
-      globalSettings: globalSettings,
-    },
-    resolution,
-  );
+  const disposables: Disposable[] = [];
+  let newLSClient: LanguageClient;
+  try {
+    newLSClient = await createServer(
+      settings[0],
+      serverId,
+      serverName,
+      outputChannel,
+      traceOutputChannel,
+      {
+        settings: extensionSettings,
+        globalSettings: globalSettings,
+      },
+      documentSelector,
+      excludedFolders,
+      disposables,
+      resolution,
+      group.python,
+    );
+  } catch (ex) {
+    disposables.forEach((d) => d.dispose());
+    throw ex;
+  }
+  _disposables.set(newLSClient, disposables);
   logger.info(`Server: Start requested.`);
 
-  _disposables.push(
+  disposables.push(
     newLSClient.onDidChangeState((e) => {
       switch (e.newState) {
         case State.Stopped:
@@ -760,20 +987,54 @@ export async function startServer(
   } catch (ex) {
     updateStatus(l10n.t("Server failed to start."), LanguageStatusSeverity.Error);
     logger.error(`Server: Start failed: ${ex}`);
-    dispose();
+    dispose(newLSClient);
     return null;
   }
 
-  return { client: newLSClient, resolution };
+  if (resolution.kind === "legacy") {
+    disposables.push(notifyVisibleDocuments(newLSClient));
+  }
+
+  return { client: newLSClient, resolution, folders };
 }
 
-export async function stopServer(lsClient: LanguageClient): Promise<void> {
+/**
+ * Stop the client and its server.
+ *
+ * Resolves once the client sent the `shutdown` request and the `exit` notification, or gave up
+ * after `ruff.shutdown.timeout` milliseconds, at which point the client no longer handles any
+ * documents. Waiting for the server process to exit, and terminating or killing it if it doesn't,
+ * continues in `exited`, so that a replacement server can start in the meantime.
+ */
+export async function stopServer(lsClient: LanguageClient): Promise<{ exited: Promise<void> }> {
   logger.info(`Server: Stop requested`);
-  await lsClient.stop();
-  dispose();
+  const start = Date.now();
+  const serverProcess = getServerProcess(lsClient);
+  const timeout = serverProcess?.settings.timeout ?? DEFAULT_SHUTDOWN_TIMEOUT;
+  try {
+    await lsClient.stop(timeout);
+  } catch (error) {
+    logger.warn(`Server: Shutdown did not complete within ${timeout} ms: ${error}`);
+  }
+  dispose(lsClient);
+  const shutdown = Date.now() - start;
+
+  const exited = (async () => {
+    const stages: ExitDurations = serverProcess != null ? await serverProcess.waitForExit() : {};
+    const durations: ShutdownDurations = { shutdown, ...stages, total: Date.now() - start };
+    const summary = Object.entries(durations)
+      .map(([stage, duration]) => `${stage}: ${duration} ms`)
+      .join(", ");
+    if (stages.terminate != null) {
+      logger.warn(`Server: Did not exit within ${timeout} ms and was terminated (${summary})`);
+    } else {
+      logger.info(`Server: Stopped (${summary})`);
+    }
+  })();
+  return { exited };
 }
 
-function dispose(): void {
-  _disposables.forEach((d) => d.dispose());
-  _disposables = [];
+function dispose(lsClient: LanguageClient): void {
+  _disposables.get(lsClient)?.forEach((d) => d.dispose());
+  _disposables.delete(lsClient);
 }
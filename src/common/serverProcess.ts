@@ -0,0 +1,132 @@
+import { ChildProcess, spawn } from "child_process";
+import { Executable, LanguageClient } from "vscode-languageclient/node";
+import { ISettings } from "./settings";
+
+/**
+ * How long each stage of stopping a server took, in milliseconds. Stages that weren't needed are
+ * omitted.
+ */
+export type ShutdownDurations = {
+  shutdown: number;
+  exit?: number;
+  terminate?: number;
+  kill?: number;
+  total: number;
+};
+
+export type ExitDurations = Pick<ShutdownDurations, "exit" | "terminate" | "kill">;
+
+export const DEFAULT_SHUTDOWN_TIMEOUT = 2000;
+
+const serverProcesses = new WeakMap<LanguageClient, ServerProcess>();
+
+/**
+ * A server process that's started by the extension instead of the language client, so that it can
+ * be terminated, and killed if necessary, when it doesn't exit after the `exit` notification.
+ *
+ * The language client only gives the process a fixed two seconds after stopping before it kills it.
+ * There's no terminate step first, the delay can't be configured, and it isn't reported when or
+ * whether the process exited. `waitForExit` adds the `ruff.shutdown` timeouts, a `SIGTERM` before
+ * the `SIGKILL`, and the duration of each stage, which is logged. With a `ruff.shutdown.timeout`
+ * above two seconds, the client's kill can come first; `waitForExit` then only records when the
+ * process exited.
+ */
+export class ServerProcess {
+  private child: ChildProcess | undefined;
+
+  constructor(
+    readonly executable: Executable,
+    readonly settings: ISettings["shutdown"],
+  ) {}
+
+  /**
+   * The ID of the running process, if any.
+   */
+  get pid(): number | undefined {
+    return this.child == null || hasExited(this.child) ? undefined : this.child.pid;
+  }
+
+  /**
+   * Starts the process. The language client calls this again when it restarts a crashed server.
+   */
+  async start(): Promise<ChildProcess> {
+    const { command, args, options } = this.executable;
+    const child = spawn(command, args ?? [], {
+      cwd: options?.cwd,
+      env: options?.env,
+      detached: options?.detached,
+      shell: options?.shell,
+    });
+    await new Promise<void>((resolve, reject) => {
+      child.once("spawn", resolve);
+      child.once("error", (error) =>
+        reject(new Error(`Launching server using command ${command} failed: ${error}`)),
+      );
+    });
+    this.child = child;
+    return child;
+  }
+
+  /**
+   * Waits for the process to exit after the `exit` notification was sent, escalating whenever it
+   * misses a deadline: the process gets `ruff.shutdown.timeout` milliseconds to exit, is then
+   * terminated, and is killed if it doesn't exit within `ruff.shutdown.terminateTimeout`
+   * milliseconds of that.
+   */
+  async waitForExit(): Promise<ExitDurations> {
+    const durations: ExitDurations = {};
+    const child = this.child;
+    if (child == null) {
+      return durations;
+    }
+
+    const stages = [
+      { stage: "exit", signal: undefined, timeout: this.settings.timeout },
+      { stage: "terminate", signal: "SIGTERM", timeout: this.settings.terminateTimeout },
+      // A killed process exits, but don't wait forever for the operating system to reap it.
+      { stage: "kill", signal: "SIGKILL", timeout: this.settings.terminateTimeout },
+    ] as const;
+    for (const { stage, signal, timeout } of stages) {
+      if (hasExited(child)) {
+        break;
+      }
+      const start = Date.now();
+      if (signal != null) {
+        child.kill(signal);
+      }
+      await waitForProcessExit(child, timeout);
+      durations[stage] = Date.now() - start;
+    }
+    return durations;
+  }
+}
+
+function hasExited(child: ChildProcess): boolean {
+  return child.exitCode !== null || child.signalCode !== null;
+}
+
+function waitForProcessExit(child: ChildProcess, timeout: number): Promise<void> {
+  return new Promise((resolve) => {
+    if (hasExited(child)) {
+      resolve();
+      return;
+    }
+    const onExit = () => {
+      clearTimeout(timer);
+      resolve();
+    };
+    const timer = setTimeout(() => {
+      child.off("exit", onExit);
+      resolve();
+    }, timeout);
+    child.once("exit", onExit);
+  });
+}
+
+export function setServerProcess(client: LanguageClient, process: ServerProcess): void {
+  serverProcesses.set(client, process);
+}
+
+export function getServerProcess(client: LanguageClient): ServerProcess | undefined {
+  return serverProcesses.get(client);
+}
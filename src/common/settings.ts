@@ -51,6 +51,32 @@ type Format = {
   backend?: FormatterBackend;
 };
 
+type LargeFile = {
+  threshold: number;
+  debounce: number;
+};
+
+type Diagnostics = {
+  optimize: boolean;
+  maxPerFile: number;
+  backgroundDelay: number;
+};
+
+type BackgroundSync = {
+  rate: number;
+};
+
+type Health = {
+  interval: number;
+  latencyThreshold: number;
+  memoryThreshold: number;
+};
+
+type Shutdown = {
+  timeout: number;
+  terminateTimeout: number;
+};
+
 export interface ISettings {
   nativeServer: NativeServer;
   cwd: string;
@@ -67,6 +93,12 @@ export interface ISettings {
   fixAll: boolean;
   lint: Lint;
   format: Format;
+  largeFile: LargeFile;
+  backgroundSync: BackgroundSync;
+  diagnostics: Diagnostics;
+  sharedServer: boolean;
+  health: Health;
+  shutdown: Shutdown;
   exclude?: string[];
   lineLength?: number;
   configurationPreference?: ConfigPreference;
@@ -75,14 +107,6 @@ export interface ISettings {
   logFile?: string;
 }
 
-export function getExtensionSettings(namespace: string): Promise<ISettings[]> {
-  return Promise.all(
-    getWorkspaceFolders().map((workspaceFolder) =>
-      getWorkspaceSettings(namespace, workspaceFolder),
-    ),
-  );
-}
-
 function resolveVariables(value: string[], workspace?: WorkspaceFolder): string[];
 function resolveVariables(value: string, workspace?: WorkspaceFolder): string;
 function resolveVariables(
@@ -119,7 +143,7 @@ export function getInterpreterFromSetting(namespace: string, scope?: Configurati
   return config.get<string[]>("interpreter");
 }
 
-export async function getWorkspaceSettings(
+async function readWorkspaceSettings(
   namespace: string,
   workspace: WorkspaceFolder,
 ): Promise<ISettings> {
@@ -162,6 +186,28 @@ export async function getWorkspaceSettings(
       preview: config.get<boolean>("format.preview"),
       backend: config.get<FormatterBackend>("format.backend") ?? "internal",
     },
+    largeFile: {
+      threshold: config.get<number>("largeFile.threshold") ?? 1000000,
+      debounce: config.get<number>("largeFile.debounce") ?? 1000,
+    },
+    backgroundSync: {
+      rate: config.get<number>("backgroundSync.rate") ?? 20,
+    },
+    diagnostics: {
+      optimize: config.get<boolean>("diagnostics.optimize") ?? false,
+      maxPerFile: config.get<number>("diagnostics.maxPerFile") ?? 1000,
+      backgroundDelay: config.get<number>("diagnostics.backgroundDelay") ?? 2000,
+    },
+    sharedServer: config.get<boolean>("sharedServer") ?? false,
+    health: {
+      interval: config.get<number>("health.interval") ?? 30000,
+      latencyThreshold: config.get<number>("health.latencyThreshold") ?? 10000,
+      memoryThreshold: config.get<number>("health.memoryThreshold") ?? 0,
+    },
+    shutdown: {
+      timeout: config.get<number>("shutdown.timeout") ?? 2000,
+      terminateTimeout: config.get<number>("shutdown.terminateTimeout") ?? 1000,
+    },
     enable: config.get<boolean>("enable") ?? true,
     organizeImports: config.get<boolean>("organizeImports") ?? true,
     fixAll: config.get<boolean>("fixAll") ?? true,
@@ -186,18 +232,7 @@ function getOptionalGlobalValue<T>(config: WorkspaceConfiguration, key: string):
   return inspect?.globalValue;
 }
 
-/**
- * Returns the global settings for the extension.
- *
- * ## Notes
- *
- * The global settings do not belong to a specific workspace. This means that
- * variables such as `${workspaceFolder}` or `${workspaceFolder:...}` are not
- * resolved. The language server does not support these variables, so they are
- * filtered out. For example, if `configuration` has either of these variables,
- * it will be set to `null`.
- */
-export async function getGlobalSettings(namespace: string): Promise<ISettings> {
+async function readGlobalSettings(namespace: string): Promise<ISettings> {
   const config = getConfiguration(namespace);
 
   let configuration = getGlobalValue<string | object | null>(config, "configuration", null);
@@ -232,6 +267,28 @@ export async function getGlobalSettings(namespace: string): Promise<ISettings> {
       preview: getOptionalGlobalValue<boolean>(config, "format.preview"),
       backend: getGlobalValue<FormatterBackend>(config, "format.backend", "internal"),
     },
+    largeFile: {
+      threshold: getGlobalValue<number>(config, "largeFile.threshold", 1000000),
+      debounce: getGlobalValue<number>(config, "largeFile.debounce", 1000),
+    },
+    backgroundSync: {
+      rate: getGlobalValue<number>(config, "backgroundSync.rate", 20),
+    },
+    diagnostics: {
+      optimize: getGlobalValue<boolean>(config, "diagnostics.optimize", false),
+      maxPerFile: getGlobalValue<number>(config, "diagnostics.maxPerFile", 1000),
+      backgroundDelay: getGlobalValue<number>(config, "diagnostics.backgroundDelay", 2000),
+    },
+    sharedServer: getGlobalValue<boolean>(config, "sharedServer", false),
+    health: {
+      interval: getGlobalValue<number>(config, "health.interval", 30000),
+      latencyThreshold: getGlobalValue<number>(config, "health.latencyThreshold", 10000),
+      memoryThreshold: getGlobalValue<number>(config, "health.memoryThreshold", 0),
+    },
+    shutdown: {
+      timeout: getGlobalValue<number>(config, "shutdown.timeout", 2000),
+      terminateTimeout: getGlobalValue<number>(config, "shutdown.terminateTimeout", 1000),
+    },
     enable: getGlobalValue<boolean>(config, "enable", true),
     organizeImports: getGlobalValue<boolean>(config, "organizeImports", true),
     fixAll: getGlobalValue<boolean>(config, "fixAll", true),
@@ -249,44 +306,165 @@ export async function getGlobalSettings(namespace: string): Promise<ISettings> {
   };
 }
 
-export function checkIfConfigurationChanged(
-  e: ConfigurationChangeEvent,
+type SettingsSnapshot = {
+  namespace: string;
+  workspace?: WorkspaceFolder;
+  settings: Promise<ISettings>;
+};
+
+/**
+ * Snapshots of the workspace and global settings, keyed by namespace and scope.
+ *
+ * Reading the settings inspects every configuration key and resolves variables, so the
+ * snapshots are frozen and reused until a configuration change affects their scope.
+ */
+const settingsSnapshots = new Map<string, SettingsSnapshot>();
+
+function getSnapshotKey(namespace: string, workspace?: WorkspaceFolder): string {
+  return `${namespace}:${workspace?.uri.toString() ?? ""}`;
+}
+
+function readSnapshot(namespace: string, workspace?: WorkspaceFolder): Promise<ISettings> {
+  const read =
+    workspace == null
+      ? readGlobalSettings(namespace)
+      : readWorkspaceSettings(namespace, workspace);
+  return read.then(deepFreeze);
+}
+
+function getSnapshot(namespace: string, workspace?: WorkspaceFolder): Promise<ISettings> {
+  const key = getSnapshotKey(namespace, workspace);
+  let snapshot = settingsSnapshots.get(key);
+  if (snapshot == null) {
+    snapshot = { namespace, workspace, settings: readSnapshot(namespace, workspace) };
+    settingsSnapshots.set(key, snapshot);
+    // Don't cache failed reads.
+    snapshot.settings.catch(() => settingsSnapshots.delete(key));
+  }
+  return snapshot.settings;
+}
+
+function deepFreeze<T>(value: T): T {
+  if (value != null && typeof value === "object" && !Object.isFrozen(value)) {
+    Object.values(value).forEach(deepFreeze);
+    Object.freeze(value);
+  }
+  return value;
+}
+
+/**
+ * Returns the settings of a workspace folder.
+ *
+ * The returned settings are a frozen snapshot that is shared between callers.
+ */
+export function getWorkspaceSettings(
   namespace: string,
-): boolean {
-  const settings = [
-    `${namespace}.codeAction`,
-    `${namespace}.configuration`,
-    `${namespace}.enable`,
-    `${namespace}.nativeServer`,
-    `${namespace}.fixAll`,
-    `${namespace}.ignoreStandardLibrary`,
-    `${namespace}.importStrategy`,
-    `${namespace}.interpreter`,
-    `${namespace}.lint.enable`,
-    `${namespace}.lint.run`,
-    `${namespace}.lint.preview`,
-    `${namespace}.lint.select`,
-    `${namespace}.lint.extendSelect`,
-    `${namespace}.lint.ignore`,
-    `${namespace}.organizeImports`,
-    `${namespace}.path`,
-    `${namespace}.showNotifications`,
-    `${namespace}.format.preview`,
-    `${namespace}.format.backend`,
-    `${namespace}.exclude`,
-    `${namespace}.lineLength`,
-    `${namespace}.configurationPreference`,
-    `${namespace}.showSyntaxErrors`,
-    `${namespace}.logLevel`,
-    `${namespace}.logFile`,
-    // Deprecated settings (prefer `lint.args`, etc.).
-    `${namespace}.args`,
-    `${namespace}.run`,
-    // Deprecated settings (will be replaced with specific config options in the future)
-    `${namespace}.lint.args`,
-    `${namespace}.format.args`,
-  ];
-  return settings.some((s) => e.affectsConfiguration(s));
+  workspace: WorkspaceFolder,
+): Promise<ISettings> {
+  return getSnapshot(namespace, workspace);
+}
+
+/**
+ * Returns the global settings for the extension.
+ *
+ * ## Notes
+ *
+ * The global settings do not belong to a specific workspace. This means that
+ * variables such as `${workspaceFolder}` or `${workspaceFolder:...}` are not
+ * resolved. The language server does not support these variables, so they are
+ * filtered out. For example, if `configuration` has either of these variables,
+ * it will be set to `null`.
+ *
+ * The returned settings are a frozen snapshot that is shared between callers.
+ */
+export function getGlobalSettings(namespace: string): Promise<ISettings> {
+  return getSnapshot(namespace);
+}
+
+/**
+ * Discards all settings snapshots, e.g. because the workspace folders changed and
+ * `${workspaceFolder:...}` variables may resolve differently.
+ */
+export function clearSettingsSnapshots() {
+  settingsSnapshots.clear();
+}
+
+export type SettingsChange = {
+  /**
+   * The URI of the workspace folder whose settings changed, or `undefined` for the
+   * global settings.
+   */
+  workspace?: string;
+  /**
+   * The changed settings as dotted paths, e.g. `lint.select`.
+   */
+  keys: string[];
+};
+
+/**
+ * Returns the dotted paths of the settings that differ between two snapshots.
+ *
+ * Nested objects, like `lint` or an inline `configuration`, are compared key by key,
+ * everything else by value.
+ */
+export function diffSettings(previous: object, next: object, prefix = ""): string[] {
+  const isObject = (value: unknown): value is object =>
+    value != null && typeof value === "object" && !Array.isArray(value);
+  const keys = new Set([...Object.keys(previous), ...Object.keys(next)]);
+  return [...keys].flatMap((key) => {
+    const before = (previous as Record<string, unknown>)[key];
+    const after = (next as Record<string, unknown>)[key];
+    if (isObject(before) && isObject(after)) {
+      return diffSettings(before, after, `${prefix}${key}.`);
+    }
+    return JSON.stringify(before) === JSON.stringify(after) ? [] : [`${prefix}${key}`];
+  });
+}
+
+/**
+ * Re-reads the snapshots affected by a configuration change and returns what changed.
+ *
+ * Snapshots whose scope isn't affected by the change are kept as-is. The result is
+ * empty if the change didn't alter any setting, e.g. because a value was set to its
+ * default or an unrelated setting in the namespace changed. Workspace folders without a
+ * snapshot, e.g. because they were added since, get one; if the change affects them, all
+ * of their settings count as changed.
+ */
+export async function updateSettingsSnapshots(
+  event: ConfigurationChangeEvent,
+  namespace: string,
+): Promise<SettingsChange[]> {
+  if (!event.affectsConfiguration(namespace)) {
+    return [];
+  }
+
+  const affected = [...settingsSnapshots.entries()].filter(
+    ([, snapshot]) =>
+      snapshot.namespace === namespace &&
+      event.affectsConfiguration(namespace, snapshot.workspace?.uri),
+  );
+  const missing = getWorkspaceFolders().filter(
+    (workspace) => !settingsSnapshots.has(getSnapshotKey(namespace, workspace)),
+  );
+  const changes = await Promise.all([
+    ...affected.map(async ([key, snapshot]): Promise<SettingsChange> => {
+      settingsSnapshots.delete(key);
+      const previous = await snapshot.settings.catch(() => null);
+      const next = await getSnapshot(namespace, snapshot.workspace);
+      return {
+        workspace: snapshot.workspace?.uri.toString(),
+        keys: previous == null ? ["*"] : diffSettings(previous, next),
+      };
+    }),
+    ...missing.map(async (workspace): Promise<SettingsChange> => {
+      await getSnapshot(namespace, workspace);
+      return {
+        workspace: workspace.uri.toString(),
+        keys: event.affectsConfiguration(namespace, workspace.uri) ? ["*"] : [],
+      };
+    }),
+  ]);
+  return changes.filter((change) => change.keys.length > 0);
 }
 
 /**
@@ -371,56 +549,6 @@ export function checkInlineConfigSupport(ruffVersion: VersionInfo, serverId: str
   });
 }
 
-/**
- * Check if the user have configured `notebook.codeActionsOnSave` with non-notebook prefixed code actions.
- */
-export function checkNotebookCodeActionsOnSave(serverId: string) {
-  getWorkspaceFolders().forEach((workspace) => {
-    const codeActionsOnSave: string[] = (() => {
-      const value = getConfiguration("notebook", workspace.uri).get<string[] | object>(
-        "codeActionsOnSave",
-        [],
-      );
-      if (typeof value === "object") {
-        return Object.keys(value);
-      }
-      return value;
-    })();
-
-    const genericCodeActions = codeActionsOnSave.filter(
-      (action) => action === "source.organizeImports" || action === "source.fixAll",
-    );
-
-    const ruffCodeActions = codeActionsOnSave.filter(
-      (action) =>
-        action === `source.organizeImports.${serverId}` || action === `source.fixAll.${serverId}`,
-    );
-
-    if (genericCodeActions.length > 0) {
-      // This is at info level because other extensions might be using these code actions but we still want to inform the user.
-      logger.info(
-        `The following code actions in 'notebook.codeActionsOnSave' could lead to unexpected behavior: ${JSON.stringify(
-          genericCodeActions,
-        )}. Consider using ${JSON.stringify(
-          genericCodeActions.map((action) => `notebook.${action}`),
-        )} instead. For more information, refer to [this FAQ section](https://docs.astral.sh/ruff/faq/#source-code-actions-in-notebooks).`,
-      );
-    }
-
-    if (ruffCodeActions.length > 0) {
-      const message = `The following code actions in 'notebook.codeActionsOnSave' will lead to unexpected behavior: ${JSON.stringify(
-        ruffCodeActions,
-      )}. Please use ${JSON.stringify(
-        ruffCodeActions.map((action) => `notebook.${action}`),
-      )} instead. For more information, refer to [this FAQ section](https://docs.astral.sh/ruff/faq/#source-code-actions-in-notebooks).`;
-
-      logger.warn(message);
-      // Only show a warning if there are Ruff-specific code actions configured.
-      vscode.window.showWarningMessage(message);
-    }
-  });
-}
-
 /**
  * Represents the legacy server settings that were explicitly set by the user.
  */
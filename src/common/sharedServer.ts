@@ -0,0 +1,143 @@
+import { spawn } from "child_process";
+import { createHash } from "crypto";
+import * as fsapi from "fs-extra";
+import * as net from "net";
+import { platform, tmpdir } from "os";
+import * as path from "path";
+import { Executable, ServerOptions, StreamInfo } from "vscode-languageclient/node";
+import { RUFF_LSP_SERVER_SCRIPT_PATH } from "./constants";
+import { logger } from "./logger";
+import type { PythonCommand } from "./python";
+import type { IInitializationOptions } from "./server";
+import type { ServerProcess } from "./serverProcess";
+import type { ISettings } from "./settings";
+
+const SHARED_SERVER_START_TIMEOUT_MS = 10_000;
+const SHARED_SERVER_POLL_INTERVAL_MS = 100;
+
+/**
+ * Get the options that start `server`, or connect to the server shared by all windows of the
+ * project if `ruff.sharedServer` is enabled.
+ *
+ * The shared server is started by the launcher in `bundled/tool/server.py` with the given Python
+ * interpreter. It's reference-counted by its connections and shuts down after being idle.
+ */
+export async function getServerOptions(
+  settings: ISettings,
+  serverProcess: ServerProcess,
+  python: PythonCommand | null,
+  initializationOptions: IInitializationOptions,
+): Promise<ServerOptions> {
+  const server = serverProcess.executable;
+  const startServer = () => serverProcess.start();
+  if (!settings.sharedServer) {
+    return startServer;
+  }
+  if (platform() === "win32") {
+    logger.warn("'ruff.sharedServer' is not supported on Windows; starting a separate server.");
+    return startServer;
+  }
+  if (python == null) {
+    logger.warn("'ruff.sharedServer' requires a Python interpreter; starting a separate server.");
+    return startServer;
+  }
+
+  let socketPath: string;
+  try {
+    socketPath = await getSharedServerSocketPath(server, initializationOptions);
+  } catch (error) {
+    logger.warn(`Unable to share the server: ${error}; starting a separate server.`);
+    return startServer;
+  }
+  return async (): Promise<StreamInfo> => {
+    let socket = await connect(socketPath).catch(() => null);
+    if (socket == null) {
+      logger.info(`Starting a shared server on ${socketPath}`);
+      startSharedServer(python, server, socketPath);
+      socket = await waitForSharedServer(socketPath);
+    } else {
+      logger.info(`Connected to the shared server on ${socketPath}`);
+    }
+    return { reader: socket, writer: socket };
+  };
+}
+
+/**
+ * Get the socket of the shared server. Windows only share a server if they run the same command in
+ * the same directory with the same settings.
+ */
+export async function getSharedServerSocketPath(
+  server: Executable,
+  initializationOptions: IInitializationOptions,
+): Promise<string> {
+  // Use a directory that only the current user can access, so that no other user can connect to,
+  // or impersonate, the shared server.
+  const directory = path.join(process.env.XDG_RUNTIME_DIR || tmpdir(), "ruff-vscode");
+  await fsapi.ensureDir(directory, 0o700);
+  const stats = await fsapi.stat(directory);
+  if (stats.uid !== process.getuid?.() || (stats.mode & 0o077) !== 0) {
+    throw new Error(`${directory} must only be accessible by the current user`);
+  }
+
+  const key = JSON.stringify([
+    server.command,
+    server.args ?? [],
+    server.options?.cwd,
+    initializationOptions,
+  ]);
+  // Unix domain socket paths are limited to about 100 characters.
+  const hash = createHash("sha256").update(key).digest("hex").slice(0, 16);
+  return path.join(directory, `${hash}.sock`);
+}
+
+function startSharedServer(python: PythonCommand, server: Executable, socketPath: string) {
+  // The shared server outlives this window, so it logs to a file instead of the output channel.
+  const log = fsapi.openSync(`${socketPath}.log`, "a");
+  try {
+    const args = [
+      ...python.args,
+      RUFF_LSP_SERVER_SCRIPT_PATH,
+      "--shared",
+      socketPath,
+      "--",
+      server.command,
+      ...(server.args ?? []),
+    ];
+    logger.info(`Shared server run command: ${[python.executable, ...args].join(" ")}`);
+    spawn(python.executable, args, {
+      cwd: server.options?.cwd,
+      env: server.options?.env,
+      detached: true,
+      stdio: ["ignore", "ignore", log],
+    }).unref();
+  } finally {
+    fsapi.closeSync(log);
+  }
+}
+
+async function waitForSharedServer(socketPath: string): Promise<net.Socket> {
+  const deadline = Date.now() + SHARED_SERVER_START_TIMEOUT_MS;
+  for (;;) {
+    try {
+      return await connect(socketPath);
+    } catch (error) {
+      if (Date.now() > deadline) {
+        throw new Error(
+          `Failed to connect to the shared server (${error}); see ${socketPath}.log for details.`,
+        );
+      }
+    }
+    await new Promise((resolve) => setTimeout(resolve, SHARED_SERVER_POLL_INTERVAL_MS));
+  }
+}
+
+function connect(socketPath: string): Promise<net.Socket> {
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(socketPath);
+    socket.once("error", reject);
+    socket.once("connect", () => {
+      socket.off("error", reject);
+      resolve(socket);
+    });
+  });
+}
@@ -8,6 +8,7 @@ import { getDocumentSelector } from "./utilities";
 
 let _status: LanguageStatusItem | undefined;
 let _serverKind: "native" | "ruff-lsp" | undefined;
+let _largeDocuments = 0;
 
 export function registerLanguageStatusItem(id: string, name: string, command: string): Disposable {
   _status = createLanguageStatusItem(id, getDocumentSelector());
@@ -27,6 +28,20 @@ export function updateServerKind(native: boolean): void {
   _serverKind = native ? "native" : "ruff-lsp";
 }
 
+export function updateLargeDocumentCount(count: number): void {
+  _largeDocuments = count;
+  if (_status) {
+    _status.detail = largeDocumentDetail();
+  }
+}
+
+function largeDocumentDetail(): string | undefined {
+  if (_largeDocuments === 0) {
+    return undefined;
+  }
+  return l10n.t("Reduced linting for {0} large document(s)", _largeDocuments);
+}
+
 export function updateStatus(
   status: string | undefined,
   severity: LanguageStatusSeverity,
@@ -41,6 +56,6 @@ export function updateStatus(
     _status.text = status && status.length > 0 ? `${name}: ${status}` : `${name}`;
     _status.severity = severity;
     _status.busy = busy ?? false;
-    _status.detail = detail;
+    _status.detail = detail ?? largeDocumentDetail();
   }
 }
@@ -1,7 +1,7 @@
 import * as fs from "fs-extra";
 import * as path from "path";
 import { Uri, WorkspaceFolder } from "vscode";
-import { DocumentSelector } from "vscode-languageclient";
+import { DocumentSelector, TextDocumentFilter } from "vscode-languageclient";
 import { getWorkspaceFolders, isVirtualWorkspace } from "./vscodeapi";
 
 export async function getProjectRoot(): Promise<WorkspaceFolder> {
@@ -35,7 +35,34 @@ export async function getProjectRoot(): Promise<WorkspaceFolder> {
   }
 }
 
-export function getDocumentSelector(): DocumentSelector {
+/**
+ * Get the documents handled by the server.
+ *
+ * When `folders` is given, only the files in those workspace folders are selected. This lets the
+ * servers of a multi-root workspace handle the files of their own folders, while one server selects
+ * every document and leaves the folders of the other servers alone (see `excludeFolders`): it
+ * handles untitled documents, notebook cells, and files outside of the workspace folders.
+ */
+export function getDocumentSelector(folders?: readonly WorkspaceFolder[]): DocumentSelector {
+  const selector = getUnscopedDocumentSelector();
+  if (folders == null) {
+    return selector;
+  }
+  return selector.flatMap((filter) => {
+    if (filter.scheme != null && filter.scheme !== "file") {
+      return [];
+    }
+    return folders.map((folder) => ({
+      ...filter,
+      pattern: {
+        baseUri: folder.uri.toString(),
+        pattern: typeof filter.pattern === "string" ? filter.pattern : "**/*",
+      },
+    }));
+  });
+}
+
+function getUnscopedDocumentSelector(): TextDocumentFilter[] {
   return isVirtualWorkspace()
     ? [{ language: "python" }, { language: "markdown" }]
     : [
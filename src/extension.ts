@@ -1,6 +1,6 @@
-import { isDeepStrictEqual } from "node:util";
 import * as vscode from "vscode";
-import { LanguageClient } from "vscode-languageclient/node";
+import type { LanguageClient } from "vscode-languageclient/node";
+import { HealthWatchdog } from "./common/healthWatchdog";
 import { LazyOutputChannel, logger } from "./common/logger";
 import {
   getEnvironmentProvider,
@@ -9,13 +9,23 @@ import {
   PYTHON_ENVIRONMENTS_EXTENSION_ID,
   type OnDidChangeActivePythonEnvironmentEventArgs,
 } from "./common/python";
-import { resolveServer, type ServerState, startServer, stopServer } from "./common/server";
 import {
-  checkIfConfigurationChanged,
+  getServerFingerprint,
+  getServerStateForDocument,
+  resolveServer,
+  resolveServerGroups,
+  type ServerGroup,
+  type ServerState,
+  startServer,
+  stopServer,
+} from "./common/server";
+import {
+  clearSettingsSnapshots,
   getWorkspaceSettings,
   ISettings,
-  checkNotebookCodeActionsOnSave,
+  updateSettingsSnapshots,
 } from "./common/settings";
+import { getServerProcess } from "./common/serverProcess";
 import { loadServerDefaults } from "./common/setup";
 import { registerLanguageStatusItem } from "./common/status";
 import {
@@ -24,20 +34,54 @@ import {
   onDidGrantWorkspaceTrust,
   registerCommand,
 } from "./common/vscodeapi";
-import { getProjectRoot } from "./common/utilities";
+import { getDocumentSelector } from "./common/utilities";
 import {
   executeAutofix,
   executeFormat,
   executeOrganizeImports,
-  createDebugInformationProvider,
+  exportLogs,
 } from "./common/commands";
+import { createDebugInformationProvider } from "./common/debugInformation";
+import { checkNotebookCodeActionsOnSave } from "./common/notebookSettings";
 
-let serverState: ServerState | null = null;
+// One server per group of workspace folders that resolve to the same server.
+let serverStates: ServerState[] = [];
+let healthWatchdogs: HealthWatchdog[] = [];
 let restartQueued = false;
 let restartPromise: Promise<void> | null = null;
+// Stopped servers whose processes may not have exited yet.
+const serverExits = new Set<Promise<void>>();
+
+// Selecting an interpreter or opening a workspace can fire a burst of environment changes.
+const ENVIRONMENT_CHANGE_DEBOUNCE_MS = 250;
 
 function getClient(): LanguageClient | undefined {
-  return serverState?.client;
+  return getServerStateForDocument(serverStates, vscode.window.activeTextEditor?.document.uri)
+    ?.client;
+}
+
+function getProbeDocument(state: ServerState): vscode.TextDocument | undefined {
+  return vscode.workspace.textDocuments.find(
+    (document) =>
+      document.languageId === "python" &&
+      document.uri.scheme === "file" &&
+      getServerStateForDocument(serverStates, document.uri) === state,
+  );
+}
+
+async function stopServers(): Promise<void> {
+  healthWatchdogs.forEach((watchdog) => watchdog.dispose());
+  healthWatchdogs = [];
+  const states = serverStates;
+  serverStates = [];
+  const stopped = await Promise.all(states.map((state) => stopServer(state.client)));
+  stopped.forEach(({ exited }) => trackExit(exited));
+}
+
+// Let a replacement start while the old process exits, or is terminated.
+function trackExit(exited: Promise<void>): void {
+  serverExits.add(exited);
+  void exited.finally(() => serverExits.delete(exited));
 }
 
 export async function activate(context: vscode.ExtensionContext): Promise<void> {
@@ -50,7 +94,7 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
   // Log Server information
   logger.info(`Name: ${serverInfo.name}`);
   logger.info(`Module: ${serverInfo.module}`);
-  logger.debug(`Full Server Info: ${JSON.stringify(serverInfo)}`);
+  logger.debug(() => `Full Server Info: ${JSON.stringify(serverInfo)}`);
 
   // Create output channels for the server and trace logs
   const outputChannel = vscode.window.createOutputChannel(`${serverName} Language Server`);
@@ -116,22 +160,78 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
   }
 
   const runServer = async () => {
-    if (serverState != null) {
-      await stopServer(serverState.client);
-      serverState = null;
+    await stopServers();
+
+    const groups = await resolveServerGroups(serverId, environmentProvider);
+    const start = async (group: ServerGroup, index: number) => {
+      // With more than one server, the first one handles every document that isn't in the folders
+      // of the others, and the others only handle the files in their own folders.
+      const excludedFolders = groups.flatMap((other, i) =>
+        index === 0 && i !== 0 ? other.folders : [],
+      );
+      const state = await startServer(
+        group,
+        index === 0 ? getDocumentSelector() : getDocumentSelector(group.folders),
+        excludedFolders,
+        serverId,
+        serverName,
+        outputChannel,
+        traceOutputChannel,
+      );
+      if (state != null) {
+        const watchdog: HealthWatchdog = new HealthWatchdog(
+          state.client,
+          group.settings[0].health,
+          () => getProbeDocument(state),
+          () => getServerProcess(state.client)?.pid,
+          (reason) => {
+            logger.info(`Restarting ${serverName} because it is unhealthy: ${reason}.`);
+            healthWatchdogs = healthWatchdogs.filter((other) => other !== watchdog);
+            // The first server's providers have to be registered before those of the others, see
+            // below, so restarting it restarts all servers.
+            if (index === 0 && groups.length > 1) {
+              void requestRestart();
+            } else {
+              void restartServer(state, () => start(group, index));
+            }
+          },
+        );
+        healthWatchdogs.push(watchdog);
+      }
+      return state;
+    };
+    // Start the first server before the others: VS Code prefers the providers that were registered
+    // last, so formatting a file in another server's folder doesn't end up at the first server.
+    const states = groups.length === 0 ? [] : [await start(groups[0], 0)];
+    states.push(...(await Promise.all(groups.slice(1).map((group, i) => start(group, i + 1)))));
+    serverStates = states.filter((state): state is ServerState => state != null);
+  };
+
+  // Restart a single server, unless all servers are being restarted anyway.
+  const restartServer = async (
+    state: ServerState,
+    restart: () => Promise<ServerState | null>,
+  ) => {
+    if (restartPromise != null || !serverStates.includes(state)) {
+      return;
     }
 
-    const projectRoot = await getProjectRoot();
-    const workspaceSettings = await getWorkspaceSettings(serverId, projectRoot);
-    serverState = await startServer(
-      projectRoot,
-      workspaceSettings,
-      serverId,
-      serverName,
-      outputChannel,
-      traceOutputChannel,
-      environmentProvider,
-    );
+    restartPromise = (async () => {
+      try {
+        const { exited } = await stopServer(state.client);
+        trackExit(exited);
+        const replacement = await restart();
+        serverStates = serverStates.flatMap((other) =>
+          other !== state ? [other] : replacement != null ? [replacement] : [],
+        );
+      } finally {
+        restartPromise = null;
+      }
+    })();
+    await restartPromise;
+    if (restartQueued) {
+      await requestRestart();
+    }
   };
 
   const requestRestart = async () => {
@@ -174,69 +274,110 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
     return current;
   };
 
-  context.subscriptions.push(
-    onDidChangeActivePythonEnvironment(
-      async (event: OnDidChangeActivePythonEnvironmentEventArgs) => {
-        await enqueueActiveEnvironmentChange(async () => {
-          logger.info(
-            `Selected Python interpreter for '${event.uri ?? "workspace"}' changed to '${event.path ?? "<unknown>"}'.`,
-          );
-
-          if (restartPromise != null) {
-            logger.debug(
-              `${serverName} restart is already in progress; waiting before checking the Python environment change.`,
-            );
-            await restartPromise;
-          }
+  const handleActiveEnvironmentChanges = async (
+    events: OnDidChangeActivePythonEnvironmentEventArgs[],
+  ) => {
+    if (restartPromise != null) {
+      logger.debug(
+        `${serverName} restart is already in progress; waiting before checking the Python environment change.`,
+      );
+      await restartPromise;
+    }
 
-          const projectRoot = await getProjectRoot();
-          const affectsProjectRoot =
-            event.uri == null || event.uri.toString() === projectRoot.uri.toString();
-          if (!affectsProjectRoot) {
-            return;
-          }
+    if (serverStates.length === 0) {
+      await requestRestart();
+      return;
+    }
 
-          if (serverState == null) {
-            await requestRestart();
-            return;
-          }
+    // Check every served folder whose active environment changed.
+    const changed = serverStates.flatMap((state) =>
+      state.folders
+        .filter((folder) =>
+          events.some(
+            (event) => event.uri == null || event.uri.toString() === folder.uri.toString(),
+          ),
+        )
+        .map((folder) => ({ state, folder })),
+    );
+    if (changed.length === 0) {
+      return;
+    }
 
-          if (!serverState.resolution.dependsOnActiveInterpreter) {
-            logger.debug(
-              "Ignoring Python environment change because server selection is independent of it.",
-            );
-            return;
-          }
+    if (!changed.some(({ state }) => state.resolution.dependsOnActiveInterpreter)) {
+      logger.debug(
+        "Ignoring Python environment change because server selection is independent of it.",
+      );
+      return;
+    }
 
-          const settings = await getWorkspaceSettings(serverId, projectRoot);
-          const activeEnvironment =
-            (await environmentProvider?.getActiveEnvironment(projectRoot.uri)) ?? null;
-          const nextResolution = await resolveServer(
-            settings,
-            projectRoot,
-            serverId,
-            environmentProvider,
-            activeEnvironment,
-            false,
-          );
-
-          if (
-            nextResolution == null ||
-            !isDeepStrictEqual(nextResolution, serverState.resolution)
-          ) {
-            logger.info(`Restarting ${serverName} because the resolved server changed.`);
-            await requestRestart();
-          } else {
-            logger.debug("Python environment changed without changing the resolved server.");
-          }
-        });
-      },
-    ),
+    const resolutionsChanged = await Promise.all(
+      changed.map(async ({ state, folder }) => {
+        if (!state.resolution.dependsOnActiveInterpreter) {
+          return false;
+        }
+        const settings = await getWorkspaceSettings(serverId, folder);
+        const activeEnvironment =
+          (await environmentProvider?.getActiveEnvironment(folder.uri)) ?? null;
+        const nextResolution = await resolveServer(
+          settings,
+          folder,
+          serverId,
+          environmentProvider,
+          activeEnvironment,
+          false,
+        );
+        return (
+          nextResolution == null ||
+          getServerFingerprint(nextResolution) !== getServerFingerprint(state.resolution)
+        );
+      }),
+    );
+
+    if (resolutionsChanged.some((resolutionChanged) => resolutionChanged)) {
+      logger.info(`Restarting ${serverName} because the resolved server changed.`);
+      await requestRestart();
+    } else {
+      logger.debug("Python environment changed without changing the resolved server.");
+    }
+  };
+
+
+  // Only the latest change per workspace folder matters.
+  const pendingEnvironmentChanges = new Map<string, OnDidChangeActivePythonEnvironmentEventArgs>();
+  let environmentChangeTimer: NodeJS.Timeout | undefined;
+
+  context.subscriptions.push(
+    onDidChangeActivePythonEnvironment((event: OnDidChangeActivePythonEnvironmentEventArgs) => {
+      logger.info(
+        `Selected Python interpreter for '${event.uri ?? "workspace"}' changed to '${event.path ?? "<unknown>"}'.`,
+      );
+      pendingEnvironmentChanges.set(event.uri?.toString() ?? "", event);
+
+      clearTimeout(environmentChangeTimer);
+      environmentChangeTimer = setTimeout(() => {
+        const events = [...pendingEnvironmentChanges.values()];
+        pendingEnvironmentChanges.clear();
+        logger.debug(`Handling ${events.length} coalesced Python environment change(s).`);
+        void enqueueActiveEnvironmentChange(() => handleActiveEnvironmentChanges(events));
+      }, ENVIRONMENT_CHANGE_DEBOUNCE_MS);
+    }),
+    { dispose: () => clearTimeout(environmentChangeTimer) },
     onDidChangeConfiguration(async (e: vscode.ConfigurationChangeEvent) => {
-      if (checkIfConfigurationChanged(e, serverId)) {
+      const changes = await updateSettingsSnapshots(e, serverId);
+      if (changes.length > 0) {
+        const keys = [...new Set(changes.flatMap((change) => change.keys))];
+        logger.info(
+          `Restarting ${serverName} because the following settings changed: ${keys.join(", ")}`,
+        );
         await requestRestart();
       }
     }),
+    vscode.workspace.onDidChangeWorkspaceFolders(async () => {
+      clearSettingsSnapshots();
+      // The folders are grouped by server when the servers start.
+      logger.info(`Restarting ${serverName} because the workspace folders changed`);
+      await requestRestart();
+    }),
     onDidGrantWorkspaceTrust(async () => {
       await requestRestart();
     }),
@@ -246,22 +387,26 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
     registerCommand(`${serverId}.showServerLogs`, () => {
       outputChannel.show();
     }),
+    registerCommand(`${serverId}.exportLogs`, exportLogs),
     registerCommand(`${serverId}.restart`, async () => {
       await requestRestart();
     }),
     registerCommand(`${serverId}.executeAutofix`, async () => {
-      if (serverState != null) {
-        await executeAutofix(serverState.client, serverId);
+      const client = getClient();
+      if (client != null) {
+        await executeAutofix(client, serverId);
       }
     }),
     registerCommand(`${serverId}.executeFormat`, async () => {
-      if (serverState != null) {
-        await executeFormat(serverState.client, serverId);
+      const client = getClient();
+      if (client != null) {
+        await executeFormat(client, serverId);
       }
     }),
     registerCommand(`${serverId}.executeOrganizeImports`, async () => {
-      if (serverState != null) {
-        await executeOrganizeImports(serverState.client, serverId);
+      const client = getClient();
+      if (client != null) {
+        await executeOrganizeImports(client, serverId);
       }
     }),
     registerCommand(
@@ -276,15 +421,13 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
   await environmentProvider?.initialize(context.subscriptions);
 
   setImmediate(async () => {
-    if (serverState == null && restartPromise == null) {
+    if (serverStates.length === 0 && restartPromise == null) {
       await requestRestart();
     }
   });
 }
 
 export async function deactivate(): Promise<void> {
-  if (serverState != null) {
-    await stopServer(serverState.client);
-    serverState = null;
-  }
+  await stopServers();
+  await Promise.all(serverExits);
 }
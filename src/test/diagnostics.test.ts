@@ -0,0 +1,88 @@
+import * as assert from "assert";
+import * as vscode from "vscode";
+import { DiagnosticsPolicy } from "../common/diagnostics";
+
+suite("Diagnostics tests", () => {
+  test("Unchanged diagnostics are reused and capped per file", () => {
+    const policy = new DiagnosticsPolicy({ optimize: true, maxPerFile: 2, backgroundDelay: 0 });
+    try {
+      const uri = vscode.Uri.file("/example.py");
+      const diagnostic = (line: number, message: string) => {
+        const result = new vscode.Diagnostic(new vscode.Range(line, 0, line, 1), message);
+        result.code = "F401";
+        return result;
+      };
+      const applied: vscode.Diagnostic[][] = [];
+      const publish = (diagnostics: vscode.Diagnostic[]) =>
+        policy.middleware.handleDiagnostics?.(uri, diagnostics, (_uri, items) => {
+          applied.push(items);
+        });
+
+      publish([diagnostic(0, "a"), diagnostic(1, "b"), diagnostic(2, "c")]);
+      assert.strictEqual(applied.length, 1);
+      assert.deepStrictEqual(
+        applied[0].map((item) => item.message),
+        [
+          "a",
+          "b",
+          "1 more diagnostics are not shown because the file has more than 'ruff.diagnostics.maxPerFile' (2).",
+        ],
+      );
+      // The server must not treat the summary as one of its own diagnostics.
+      assert.notStrictEqual(applied[0][2].source, "Ruff");
+
+      // Republishing the same diagnostics doesn't update them.
+      publish([diagnostic(0, "a"), diagnostic(1, "b"), diagnostic(2, "c")]);
+      assert.strictEqual(applied.length, 1);
+
+      publish([diagnostic(0, "a"), diagnostic(1, "changed")]);
+      assert.strictEqual(applied.length, 2);
+      assert.strictEqual(applied[1][0], applied[0][0]);
+      assert.strictEqual(applied[1][1].message, "changed");
+    } finally {
+      policy.dispose();
+    }
+  });
+
+  test("Duplicate and changed diagnostics are applied", () => {
+    const policy = new DiagnosticsPolicy({ optimize: true, maxPerFile: 0, backgroundDelay: 0 });
+    try {
+      const uri = vscode.Uri.file("/example.py");
+      const diagnostic = (
+        message: string,
+        severity = vscode.DiagnosticSeverity.Warning,
+        data: unknown = null,
+      ) => {
+        const result = new vscode.Diagnostic(new vscode.Range(0, 0, 0, 1), message, severity);
+        return Object.assign(result, { data });
+      };
+      const applied: vscode.Diagnostic[][] = [];
+      const publish = (diagnostics: vscode.Diagnostic[]) =>
+        policy.middleware.handleDiagnostics?.(uri, diagnostics, (_uri, items) => {
+          applied.push(items);
+        });
+
+      publish([diagnostic("a"), diagnostic("b")]);
+      publish([diagnostic("a"), diagnostic("a")]);
+      assert.deepStrictEqual(
+        applied.map((items) => items.map((item) => item.message)),
+        [
+          ["a", "b"],
+          ["a", "a"],
+        ],
+      );
+      // Each diagnostic is only reused once.
+      assert.strictEqual(applied[1][0], applied[0][0]);
+      assert.notStrictEqual(applied[1][1], applied[0][0]);
+
+      publish([diagnostic("a", vscode.DiagnosticSeverity.Error), diagnostic("a")]);
+      publish([diagnostic("a", vscode.DiagnosticSeverity.Error), diagnostic("a", undefined, 1)]);
+      assert.strictEqual(applied.length, 4);
+      assert.strictEqual(applied[2][0].severity, vscode.DiagnosticSeverity.Error);
+      assert.strictEqual(applied[3][0], applied[2][0]);
+      assert.deepStrictEqual((applied[3][1] as { data?: unknown }).data, 1);
+    } finally {
+      policy.dispose();
+    }
+  });
+});
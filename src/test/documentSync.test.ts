@@ -0,0 +1,78 @@
+import * as assert from "assert";
+import * as vscode from "vscode";
+import { DocumentSyncScheduler } from "../common/documentSync";
+
+suite("Document sync tests", () => {
+  test("Documents in background tabs are opened in the server on demand", async () => {
+    const background = await vscode.workspace.openTextDocument({ language: "python" });
+    const closed = await vscode.workspace.openTextDocument({ language: "python" });
+    const scheduler = new DocumentSyncScheduler({ rate: 1 }, {});
+    try {
+      const sent: string[] = [];
+      const record = (name: string) => (document: vscode.TextDocument) => {
+        sent.push(`${name} ${document.uri.toString()}`);
+        return Promise.resolve();
+      };
+
+      await scheduler.middleware.didOpen?.(background, record("open"));
+      await scheduler.middleware.didOpen?.(closed, record("open"));
+      assert.deepStrictEqual(sent, []);
+      assert.strictEqual(scheduler.pending, 2);
+
+      // Closing a deferred document doesn't send anything, and changing one opens it instead.
+      await scheduler.middleware.didClose?.(closed, record("close"));
+      await scheduler.middleware.didChange?.(
+        { document: background, contentChanges: [], reason: undefined },
+        (event) => record("change")(event.document),
+      );
+      assert.deepStrictEqual(sent, [`open ${background.uri.toString()}`]);
+      assert.strictEqual(scheduler.pending, 0);
+    } finally {
+      scheduler.dispose();
+    }
+  });
+
+  test("Edits of deferred documents are applied once", async () => {
+    const document = await vscode.workspace.openTextDocument({
+      language: "python",
+      content: "import os\n",
+    });
+    const scheduler = new DocumentSyncScheduler({ rate: 1 }, {});
+    try {
+      // The text the server has, as the language client would send it.
+      let text: string | undefined;
+      await scheduler.middleware.didOpen?.(document, (opened) => {
+        text = opened.getText();
+        return Promise.resolve();
+      });
+      assert.strictEqual(text, undefined);
+
+      const edit = new vscode.WorkspaceEdit();
+      edit.insert(document.uri, new vscode.Position(0, 0), "import sys\n");
+      assert.ok(await vscode.workspace.applyEdit(edit));
+      await scheduler.middleware.didChange?.(
+        {
+          document,
+          contentChanges: [
+            {
+              range: new vscode.Range(0, 0, 0, 0),
+              rangeOffset: 0,
+              rangeLength: 0,
+              text: "import sys\n",
+            },
+          ],
+          reason: undefined,
+        },
+        (event) => {
+          for (const { rangeOffset, rangeLength, text: inserted } of event.contentChanges) {
+            text = text!.slice(0, rangeOffset) + inserted + text!.slice(rangeOffset + rangeLength);
+          }
+          return Promise.resolve();
+        },
+      );
+      assert.strictEqual(text, "import sys\nimport os\n");
+    } finally {
+      scheduler.dispose();
+    }
+  });
+});
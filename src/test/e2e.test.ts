@@ -1,10 +1,10 @@
 import * as vscode from "vscode";
 import * as assert from "assert";
-import { getDocumentUri, activateExtension, sleep } from "./helper";
+import { getDocumentUri, activateExtension, isWindows, sleep, useFakeServer } from "./helper";
 
-suite("E2E tests", () => {
-  const TIMEOUT = 5000;
+const TIMEOUT = 5000;
 
+suite("E2E tests", () => {
   teardown(async () => {
     await vscode.commands.executeCommand("workbench.action.closeAllEditors");
   });
@@ -92,8 +92,90 @@ def function(
     const formattedContent = document.getText();
     assert.equal(formattedContent, expectedContent);
   });
+
+  test("Should publish diagnostics soon after restarting the server", async function () {
+    // The extension is already active because the fixture contains Python files, so time the
+    // restarts, which resolve and start the server the same way as activation.
+    const RUNS = 5;
+    // Generous enough for slow CI machines, but catches a server that's slow to come up.
+    const MAX_MEDIAN_MS = 3000;
+    this.timeout(RUNS * TIMEOUT * 2);
+    await activateExtension();
+
+    const documentUri = getDocumentUri("diagnostics.py");
+    await vscode.window.showTextDocument(await vscode.workspace.openTextDocument(documentUri));
+
+    const samples: number[] = [];
+    for (let run = 0; run < RUNS; run++) {
+      samples.push(
+        await timeToDiagnostics(documentUri, () => vscode.commands.executeCommand("ruff.restart")),
+      );
+    }
+    samples.sort((a, b) => a - b);
+    const median = samples[Math.floor(RUNS / 2)];
+    assert.ok(
+      median <= MAX_MEDIAN_MS,
+      `Median time to diagnostics after a restart is ${median}ms, more than ${MAX_MEDIAN_MS}ms ` +
+        `(samples: ${samples.join(", ")}ms)`,
+    );
+  });
+
+  test("Should show the latest diagnostics of a server that floods them", async function () {
+    if (isWindows()) {
+      // The fake server is started through its shebang.
+      this.skip();
+    }
+    await activateExtension();
+    const restore = await useFakeServer({ flood: { notifications: 200, diagnostics: 5 } });
+    try {
+      const documentUri = getDocumentUri("diagnostics.py");
+      await vscode.window.showTextDocument(await vscode.workspace.openTextDocument(documentUri));
+
+      let timeout = TIMEOUT;
+      let actualDiagnostics = vscode.languages.getDiagnostics(documentUri);
+      while (!actualDiagnostics.some((d) => d.code === "FAKE") && timeout > 0) {
+        await sleep(100);
+        actualDiagnostics = vscode.languages.getDiagnostics(documentUri);
+        timeout -= 100;
+      }
+      assert.deepEqual(
+        actualDiagnostics.map((diagnostic) => diagnostic.message),
+        [0, 1, 2, 3, 4].map((index) => `Fake diagnostic ${index}`),
+      );
+    } finally {
+      await restore();
+    }
+  });
 });
 
+/**
+ * Returns the milliseconds between calling `action` and the diagnostics of `uri` being published
+ * again after they were cleared.
+ */
+function timeToDiagnostics(uri: vscode.Uri, action: () => Thenable<unknown>): Promise<number> {
+  return new Promise((resolve, reject) => {
+    const start = Date.now();
+    let cleared = vscode.languages.getDiagnostics(uri).length === 0;
+    const timer = setTimeout(() => {
+      listener.dispose();
+      reject(new Error(`No diagnostics published within ${TIMEOUT}ms`));
+    }, TIMEOUT);
+    const listener = vscode.languages.onDidChangeDiagnostics((event) => {
+      if (!event.uris.some((changed) => changed.toString() === uri.toString())) {
+        return;
+      }
+      if (vscode.languages.getDiagnostics(uri).length === 0) {
+        cleared = true;
+      } else if (cleared) {
+        clearTimeout(timer);
+        listener.dispose();
+        resolve(Date.now() - start);
+      }
+    });
+    action().then(undefined, reject);
+  });
+}
+
 function toRange(startLine: number, startChar: number, endLine: number, endChar: number) {
   const start = new vscode.Position(startLine, startChar);
   const end = new vscode.Position(endLine, endChar);
@@ -0,0 +1,55 @@
+import * as assert from "assert";
+import * as vscode from "vscode";
+import { State } from "vscode-languageclient";
+import type { LanguageClient } from "vscode-languageclient/node";
+import { HealthWatchdog } from "../common/healthWatchdog";
+
+suite("Health watchdog tests", () => {
+  test("Unresponsive servers are restarted after consecutive failed probes", async () => {
+    const document = await vscode.workspace.openTextDocument({
+      language: "python",
+      content: "import os\n",
+    });
+    let respond = false;
+    const unanswered: vscode.CancellationToken[] = [];
+    const client = {
+      state: State.Running,
+      initializeResult: { capabilities: { hoverProvider: true } },
+      sendRequest: (_type: unknown, _params: unknown, token: vscode.CancellationToken) => {
+        if (respond) {
+          return Promise.resolve(null);
+        }
+        unanswered.push(token);
+        return new Promise(() => {});
+      },
+    } as unknown as LanguageClient;
+    const reasons: string[] = [];
+    const watchdog = new HealthWatchdog(
+      client,
+      { interval: 0, latencyThreshold: 10, memoryThreshold: 0 },
+      () => document,
+      () => undefined,
+      (reason) => reasons.push(reason),
+    );
+
+    try {
+      // A response resets the failure count.
+      await watchdog.probe();
+      await watchdog.probe();
+      respond = true;
+      await watchdog.probe();
+      respond = false;
+      await watchdog.probe();
+      await watchdog.probe();
+      assert.deepStrictEqual(reasons, []);
+
+      await watchdog.probe();
+      assert.deepStrictEqual(reasons, ["no response within 10 ms"]);
+      // Requests that timed out are cancelled.
+      assert.strictEqual(unanswered.length, 5);
+      assert.ok(unanswered.every((token) => token.isCancellationRequested));
+    } finally {
+      watchdog.dispose();
+    }
+  });
+});
@@ -29,6 +29,52 @@ export const getDocumentUri = (p: string) => {
   return vscode.Uri.file(getDocumentPath(p));
 };
 
+/**
+ * Restarts the extension with the fake server in `tests/client/fake_server.py`, which injects the
+ * given faults, as the Ruff executable. Returns a function that restores the previous server.
+ *
+ * Both wait for the restarted server to publish diagnostics for `diagnostics.py`: the fake server
+ * publishes a `FAKE` diagnostic for every document.
+ */
+export async function useFakeServer(faults: object): Promise<() => Promise<void>> {
+  const config = vscode.workspace.getConfiguration("ruff");
+  const previousPath = config.inspect<string[]>("path")?.workspaceValue;
+  const document = await vscode.workspace.openTextDocument(getDocumentUri("diagnostics.py"));
+  const isFake = (diagnostic: vscode.Diagnostic) => diagnostic.code === "FAKE";
+
+  process.env.RUFF_FAKE_SERVER_FAULTS = JSON.stringify(faults);
+  // Changing the path restarts the server.
+  await config.update(
+    "path",
+    [path.resolve(__dirname, "../../tests/client/fake_server.py")],
+    vscode.ConfigurationTarget.Workspace,
+  );
+  await waitForDiagnostics(document.uri, (diagnostics) => diagnostics.some(isFake));
+
+  return async () => {
+    delete process.env.RUFF_FAKE_SERVER_FAULTS;
+    await config.update("path", previousPath, vscode.ConfigurationTarget.Workspace);
+    await waitForDiagnostics(
+      document.uri,
+      (diagnostics) => diagnostics.length > 0 && !diagnostics.some(isFake),
+    );
+  };
+}
+
+async function waitForDiagnostics(
+  uri: vscode.Uri,
+  predicate: (diagnostics: vscode.Diagnostic[]) => boolean,
+  timeout = 10000,
+) {
+  const deadline = Date.now() + timeout;
+  while (!predicate(vscode.languages.getDiagnostics(uri))) {
+    if (Date.now() > deadline) {
+      throw new Error(`The server did not restart within ${timeout}ms`);
+    }
+    await sleep(100);
+  }
+}
+
 export const isWindows = () => {
   return platform() === "win32";
 };
@@ -0,0 +1,73 @@
+import * as assert from "assert";
+import * as vscode from "vscode";
+import { DiagnosticPullMode } from "vscode-languageclient";
+import { flushPendingChanges, LargeDocumentPolicy } from "../common/largeDocuments";
+
+suite("Large document tests", () => {
+  test("Changes of large documents are batched until flushed", async () => {
+    const document = await vscode.workspace.openTextDocument({
+      language: "python",
+      content: "import os\n",
+    });
+    const policy = new LargeDocumentPolicy({ threshold: 1, debounce: 60_000 }, true);
+    const sent: vscode.TextDocumentChangeEvent[] = [];
+    const next = async (event: vscode.TextDocumentChangeEvent) => {
+      sent.push(event);
+    };
+    const change = (text: string) => ({
+      range: new vscode.Range(0, 0, 0, 0),
+      rangeOffset: 0,
+      rangeLength: 0,
+      text,
+    });
+
+    try {
+      for (const text of ["a", "b"]) {
+        await policy.middleware.didChange?.(
+          { document, contentChanges: [change(text)], reason: undefined },
+          next,
+        );
+      }
+      assert.strictEqual(sent.length, 0);
+
+      await flushPendingChanges(document);
+      assert.deepStrictEqual(
+        sent.map((event) => event.contentChanges.map((contentChange) => contentChange.text)),
+        [["a", "b"]],
+      );
+
+      // Requests for the document send the batched changes first.
+      await policy.middleware.didChange?.(
+        { document, contentChanges: [change("c")], reason: undefined },
+        next,
+      );
+      const position = new vscode.Position(0, 0);
+      const token = new vscode.CancellationTokenSource().token;
+      await policy.middleware.provideHover?.(document, position, token, () => {
+        assert.strictEqual(sent.length, 2);
+        return undefined;
+      });
+      assert.strictEqual(sent.length, 2);
+    } finally {
+      policy.dispose();
+    }
+  });
+
+  test("Only large documents pull diagnostics on save", async () => {
+    const small = await vscode.workspace.openTextDocument({ language: "python", content: "x\n" });
+    const large = await vscode.workspace.openTextDocument({
+      language: "python",
+      content: "x = 1\n".repeat(10),
+    });
+    const policy = new LargeDocumentPolicy({ threshold: 20, debounce: 0 }, false);
+    try {
+      const filter = policy.diagnosticPullOptions.filter!;
+      assert.strictEqual(filter(small, DiagnosticPullMode.onType), false);
+      assert.strictEqual(filter(small, DiagnosticPullMode.onSave), true);
+      assert.strictEqual(filter(large, DiagnosticPullMode.onType), true);
+      assert.strictEqual(filter(large, DiagnosticPullMode.onSave), false);
+    } finally {
+      policy.dispose();
+    }
+  });
+});
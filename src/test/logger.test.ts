@@ -0,0 +1,25 @@
+import * as assert from "assert";
+import { LogBuffer } from "../common/logger";
+
+suite("Logger tests", () => {
+  test("The log buffer evicts the least severe messages first", () => {
+    const buffer = new LogBuffer(40, 20);
+    buffer.add("error", "error 1");
+    buffer.add("debug", "debug 1");
+    buffer.add("info", "info 1");
+    buffer.add("debug", "debug 2");
+    buffer.add("warn", "warning 1234567890");
+    assert.deepStrictEqual(
+      buffer.entries().map((entry) => entry.message),
+      ["error 1", "info 1", "debug 2", "warning 1234567890"],
+    );
+    assert.match(buffer.format(), /\[error\] error 1\n/);
+
+    const large = new LogBuffer(1000, 20);
+    large.add("info", "x".repeat(100));
+    assert.deepStrictEqual(
+      large.entries().map((entry) => entry.message),
+      [`${"x".repeat(20)}... (80 characters truncated)`],
+    );
+  });
+});
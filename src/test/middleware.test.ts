@@ -0,0 +1,28 @@
+import * as assert from "assert";
+import * as vscode from "vscode";
+import { excludeFolders } from "../common/middleware";
+
+suite("Middleware tests", () => {
+  test("The first server leaves the folders of the other servers alone", async () => {
+    const workspace = vscode.workspace.workspaceFolders?.[0];
+    assert.ok(workspace, "A test workspace is required");
+    const inFolder = await vscode.workspace.openTextDocument(
+      vscode.Uri.joinPath(workspace.uri, "diagnostics.py"),
+    );
+    const untitled = await vscode.workspace.openTextDocument({
+      language: "python",
+      content: "import os\n",
+    });
+
+    const middleware = excludeFolders([workspace]);
+    const opened: string[] = [];
+    const didOpen = (document: vscode.TextDocument) => {
+      opened.push(document.uri.toString());
+      return Promise.resolve();
+    };
+    await middleware.didOpen!(inFolder, didOpen);
+    await middleware.didOpen!(untitled, didOpen);
+
+    assert.deepStrictEqual(opened, [untitled.uri.toString()]);
+  });
+});
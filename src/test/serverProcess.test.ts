@@ -0,0 +1,28 @@
+import * as assert from "assert";
+import { ServerProcess } from "../common/serverProcess";
+import { isWindows } from "./helper";
+
+suite("Server process tests", () => {
+  test("Servers that ignore termination are killed after the deadlines", async function () {
+    if (isWindows()) {
+      // Terminating a process on Windows always kills it.
+      this.skip();
+    }
+    const serverProcess = new ServerProcess(
+      {
+        command: process.execPath,
+        args: ["-e", "process.on('SIGTERM', () => {}); setInterval(() => {}, 1000);"],
+        options: { env: { ...process.env, ELECTRON_RUN_AS_NODE: "1" } },
+      },
+      { timeout: 100, terminateTimeout: 100 },
+    );
+    const child = await serverProcess.start();
+    // Give the process time to install its signal handler.
+    await new Promise((resolve) => setTimeout(resolve, 500));
+
+    const durations = await serverProcess.waitForExit();
+    assert.deepStrictEqual(Object.keys(durations), ["exit", "terminate", "kill"]);
+    assert.ok((durations.exit ?? 0) >= 100);
+    assert.strictEqual(child.signalCode, "SIGKILL");
+  });
+});
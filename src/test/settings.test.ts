@@ -0,0 +1,36 @@
+import * as assert from "assert";
+import * as vscode from "vscode";
+import { clearSettingsSnapshots, diffSettings, updateSettingsSnapshots } from "../common/settings";
+
+suite("Settings tests", () => {
+  test("Settings diffs list the changed settings as dotted paths", () => {
+    const previous = {
+      enable: true,
+      lint: { select: ["E"], run: "onType" },
+      configuration: { "line-length": 88 },
+    };
+    assert.deepStrictEqual(diffSettings(previous, JSON.parse(JSON.stringify(previous))), []);
+    assert.deepStrictEqual(
+      diffSettings(previous, {
+        enable: true,
+        lint: { select: ["E", "F"], run: "onType" },
+        configuration: "ruff.toml",
+      }),
+      ["lint.select", "configuration"],
+    );
+  });
+
+  test("Workspace folders without a snapshot get one when the settings change", async () => {
+    const workspace = vscode.workspace.workspaceFolders?.[0];
+    assert.ok(workspace, "A test workspace is required");
+    const event: vscode.ConfigurationChangeEvent = { affectsConfiguration: () => true };
+
+    clearSettingsSnapshots();
+    // Without a previous snapshot, every setting of the folder may have changed.
+    assert.deepStrictEqual(await updateSettingsSnapshots(event, "ruff"), [
+      { workspace: workspace.uri.toString(), keys: ["*"] },
+    ]);
+    // Later changes are compared to the new snapshot.
+    assert.deepStrictEqual(await updateSettingsSnapshots(event, "ruff"), []);
+  });
+});
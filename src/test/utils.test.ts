@@ -1,14 +1,21 @@
 import * as assert from "assert";
+import * as fsapi from "fs-extra";
+import { tmpdir } from "os";
+import * as path from "path";
 import * as vscode from "vscode";
-import { BUNDLED_RUFF_EXECUTABLE } from "../common/constants";
+import { BUNDLED_RUFF_EXECUTABLE, RUFF_BINARY_NAME } from "../common/constants";
 import type { EnvironmentProvider, PythonEnvironmentDetails } from "../common/python";
 import {
   execFileShellModeRequired,
+  findRuffBinaryInEnvironment,
   findRuffBinaryPath,
+  getServerFingerprint,
+  groupFolderResolutions,
   resolveServer,
   resolvePythonEnvironment,
 } from "../common/server";
 import type { ISettings } from "../common/settings";
+import { getDocumentSelector } from "../common/utilities";
 import { isWindows } from "./helper";
 
 suite("Utils tests", () => {
@@ -112,6 +119,78 @@ suite("Utils tests", () => {
       });
     }
   });
+
+  test("Ruff is found in virtual environments without running Python", async () => {
+    const sysPrefix = await fsapi.mkdtemp(path.join(tmpdir(), "ruff-venv-"));
+    try {
+      const details = { ...environment("/missing/python"), sysPrefix };
+      // Without a `pyvenv.cfg`, the layout of the environment is unknown.
+      assert.strictEqual(await findRuffBinaryInEnvironment(details), undefined);
+
+      await fsapi.writeFile(path.join(sysPrefix, "pyvenv.cfg"), "");
+      const ruff = path.join(sysPrefix, isWindows() ? "Scripts" : "bin", RUFF_BINARY_NAME);
+      await fsapi.outputFile(ruff, "");
+      assert.strictEqual(await findRuffBinaryInEnvironment(details), ruff);
+    } finally {
+      await fsapi.remove(sysPrefix);
+    }
+  });
+
+  test("Server fingerprints only depend on the server that is started", () => {
+    const native = (path: string, minor: number, dependsOnActiveInterpreter: boolean) =>
+      getServerFingerprint({
+        kind: "native",
+        executable: { path, version: { major: 0, minor, patch: 0 } },
+        dependsOnActiveInterpreter,
+      });
+
+    assert.strictEqual(native("/venv/bin/ruff", 9, true), native("/venv/bin/ruff", 9, false));
+    assert.notStrictEqual(native("/venv/bin/ruff", 9, true), native("/venv/bin/ruff", 10, true));
+    assert.notStrictEqual(native("/venv/bin/ruff", 9, true), native("/other/bin/ruff", 9, true));
+    assert.notStrictEqual(
+      native("/venv/bin/python", 9, true),
+      getServerFingerprint({
+        kind: "legacy",
+        interpreter: { executable: "/venv/bin/python", args: [] },
+        dependsOnActiveInterpreter: true,
+      }),
+    );
+  });
+
+  test("Workspace folders that resolve to the same server share it", () => {
+    const folder = (name: string, index: number): vscode.WorkspaceFolder => ({
+      uri: vscode.Uri.file(`/workspace/${name}`),
+      name,
+      index,
+    });
+    const native = (path: string, dependsOnActiveInterpreter: boolean) => ({
+      kind: "native" as const,
+      executable: { path, version: { major: 0, minor: 9, patch: 0 } },
+      dependsOnActiveInterpreter,
+    });
+    const [a, b, c, d] = ["a", "b", "c", "d"].map(folder);
+    const settings = {} as ISettings;
+
+    const groups = groupFolderResolutions([
+      { folder: a, settings, resolution: native("/venv/bin/ruff", false) },
+      { folder: b, settings, resolution: native("/other/bin/ruff", false) },
+      { folder: c, settings, resolution: native("/venv/bin/ruff", true) },
+      { folder: d, settings, resolution: null },
+    ]);
+
+    assert.deepStrictEqual(
+      groups.map((group) => group.folders.map((folder) => folder.name)),
+      [["a", "c"], ["b"]],
+    );
+    assert.strictEqual(groups[0].resolution.dependsOnActiveInterpreter, true);
+    // Untitled documents and notebook cells are left to the first server.
+    assert.deepStrictEqual(
+      getDocumentSelector([a]).filter(
+        (filter) => typeof filter !== "string" && filter.scheme !== "file",
+      ),
+      [],
+    );
+  });
 });
 
 function environment(executable: string, args: string[] = []): PythonEnvironmentDetails {
@@ -0,0 +1,205 @@
+"""Run the language server benchmarks and compare them against a stored baseline.
+
+Each run starts a fresh server and records one sample per metric. Baselines are stored
+as JSON together with the `ruff` and `ruff-lsp` versions pinned in `pyproject.toml`,
+and are specific to the machine that recorded them.
+
+Usage:
+    python -m tests.benchmarks record [--runs N]
+    python -m tests.benchmarks compare [--runs N] [--baseline PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+from tests.benchmarks import comparison, notebooks
+from tests.benchmarks.harness import (
+    SERVER_SCRIPT,
+    DiagnosticsWaiter,
+    generate_module,
+    timed,
+)
+from tests.benchmarks.sync import SCENARIOS, SyncBenchmark
+from tests.client import defaults, session
+from tests.client.constants import PROJECT_ROOT
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+FUNCTIONS = 2000
+NOTEBOOK_CELLS = 100
+FORMAT_REPETITIONS = 3
+
+
+def pinned_versions() -> dict[str, str]:
+    """Return the `ruff` and `ruff-lsp` versions pinned in `pyproject.toml`."""
+    pyproject = (PROJECT_ROOT / "pyproject.toml").read_text()
+    return dict(re.findall(r'"(ruff|ruff-lsp)==([^"]+)"', pyproject))
+
+
+def baseline_path(versions: dict[str, str]) -> Path:
+    """Return the path of the baseline recorded with the given pins."""
+    return (
+        BASELINES_DIR / f"ruff-{versions['ruff']}-ruff-lsp-{versions['ruff-lsp']}.json"
+    )
+
+
+def run_once() -> dict[str, float]:
+    """Start a server and record one sample of every metric."""
+    text = generate_module(FUNCTIONS)
+    with tempfile.TemporaryDirectory() as directory, session.LspSession(
+        cwd=os.getcwd(), script=SERVER_SCRIPT
+    ) as ls_session:
+        ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+        waiter = DiagnosticsWaiter(ls_session)
+        benchmark = SyncBenchmark(ls_session, waiter, directory)
+
+        first_diagnostics, uri = timed(benchmark.open, text)
+        format_latencies = [
+            timed(
+                lambda: ls_session.text_document_formatting(
+                    {
+                        "textDocument": {"uri": uri},
+                        "options": {"tabSize": 4, "insertSpaces": True},
+                    }
+                ).result(),
+            )[0]
+            for _ in range(FORMAT_REPETITIONS)
+        ]
+        benchmark.close(uri)
+
+        typing = benchmark.run(text, SCENARIOS["typing"](text))
+        notebook = notebooks.measure(ls_session, waiter, directory, NOTEBOOK_CELLS)
+
+    return {
+        "first_diagnostics_ms": first_diagnostics,
+        "format_ms": statistics.median(format_latencies),
+        "typing_ms": typing["latency"]["median"],
+        "notebook_edit_ms": notebook["edit_latency"]["median"],
+        "notebook_save_ms": notebook["save_ms"],
+        "notebook_format_ms": notebook["format_ms"],
+    }
+
+
+def run(runs: int) -> dict[str, list[float]]:
+    """Run the benchmarks `runs` times, returning the samples of every metric."""
+    samples: dict[str, list[float]] = {}
+    for index in range(runs):
+        print(f"Run {index + 1}/{runs}", file=sys.stderr)
+        for metric, value in run_once().items():
+            samples.setdefault(metric, []).append(value)
+    return samples
+
+
+def record(args: argparse.Namespace) -> int:
+    versions = pinned_versions()
+    path = args.output or baseline_path(versions)
+    baseline = {**versions, "runs": args.runs, "metrics": run(args.runs)}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2) + "\n")
+    print(
+        f"Recorded baseline for ruff {versions['ruff']} and ruff-lsp "
+        f"{versions['ruff-lsp']} in {path}"
+    )
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    versions = pinned_versions()
+    path = args.baseline or baseline_path(versions)
+    if not path.exists():
+        print(f"No baseline found at {path}; run `record` first.", file=sys.stderr)
+        return 2
+    baseline = json.loads(path.read_text())
+    current = run(args.runs)
+
+    print(
+        f"Comparing ruff {versions['ruff']} and ruff-lsp {versions['ruff-lsp']} "
+        f"against ruff {baseline['ruff']} and ruff-lsp {baseline['ruff-lsp']}"
+    )
+    print(
+        f"{'metric':<22}{'baseline':>10}{'current':>10}{'change':>9}"
+        f"{'95% CI':>18}{'p':>8}"
+    )
+    regressions = []
+    for metric, samples in current.items():
+        if metric not in baseline["metrics"]:
+            continue
+        result = comparison.compare(
+            samples,
+            baseline["metrics"][metric],
+            alpha=args.alpha,
+            min_change=args.min_change,
+        )
+        low, high = result.change_interval
+        print(
+            f"{metric:<22}{result.baseline_median:>10.1f}{result.current_median:>10.1f}"
+            f"{result.change:>+9.1%}{f'[{low:+.1%}, {high:+.1%}]':>18}"
+            f"{result.p_value:>8.3f}{'  REGRESSED' if result.regressed else ''}"
+        )
+        if result.regressed:
+            regressions.append(metric)
+
+    if regressions:
+        print(f"Performance regressed: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subcommands.add_parser(
+        "record", help="Record a baseline for the pinned versions."
+    )
+    record_parser.add_argument(
+        "--output",
+        type=Path,
+        help="Where to write the baseline. Defaults to a file named after the pins.",
+    )
+    record_parser.set_defaults(handler=record)
+
+    compare_parser = subcommands.add_parser(
+        "compare", help="Compare the pinned versions against a baseline."
+    )
+    compare_parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="The baseline to compare against. Defaults to the one for the pins.",
+    )
+    compare_parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.01,
+        help="The significance level of the Mann-Whitney U test.",
+    )
+    compare_parser.add_argument(
+        "--min-change",
+        type=float,
+        default=0.05,
+        help="The smallest relative slowdown of the median to report.",
+    )
+    compare_parser.set_defaults(handler=compare)
+
+    for subparser in (record_parser, compare_parser):
+        subparser.add_argument(
+            "--runs", type=int, default=10, help="The number of server runs."
+        )
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
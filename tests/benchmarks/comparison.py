@@ -0,0 +1,115 @@
+"""Statistical comparison of benchmark samples against a baseline."""
+
+from __future__ import annotations
+
+import dataclasses
+import math
+import random
+import statistics
+
+
+@dataclasses.dataclass(frozen=True)
+class Comparison:
+    """The result of comparing the samples of a metric against its baseline."""
+
+    baseline_median: float
+    current_median: float
+    change: float
+    """The relative change of the median, e.g. `0.1` for 10% slower."""
+
+    change_interval: tuple[float, float]
+    """A bootstrap confidence interval for `change`."""
+
+    p_value: float
+    """The one-sided Mann-Whitney U p-value for the current samples being slower."""
+
+    regressed: bool
+
+
+def mann_whitney_greater(current: list[float], baseline: list[float]) -> float:
+    """Return the p-value of the one-sided Mann-Whitney U test.
+
+    The alternative hypothesis is that the current samples tend to be greater than the
+    baseline samples. Uses the normal approximation with tie and continuity
+    corrections, which is accurate for the sample sizes used by the benchmarks.
+    """
+    samples = sorted(
+        [(value, True) for value in current] + [(value, False) for value in baseline]
+    )
+    n1, n2 = len(current), len(baseline)
+    n = n1 + n2
+
+    # Assign average ranks to ties.
+    rank_sum = 0.0
+    tie_correction = 0.0
+    start = 0
+    while start < n:
+        end = start
+        while end + 1 < n and samples[end + 1][0] == samples[start][0]:
+            end += 1
+        rank = (start + end) / 2 + 1
+        rank_sum += rank * sum(
+            1 for _, is_current in samples[start : end + 1] if is_current
+        )
+        ties = end - start + 1
+        tie_correction += ties**3 - ties
+        start = end + 1
+
+    u = rank_sum - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_correction / (n * (n - 1)))
+    if variance <= 0:
+        # All samples are equal.
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def median_change_interval(
+    current: list[float],
+    baseline: list[float],
+    *,
+    confidence: float = 0.95,
+    resamples: int = 2000,
+) -> tuple[float, float]:
+    """Return a bootstrap confidence interval for the relative change of the median."""
+    # Use a fixed seed so that repeated comparisons of the same samples agree.
+    rng = random.Random(0)
+    changes = sorted(
+        statistics.median(rng.choices(current, k=len(current)))
+        / statistics.median(rng.choices(baseline, k=len(baseline)))
+        - 1
+        for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2
+    return (
+        changes[int(tail * (resamples - 1))],
+        changes[int((1 - tail) * (resamples - 1))],
+    )
+
+
+def compare(
+    current: list[float],
+    baseline: list[float],
+    *,
+    alpha: float = 0.01,
+    min_change: float = 0.05,
+) -> Comparison:
+    """Compare the samples of a metric against its baseline.
+
+    A metric regresses if it is significantly slower according to the Mann-Whitney U
+    test, and its median is slower by at least `min_change`. The second condition
+    avoids flagging differences that are significant but too small to matter.
+    """
+    baseline_median = statistics.median(baseline)
+    current_median = statistics.median(current)
+    change = current_median / baseline_median - 1
+    p_value = mann_whitney_greater(current, baseline)
+    return Comparison(
+        baseline_median=baseline_median,
+        current_median=current_median,
+        change=change,
+        change_interval=median_change_interval(current, baseline),
+        p_value=p_value,
+        regressed=p_value < alpha and change >= min_change,
+    )
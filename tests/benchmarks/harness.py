@@ -0,0 +1,93 @@
+"""Shared helpers for the language server benchmarks."""
+
+from __future__ import annotations
+
+import statistics
+import threading
+import time
+from typing import Any
+
+from tests.client import session
+from tests.client.constants import PROJECT_ROOT
+
+SERVER_SCRIPT = PROJECT_ROOT / "bundled" / "tool" / "server.py"
+TIMEOUT_SECONDS = 60
+
+
+class DiagnosticsWaiter:
+    """Records the diagnostics published by the server for each document."""
+
+    def __init__(self, ls_session: session.LspSession) -> None:
+        self._condition = threading.Condition()
+        self._counts: dict[str, int] = {}
+        self._diagnostics: dict[str, list[dict[str, Any]]] = {}
+        ls_session.set_notification_callback(
+            session.PUBLISH_DIAGNOSTICS, self._on_publish
+        )
+
+    def _on_publish(self, params: dict[str, Any]) -> None:
+        with self._condition:
+            uri = params["uri"]
+            self._counts[uri] = self._counts.get(uri, 0) + 1
+            self._diagnostics[uri] = params["diagnostics"]
+            self._condition.notify_all()
+
+    def count(self, uri: str) -> int:
+        """Return the number of times diagnostics were published for `uri`."""
+        with self._condition:
+            return self._counts.get(uri, 0)
+
+    def wait(
+        self, uri: str, after: int, timeout: float = TIMEOUT_SECONDS
+    ) -> list[dict[str, Any]]:
+        """Wait until diagnostics are published for `uri` more than `after` times."""
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._counts.get(uri, 0) > after, timeout
+            ):
+                raise TimeoutError(f"No diagnostics published for {uri}")
+            return self._diagnostics[uri]
+
+
+def timed(function, *args, **kwargs) -> tuple[float, Any]:
+    """Call `function`, returning the elapsed time in milliseconds and its result."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Summarize latency samples in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": statistics.mean(ordered),
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def resident_memory(pid: int) -> int | None:
+    """Return the resident set size of process `pid` in bytes, if available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # `/proc` is only available on Linux.
+    return None
+
+
+def generate_module(functions: int) -> str:
+    """Generate a Python module with `functions` functions and a few violations."""
+    parts = ["import os\nimport sys\n"]
+    for index in range(functions):
+        parts.append(
+            f"\n\ndef function_{index}(value):\n"
+            f"    result = value + {index}\n"
+            f"    return result\n"
+        )
+    return "".join(parts)
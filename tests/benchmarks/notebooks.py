@@ -0,0 +1,222 @@
+"""Measure how `ruff-lsp` scales with the number of cells in a notebook.
+
+For every notebook size, a notebook is opened and:
+- A cell is edited one character at a time, measuring the time until the diagnostics
+  of all cells are published.
+- The notebook is saved, measuring the time until the diagnostics are published.
+- Every code cell is formatted, like VS Code's "Format Notebook" command.
+- The server's resident memory is sampled before and after opening the notebook.
+
+Usage: `python -m tests.benchmarks.notebooks [--cells 50 100 250 500 1000]`
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from concurrent.futures import wait
+from typing import Any
+
+from tests.benchmarks.harness import (
+    SERVER_SCRIPT,
+    DiagnosticsWaiter,
+    resident_memory,
+    summarize,
+    timed,
+)
+from tests.client import defaults, edits, session, utils
+
+CODE_CELL = 2
+
+
+def generate_cells(count: int) -> list[str]:
+    """Generate the sources of `count` code cells with a few violations each."""
+    return [
+        f"import os\nimport sys\n\nvalue_{index} =  os.getcwd()\n"
+        f"print(value_{index}, undefined_{index})\n"
+        for index in range(count)
+    ]
+
+
+class Notebook:
+    """A notebook that is open in the server."""
+
+    def __init__(self, ls_session: session.LspSession, path: str, cells: list[str]):
+        self._session = ls_session
+        self.uri = utils.as_uri(path)
+        self.cell_uris = [
+            f"vscode-notebook-cell:{path}#cell{index}" for index in range(len(cells))
+        ]
+        self.cells = list(cells)
+        self.version = 1
+        self._cell_versions = [1] * len(cells)
+
+    def open(self) -> None:
+        self._session.notify_notebook_did_open(
+            {
+                "notebookDocument": {
+                    "uri": self.uri,
+                    "notebookType": "jupyter-notebook",
+                    "version": self.version,
+                    "cells": [
+                        {"kind": CODE_CELL, "document": cell_uri}
+                        for cell_uri in self.cell_uris
+                    ],
+                },
+                "cellTextDocuments": [
+                    {
+                        "uri": cell_uri,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": text,
+                    }
+                    for cell_uri, text in zip(self.cell_uris, self.cells)
+                ],
+            }
+        )
+
+    def change_cell(self, index: int, changes: list[edits.Change]) -> None:
+        self.version += 1
+        self._cell_versions[index] += 1
+        for change in changes:
+            self.cells[index] = edits.apply_change(self.cells[index], change)
+        self._session.notify_notebook_did_change(
+            {
+                "notebookDocument": {"uri": self.uri, "version": self.version},
+                "change": {
+                    "cells": {
+                        "textContent": [
+                            {
+                                "document": {
+                                    "uri": self.cell_uris[index],
+                                    "version": self._cell_versions[index],
+                                },
+                                "changes": changes,
+                            }
+                        ]
+                    }
+                },
+            }
+        )
+
+    def save(self) -> None:
+        self._session.notify_notebook_did_save({"notebookDocument": {"uri": self.uri}})
+
+    def format(self) -> list[Any]:
+        futures = [
+            self._session.text_document_formatting(
+                {
+                    "textDocument": {"uri": cell_uri},
+                    "options": {"tabSize": 4, "insertSpaces": True},
+                }
+            )
+            for cell_uri in self.cell_uris
+        ]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        self._session.notify_notebook_did_close(
+            {
+                "notebookDocument": {"uri": self.uri},
+                "cellTextDocuments": [{"uri": cell_uri} for cell_uri in self.cell_uris],
+            }
+        )
+
+
+def measure(
+    ls_session: session.LspSession,
+    waiter: DiagnosticsWaiter,
+    directory: str,
+    cells: int,
+) -> dict[str, Any]:
+    """Measure the latencies and memory usage of a notebook with `cells` cells."""
+    path = os.path.join(directory, f"notebook_{cells}.ipynb")
+    notebook = Notebook(ls_session, path, generate_cells(cells))
+    # The server publishes the diagnostics of every cell in order, so the last cell's
+    # diagnostics are published once the whole notebook has been linted.
+    last_cell = notebook.cell_uris[-1]
+
+    memory_before = resident_memory(ls_session.process_id)
+    open_latency, _ = timed(_wait_for_diagnostics, waiter, last_cell, notebook.open)
+    memory_after = resident_memory(ls_session.process_id)
+
+    edited = cells // 2
+    text = notebook.cells[edited]
+    edit_latencies = []
+    for changes in edits.type_text(text, len(text), "x = 1\n"):
+        latency, _ = timed(
+            _wait_for_diagnostics,
+            waiter,
+            last_cell,
+            lambda changes=changes: notebook.change_cell(edited, changes),
+        )
+        edit_latencies.append(latency)
+
+    save_latency, _ = timed(_wait_for_diagnostics, waiter, last_cell, notebook.save)
+    format_latency, results = timed(notebook.format)
+    notebook.close()
+
+    return {
+        "cells": cells,
+        "open_ms": open_latency,
+        "edit_latency": summarize(edit_latencies),
+        "save_ms": save_latency,
+        "format_ms": format_latency,
+        "formatted_cells": sum(1 for result in results if result),
+        "memory_bytes": memory_after,
+        "memory_delta_bytes": (
+            memory_after - memory_before
+            if memory_before is not None and memory_after is not None
+            else None
+        ),
+    }
+
+
+def _wait_for_diagnostics(waiter: DiagnosticsWaiter, uri: str, action) -> None:
+    seen = waiter.count(uri)
+    action()
+    waiter.wait(uri, seen)
+
+
+def run(sizes: list[int]) -> list[dict[str, Any]]:
+    """Measure notebooks with each number of cells in `sizes`."""
+    with tempfile.TemporaryDirectory() as directory, session.LspSession(
+        cwd=os.getcwd(), script=SERVER_SCRIPT
+    ) as ls_session:
+        ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+        waiter = DiagnosticsWaiter(ls_session)
+        return [measure(ls_session, waiter, directory, cells) for cells in sizes]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cells",
+        type=int,
+        nargs="+",
+        default=[50, 100, 250, 500, 1000],
+        help="The numbers of cells to measure.",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'cells':>6}{'open ms':>10}{'edit median':>13}{'edit p95':>10}"
+        f"{'save ms':>10}{'format ms':>11}{'RSS MiB':>10}{'delta MiB':>11}"
+    )
+    for result in run(args.cells):
+        memory = result["memory_bytes"]
+        delta = result["memory_delta_bytes"]
+        print(
+            f"{result['cells']:>6}{result['open_ms']:>10.1f}"
+            f"{result['edit_latency']['median']:>13.1f}"
+            f"{result['edit_latency']['p95']:>10.1f}"
+            f"{result['save_ms']:>10.1f}{result['format_ms']:>11.1f}"
+            f"{memory / 2**20 if memory is not None else float('nan'):>10.1f}"
+            f"{delta / 2**20 if delta is not None else float('nan'):>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Compare diagnostics latency under incremental and full document sync.
+
+Each scenario replays an edit script against a generated module, waiting for the
+server to publish diagnostics after every notification. The script is sent once with
+incremental changes and once with the whole document, and the final diagnostics are
+compared against those of a freshly opened copy of the expected text to check that the
+server's view of the document matches the client's.
+
+Usage: `python -m tests.benchmarks.sync [--functions N]`
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+from typing import Any, Callable
+
+from tests.benchmarks.harness import (
+    SERVER_SCRIPT,
+    DiagnosticsWaiter,
+    generate_module,
+    summarize,
+    timed,
+)
+from tests.client import defaults, edits, session, utils
+
+SCENARIOS: dict[str, Callable[[str], edits.EditScript]] = {
+    "typing": lambda text: edits.type_text(
+        text, text.index("\n") + 1, "import re\nimport json\n"
+    ),
+    "paste": lambda text: edits.paste(text, len(text), generate_module(20)),
+    "multi-cursor": lambda text: edits.multi_cursor(
+        text,
+        [
+            text.index("return result", text.index(f"def function_{index}("))
+            for index in range(10)
+        ],
+        "_ = ",
+    ),
+    "large-deletion": lambda text: edits.delete(
+        text, text.index("\n\n\ndef", len(text) // 2), len(text)
+    ),
+}
+
+
+class SyncBenchmark:
+    """Replays edit scripts against a running server."""
+
+    def __init__(
+        self,
+        ls_session: session.LspSession,
+        waiter: DiagnosticsWaiter,
+        directory: str,
+    ) -> None:
+        self._session = ls_session
+        self._waiter = waiter
+        self._directory = directory
+        self._documents = 0
+
+    def run(self, text: str, script: edits.EditScript) -> dict[str, Any]:
+        """Replay `script` on a new document containing `text`."""
+        uri = self.open(text)
+        latencies = []
+        payload = 0
+        diagnostics: list[dict[str, Any]] = []
+        for version, changes in enumerate(script, start=2):
+            seen = self._waiter.count(uri)
+            params = {
+                "textDocument": {"uri": uri, "version": version},
+                "contentChanges": changes,
+            }
+            payload += len(json.dumps(changes))
+            latency, diagnostics = timed(self._notify_and_wait, uri, seen, params)
+            latencies.append(latency)
+
+        expected_uri = self.open(edits.apply_script(text, script))
+        expected = self._waiter.wait(expected_uri, 0)
+        self.close(uri)
+        self.close(expected_uri)
+
+        return {
+            "latency": summarize(latencies),
+            "payload_bytes": payload,
+            "in_sync": _normalized(diagnostics) == _normalized(expected),
+        }
+
+    def _notify_and_wait(
+        self, uri: str, seen: int, params: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        self._session.notify_did_change(params)
+        return self._waiter.wait(uri, seen)
+
+    def open(self, text: str) -> str:
+        """Open a new document containing `text` and wait for its diagnostics."""
+        self._documents += 1
+        uri = utils.as_uri(
+            os.path.join(self._directory, f"document_{self._documents}.py")
+        )
+        self._session.notify_did_open(
+            {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": text,
+                }
+            }
+        )
+        self._waiter.wait(uri, 0)
+        return uri
+
+    def close(self, uri: str) -> None:
+        self._session.notify_did_close({"textDocument": {"uri": uri}})
+
+
+def _normalized(diagnostics: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return sorted(diagnostics, key=lambda diagnostic: json.dumps(diagnostic))
+
+
+def run(functions: int) -> dict[str, dict[str, Any]]:
+    """Run every scenario with incremental and full sync."""
+    text = generate_module(functions)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, session.LspSession(
+        cwd=os.getcwd(), script=SERVER_SCRIPT
+    ) as ls_session:
+        ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+        benchmark = SyncBenchmark(ls_session, DiagnosticsWaiter(ls_session), directory)
+        for name, build_script in SCENARIOS.items():
+            script = build_script(text)
+            results[f"{name}/incremental"] = benchmark.run(text, script)
+            results[f"{name}/full"] = benchmark.run(
+                text, edits.as_full_sync(text, script)
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--functions",
+        type=int,
+        default=2000,
+        help="The number of functions in the generated module.",
+    )
+    args = parser.parse_args()
+
+    results = run(args.functions)
+    print(f"{'scenario':<30}{'median ms':>12}{'p95 ms':>12}{'payload KiB':>14}  sync")
+    for name, result in results.items():
+        latency = result["latency"]
+        print(
+            f"{name:<30}{latency['median']:>12.1f}{latency['p95']:>12.1f}"
+            f"{result['payload_bytes'] / 1024:>14.1f}  "
+            f"{'ok' if result['in_sync'] else 'MISMATCH'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
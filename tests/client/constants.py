@@ -7,3 +7,4 @@ import pathlib
 TEST_ROOT = pathlib.Path(__file__).parent.parent
 TEST_DATA = TEST_ROOT / "data"
 PROJECT_ROOT = TEST_ROOT.parent
+FAKE_SERVER_SCRIPT = TEST_ROOT / "client" / "fake_server.py"
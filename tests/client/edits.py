@@ -0,0 +1,123 @@
+"""Helpers to build `textDocument/didChange` notifications that mimic editing.
+
+An edit script is a list of notifications, where each notification is the list of
+content changes that an editor would send for a single user action. The changes in a
+notification are applied in order, each one to the result of the previous one.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+Change = Dict[str, Any]
+"""A `TextDocumentContentChangeEvent`."""
+
+EditScript = List[List[Change]]
+"""The content changes of a sequence of `textDocument/didChange` notifications."""
+
+
+def position_at(text: str, offset: int) -> dict[str, int]:
+    """Return the LSP position of the character at `offset` in `text`."""
+    line = text.count("\n", 0, offset)
+    line_start = text.rfind("\n", 0, offset) + 1
+    return {"line": line, "character": _utf16_length(text[line_start:offset])}
+
+
+def offset_at(text: str, position: dict[str, int]) -> int:
+    """Return the offset in `text` of the LSP `position`."""
+    line_start = 0
+    for _ in range(position["line"]):
+        line_start = text.index("\n", line_start) + 1
+
+    line_end = text.find("\n", line_start)
+    if line_end == -1:
+        line_end = len(text)
+
+    # Positions count UTF-16 code units.
+    offset = line_start
+    units = 0
+    while offset < line_end and units < position["character"]:
+        units += _utf16_length(text[offset])
+        offset += 1
+    return offset
+
+
+def _utf16_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def apply_change(text: str, change: Change) -> str:
+    """Apply a content change to `text`, as the server is expected to."""
+    if "range" not in change:
+        return change["text"]
+    start = offset_at(text, change["range"]["start"])
+    end = offset_at(text, change["range"]["end"])
+    return text[:start] + change["text"] + text[end:]
+
+
+def apply_script(text: str, script: EditScript) -> str:
+    """Apply all changes of an edit script to `text`."""
+    for changes in script:
+        for change in changes:
+            text = apply_change(text, change)
+    return text
+
+
+def replace(text: str, start: int, end: int, new_text: str) -> Change:
+    """Return the change that replaces `text[start:end]` with `new_text`."""
+    return {
+        "range": {"start": position_at(text, start), "end": position_at(text, end)},
+        "text": new_text,
+    }
+
+
+def type_text(text: str, offset: int, typed: str) -> EditScript:
+    """Type `typed` at `offset`, one character per notification."""
+    script = []
+    for index, character in enumerate(typed):
+        change = replace(text, offset + index, offset + index, character)
+        text = apply_change(text, change)
+        script.append([change])
+    return script
+
+
+def paste(text: str, offset: int, pasted: str) -> EditScript:
+    """Paste `pasted` at `offset` in a single notification."""
+    return [[replace(text, offset, offset, pasted)]]
+
+
+def multi_cursor(text: str, offsets: Sequence[int], typed: str) -> EditScript:
+    """Type `typed` at every offset in `offsets` at once, one character at a time.
+
+    Like VS Code, each notification contains the changes of all cursors, ordered from
+    the end of the document to its start so that earlier positions remain valid.
+    """
+    script = []
+    cursors = sorted(offsets, reverse=True)
+    for character in typed:
+        changes = []
+        for cursor in cursors:
+            change = replace(text, cursor, cursor, character)
+            text = apply_change(text, change)
+            changes.append(change)
+        script.append(changes)
+        # Every cursor moves past its own character and those typed before it.
+        cursors = [
+            cursor + len(cursors) - index for index, cursor in enumerate(cursors)
+        ]
+    return script
+
+
+def delete(text: str, start: int, end: int) -> EditScript:
+    """Delete `text[start:end]` in a single notification."""
+    return [[replace(text, start, end, "")]]
+
+
+def as_full_sync(text: str, script: EditScript) -> EditScript:
+    """Convert an edit script to send the whole document with every notification."""
+    full = []
+    for changes in script:
+        for change in changes:
+            text = apply_change(text, change)
+        full.append([{"text": text}])
+    return full
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""A fake language server with configurable faults.
+
+The server speaks just enough LSP over stdio to stand in for `ruff server` or
+`bundled/tool/server.py`: it publishes one diagnostic whenever a document is opened,
+changed or saved, and answers every other request with an empty result. It only uses the
+standard library, so it can be started by `LspSession` as well as by the extension as
+the `ruff.path` executable, in which case it also answers `--version`.
+
+The faults are read as JSON from the `RUFF_FAKE_SERVER_FAULTS` environment variable,
+and can be replaced at runtime with the `fakeServer/setFaults` notification:
+
+    {
+        # Delay handling a message by the given number of milliseconds.
+        "latency": {"textDocument/hover": 500},
+        # Drop every n-th response to a method; `1` drops all of them.
+        "drop": {"textDocument/formatting": 1},
+        # Hold back responses until `n` are pending, then send them in reverse order.
+        "reorder": 3,
+        # Publish diagnostics `notifications` times per document change, with
+        # `diagnostics` diagnostics each.
+        "flood": {"notifications": 100, "diagnostics": 50},
+        # Never answer `shutdown` and ignore `exit`.
+        "stallOnShutdown": true,
+        # Ignore SIGTERM, so that the server has to be killed.
+        "ignoreTerminate": true,
+        # Exit once the method was received `after` times.
+        "crash": {"method": "textDocument/hover", "after": 0, "exitCode": 1},
+    }
+
+The `fakeServer/crash` notification exits immediately, and the `fakeServer/stats`
+request returns how often each method was received and how many requests were
+cancelled.
+
+Usage: `python tests/client/fake_server.py [server]`
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import sys
+import threading
+from typing import Any, BinaryIO
+
+FAULTS_ENV = "RUFF_FAKE_SERVER_FAULTS"
+
+# Pretend to be a Ruff version that supports the stable native server and inline
+# configuration.
+VERSION = "ruff 0.9.8"
+
+METHOD_NOT_FOUND = -32601
+REQUEST_CANCELLED = -32800
+
+
+class FakeServer:
+    def __init__(self, stdin: BinaryIO, stdout: BinaryIO, faults: dict[str, Any]):
+        self._stdin = stdin
+        self._stdout = stdout
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._faults = faults
+        self._received: dict[str, int] = {}
+        self._responses: dict[str, int] = {}
+        self._held: list[dict[str, Any]] = []
+        self._pending: dict[Any, threading.Event] = {}
+        self._cancelled = 0
+        self._shutdown = False
+
+    def set_faults(self, faults: dict[str, Any]) -> None:
+        with self._lock:
+            self._faults = faults
+        signal.signal(
+            signal.SIGTERM,
+            signal.SIG_IGN if faults.get("ignoreTerminate") else signal.SIG_DFL,
+        )
+
+    def _fault(self, name: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._faults.get(name, default)
+
+    def serve(self) -> int:
+        self.set_faults(self._faults)
+        while True:
+            message = self._read()
+            if message is None:
+                return 0 if self._shutdown else 1
+            method = message.get("method")
+            if method is None:
+                # A response to a server request, which we never send.
+                continue
+
+            with self._lock:
+                self._received[method] = self._received.get(method, 0) + 1
+                received = self._received[method]
+                faults = self._faults
+            crash = faults.get("crash")
+            if crash is not None and crash.get("method") == method:
+                if received > crash.get("after", 0):
+                    os._exit(crash.get("exitCode", 1))
+
+            if "id" in message:
+                event = threading.Event()
+                with self._lock:
+                    self._pending[message["id"]] = event
+                threading.Thread(
+                    target=self._handle_request, args=(message, event), daemon=True
+                ).start()
+            else:
+                self._delay(method, None)
+                if self._handle_notification(method, message.get("params") or {}):
+                    return 0 if self._shutdown else 1
+
+    def _handle_request(self, message: dict[str, Any], event: threading.Event):
+        method = message["method"]
+        if self._delay(method, event):
+            with self._lock:
+                self._cancelled += 1
+            self._respond(
+                message["id"],
+                method,
+                error={"code": REQUEST_CANCELLED, "message": "Request cancelled"},
+            )
+            return
+
+        if method == "initialize":
+            result: Any = {
+                "capabilities": {
+                    "textDocumentSync": {"openClose": True, "change": 2, "save": True},
+                    "hoverProvider": True,
+                    "codeActionProvider": True,
+                    "documentFormattingProvider": True,
+                    "documentRangeFormattingProvider": True,
+                },
+                "serverInfo": {"name": "fake-server"},
+            }
+        elif method == "shutdown":
+            if self._fault("stallOnShutdown"):
+                return
+            self._shutdown = True
+            result = None
+        elif method == "fakeServer/stats":
+            with self._lock:
+                result = {
+                    "received": dict(self._received),
+                    "cancelled": self._cancelled,
+                }
+        elif method.startswith("textDocument/") or method.startswith("workspace/"):
+            result = [] if method.endswith(("formatting", "codeAction")) else None
+        else:
+            self._respond(
+                message["id"],
+                method,
+                error={"code": METHOD_NOT_FOUND, "message": f"Unknown method {method}"},
+            )
+            return
+        self._respond(message["id"], method, result=result)
+
+    def _handle_notification(self, method: str, params: dict[str, Any]) -> bool:
+        """Handle a notification, returning whether the server should exit."""
+        if method == "exit":
+            return not self._fault("stallOnShutdown")
+        if method == "$/cancelRequest":
+            with self._lock:
+                event = self._pending.get(params.get("id"))
+            if event is not None:
+                event.set()
+        elif method == "fakeServer/setFaults":
+            self.set_faults(params)
+        elif method == "fakeServer/crash":
+            os._exit(params.get("exitCode", 1))
+        elif method in (
+            "textDocument/didOpen",
+            "textDocument/didChange",
+            "textDocument/didSave",
+        ):
+            self._publish(params["textDocument"]["uri"])
+        elif method == "textDocument/didClose":
+            self._notify(
+                "textDocument/publishDiagnostics",
+                {"uri": params["textDocument"]["uri"], "diagnostics": []},
+            )
+        return False
+
+    def _publish(self, uri: str) -> None:
+        flood = self._fault("flood", {})
+        diagnostics = [
+            {
+                "range": {
+                    "start": {"line": 0, "character": 0},
+                    "end": {"line": 0, "character": 1},
+                },
+                "severity": 2,
+                "source": "Ruff",
+                "code": "FAKE",
+                "message": f"Fake diagnostic {index}",
+            }
+            for index in range(flood.get("diagnostics", 1))
+        ]
+        for _ in range(flood.get("notifications", 1)):
+            self._notify(
+                "textDocument/publishDiagnostics",
+                {"uri": uri, "diagnostics": diagnostics},
+            )
+
+    def _delay(self, method: str, cancelled: threading.Event | None) -> bool:
+        """Wait for the configured latency, returning whether the request was
+        cancelled in the meantime."""
+        latency = self._fault("latency", {}).get(method, 0) / 1000
+        if cancelled is None:
+            threading.Event().wait(latency)
+            return False
+        return cancelled.wait(latency)
+
+    def _respond(self, id: Any, method: str, **payload: Any) -> None:
+        with self._lock:
+            self._pending.pop(id, None)
+            self._responses[method] = self._responses.get(method, 0) + 1
+            drop = self._faults.get("drop", {}).get(method)
+            if drop and self._responses[method] % drop == 0:
+                return
+
+            response = {"jsonrpc": "2.0", "id": id, **payload}
+            reorder = self._faults.get("reorder", 0)
+            if reorder <= 1 or method in ("initialize", "shutdown"):
+                responses = [response]
+            else:
+                self._held.append(response)
+                if len(self._held) < reorder:
+                    return
+                responses = self._held[::-1]
+                self._held = []
+        for response in responses:
+            self._write(response)
+
+    def _notify(self, method: str, params: dict[str, Any]) -> None:
+        self._write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def _read(self) -> dict[str, Any] | None:
+        length = None
+        while True:
+            line = self._stdin.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.decode("ascii").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        if length is None:
+            return None
+        return json.loads(self._stdin.read(length))
+
+    def _write(self, message: dict[str, Any]) -> None:
+        body = json.dumps(message).encode("utf-8")
+        with self._write_lock:
+            self._stdout.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii"))
+            self._stdout.write(body)
+            self._stdout.flush()
+
+
+def main() -> int:
+    if "--version" in sys.argv[1:]:
+        print(VERSION)
+        return 0
+    faults = json.loads(os.environ.get(FAULTS_ENV) or "{}")
+    return FakeServer(sys.stdin.buffer, sys.stdout.buffer, faults).serve()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
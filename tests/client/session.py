@@ -3,9 +3,16 @@
 from __future__ import annotations
 
 import os
+import socket
 import subprocess
 import sys
-from concurrent.futures import Future, ThreadPoolExecutor
+import time
+from concurrent.futures import (
+    Future,
+    InvalidStateError,
+    ThreadPoolExecutor,
+    TimeoutError,
+)
 from pathlib import Path
 from threading import Event
 from typing import Any, Callable
@@ -17,7 +24,10 @@ from pylsp_jsonrpc.streams import JsonRpcStreamReader, JsonRpcStreamWriter
 from tests.client.defaults import VSCODE_DEFAULT_INITIALIZE
 from tests.client.utils import unwrap
 
-LSP_EXIT_TIMEOUT = 5000
+# The deadlines of the stages of stopping the server, in seconds.
+LSP_SHUTDOWN_TIMEOUT = 2.0
+LSP_EXIT_TIMEOUT = 2.0
+LSP_TERMINATE_TIMEOUT = 1.0
 
 
 PUBLISH_DIAGNOSTICS = "textDocument/publishDiagnostics"
@@ -28,33 +38,49 @@ WINDOW_SHOW_MESSAGE = "window/showMessage"
 class LspSession(MethodDispatcher):
     """Send and Receive messages over LSP."""
 
-    def __init__(self, cwd: str, script: Path):
+    def __init__(
+        self,
+        cwd: str,
+        script: Path,
+        env: dict[str, str] | None = None,
+        socket_path: str | None = None,
+    ):
+        """Start `script`, or connect to a shared server on `socket_path`."""
         self.cwd = cwd
         self.script = script
+        self.env = env
+        self.socket_path = socket_path
 
         self._thread_pool: ThreadPoolExecutor = ThreadPoolExecutor()
         self._sub: subprocess.Popen | None = None
+        self._socket: socket.socket | None = None
         self._reader: JsonRpcStreamReader | None = None
         self._writer: JsonRpcStreamWriter | None = None
         self._endpoint: Any = None
         self._notification_callbacks: dict[str, Callable] = {}
+        self.shutdown_durations: dict[str, float] = {}
 
     def __enter__(self):
         """Context manager entrypoint.
 
         shell=True needed for pytest-cov to work in subprocess.
         """
-        self._sub = subprocess.Popen(
-            [sys.executable, str(self.script)],
-            stdout=subprocess.PIPE,
-            stdin=subprocess.PIPE,
-            bufsize=0,
-            cwd=self.cwd,
-            env=os.environ,
-        )
-
-        self._writer = JsonRpcStreamWriter(self._sub.stdin)
-        self._reader = JsonRpcStreamReader(self._sub.stdout)
+        if self.socket_path is None:
+            self._sub = subprocess.Popen(
+                [sys.executable, str(self.script)],
+                stdout=subprocess.PIPE,
+                stdin=subprocess.PIPE,
+                bufsize=0,
+                cwd=self.cwd,
+                env=os.environ if self.env is None else {**os.environ, **self.env},
+            )
+            self._writer = JsonRpcStreamWriter(self._sub.stdin)
+            self._reader = JsonRpcStreamReader(self._sub.stdout)
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.socket_path)
+            self._writer = JsonRpcStreamWriter(self._socket.makefile("wb"))
+            self._reader = JsonRpcStreamReader(self._socket.makefile("rb"))
 
         dispatcher = {
             PUBLISH_DIAGNOSTICS: self._publish_diagnostics,
@@ -62,17 +88,20 @@ class LspSession(MethodDispatcher):
             WINDOW_LOG_MESSAGE: self._window_log_message,
         }
         self._endpoint = Endpoint(dispatcher, self._writer.write)
-        self._thread_pool.submit(self._reader.listen, self._endpoint.consume)
+        self._thread_pool.submit(self._reader.listen, self._consume)
         return self
 
     def __exit__(self, typ, value, _tb):
-        self.shutdown(True)
-        unwrap(self._sub).terminate()
-        unwrap(self._sub).wait()
+        self.stop()
+        if self._socket is not None:
+            # Closing the connection ends the reader thread.
+            self._socket.shutdown(socket.SHUT_RDWR)
         self._endpoint.shutdown()  # type: ignore[union-attr]
         self._thread_pool.shutdown()
         unwrap(self._writer).close()  # type: ignore[attr-defined]
         unwrap(self._reader).close()  # type: ignore[attr-defined]
+        if self._socket is not None:
+            self._socket.close()
 
     def initialize(
         self,
@@ -120,7 +149,69 @@ class LspSession(MethodDispatcher):
     def exit_lsp(self, exit_timeout: float = LSP_EXIT_TIMEOUT):
         """Handles LSP server process exit."""
         self._endpoint.notify("exit")
-        assert unwrap(self._sub).wait(exit_timeout) == 0
+        if self._sub is not None:
+            assert self._sub.wait(exit_timeout) == 0
+
+    def stop(
+        self,
+        shutdown_timeout: float = LSP_SHUTDOWN_TIMEOUT,
+        exit_timeout: float = LSP_EXIT_TIMEOUT,
+        terminate_timeout: float = LSP_TERMINATE_TIMEOUT,
+    ) -> dict[str, float]:
+        """Stops the LSP server, escalating whenever a stage misses its deadline.
+
+        Sends the shutdown request and the exit notification, then terminates and
+        finally kills the server process. Returns how long each stage that ran took,
+        in seconds, which is also kept in `shutdown_durations`.
+        """
+        durations = self.shutdown_durations
+        durations.clear()
+
+        start = time.perf_counter()
+        if self._running():
+            shutdown = self._endpoint.request("shutdown")
+            while self._running():
+                try:
+                    shutdown.result(timeout=0.05)
+                    break
+                except TimeoutError:
+                    if time.perf_counter() - start > shutdown_timeout:
+                        break
+                except Exception:
+                    # The server failed the request or the connection closed.
+                    break
+            durations["shutdown"] = time.perf_counter() - start
+
+        if self._running():
+            self._endpoint.notify("exit")
+        stages: list[tuple[str, Callable[[], None] | None, float | None]] = [
+            ("exit", None, exit_timeout)
+        ]
+        if self._sub is not None:
+            stages += [
+                ("terminate", self._sub.terminate, terminate_timeout),
+                ("kill", self._sub.kill, None),
+            ]
+        for stage, escalate, timeout in stages:
+            if self._sub is None or self._sub.poll() is not None:
+                break
+            stage_start = time.perf_counter()
+            if escalate is not None:
+                escalate()
+            try:
+                self._sub.wait(timeout)
+            except subprocess.TimeoutExpired:
+                pass
+            durations[stage] = time.perf_counter() - stage_start
+
+        durations["total"] = time.perf_counter() - start
+        return durations
+
+    def _running(self) -> bool:
+        """Whether the server can still receive messages."""
+        if self._sub is not None:
+            return self._sub.poll() is None
+        return self._socket is not None
 
     def notify_did_change(self, did_change_params):
         """Sends did change notification to LSP Server."""
@@ -138,6 +229,59 @@ class LspSession(MethodDispatcher):
         """Sends did close notification to LSP Server."""
         self._send_notification("textDocument/didClose", params=did_close_params)
 
+    def notify_notebook_did_open(self, did_open_params):
+        """Sends notebook did open notification to LSP Server."""
+        self._send_notification("notebookDocument/didOpen", params=did_open_params)
+
+    def notify_notebook_did_change(self, did_change_params):
+        """Sends notebook did change notification to LSP Server."""
+        self._send_notification("notebookDocument/didChange", params=did_change_params)
+
+    def notify_notebook_did_save(self, did_save_params):
+        """Sends notebook did save notification to LSP Server."""
+        self._send_notification("notebookDocument/didSave", params=did_save_params)
+
+    def notify_notebook_did_close(self, did_close_params):
+        """Sends notebook did close notification to LSP Server."""
+        self._send_notification("notebookDocument/didClose", params=did_close_params)
+
+    def notify_visible_documents(self, params):
+        """Sends the extension's visible documents notification to LSP Server."""
+        self._send_notification("ruff/visibleDocuments", params=params)
+
+    def text_document_formatting(self, formatting_params):
+        """Sends text document formatting request to LSP server."""
+        return self._send_request("textDocument/formatting", params=formatting_params)
+
+    def text_document_code_action(self, code_action_params):
+        """Sends text document code action request to LSP server."""
+        return self._send_request("textDocument/codeAction", params=code_action_params)
+
+    def code_action_resolve(self, code_action):
+        """Sends code action resolve request to LSP server."""
+        return self._send_request("codeAction/resolve", params=code_action)
+
+    def text_document_hover(self, hover_params):
+        """Sends text document hover request to LSP server."""
+        return self._send_request("textDocument/hover", params=hover_params)
+
+    def set_fake_server_faults(self, faults):
+        """Replaces the faults injected by the fake server."""
+        self._send_notification("fakeServer/setFaults", params=faults)
+
+    def fake_server_stats(self):
+        """Returns the fake server's message statistics."""
+        return self._send_request("fakeServer/stats").result()
+
+    def wait(self, timeout: float | None = None) -> int:
+        """Waits for the LSP server process to exit, returning its exit code."""
+        return unwrap(self._sub).wait(timeout)
+
+    @property
+    def process_id(self) -> int:
+        """The process ID of the LSP server."""
+        return unwrap(self._sub).pid
+
     def set_notification_callback(self, notification_name, callback):
         """Set custom LS notification handler."""
         self._notification_callbacks[notification_name] = callback
@@ -181,6 +325,14 @@ class LspSession(MethodDispatcher):
         self._thread_pool.submit(_handler)
         return fut
 
+    def _consume(self, message):
+        """Internal handler for messages from the LSP server."""
+        try:
+            self._endpoint.consume(message)
+        except InvalidStateError:
+            # The server answered a request that was already cancelled.
+            pass
+
     def _send_request(self, name, params=None, handle_response=lambda f: f.done()):
         """Sends {name} request to the LSP server."""
         fut = self._endpoint.request(name, params)
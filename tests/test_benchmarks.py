@@ -0,0 +1,42 @@
+"""Tests for the statistical comparison of benchmark results."""
+
+from __future__ import annotations
+
+import unittest
+
+from tests.benchmarks import comparison
+
+BASELINE = [100.0, 102.0, 98.0, 101.0, 99.0, 103.0, 97.0, 100.0, 101.0, 99.0]
+
+
+class TestComparison(unittest.TestCase):
+    def test_mann_whitney_separated_samples(self):
+        # The exact one-sided p-value is 1/252; the normal approximation is close.
+        p_value = comparison.mann_whitney_greater([6, 7, 8, 9, 10], [1, 2, 3, 4, 5])
+        self.assertAlmostEqual(p_value, 0.0061, places=4)
+
+        p_value = comparison.mann_whitney_greater([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        self.assertGreater(p_value, 0.99)
+
+    def test_mann_whitney_identical_samples(self):
+        self.assertEqual(comparison.mann_whitney_greater([1, 1, 1], [1, 1, 1]), 1.0)
+
+    def test_regression(self):
+        current = [value * 1.2 for value in BASELINE]
+        result = comparison.compare(current, BASELINE)
+        self.assertTrue(result.regressed)
+        self.assertAlmostEqual(result.change, 0.2)
+        low, high = result.change_interval
+        self.assertLess(low, 0.2)
+        self.assertGreater(high, 0.2)
+
+    def test_no_regression_for_small_changes(self):
+        # Significantly slower, but by less than the minimum change.
+        current = [value * 1.02 for value in BASELINE]
+        result = comparison.compare(current, BASELINE, alpha=0.5)
+        self.assertLess(result.p_value, 0.5)
+        self.assertFalse(result.regressed)
+
+    def test_no_regression_for_faster_samples(self):
+        current = [value * 0.8 for value in BASELINE]
+        self.assertFalse(comparison.compare(current, BASELINE).regressed)
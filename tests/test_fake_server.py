@@ -0,0 +1,174 @@
+"""Tests for the fault-injecting fake language server."""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import TimeoutError
+from threading import Condition, Event, RLock
+
+from tests.client import defaults, session, utils
+from tests.client.constants import FAKE_SERVER_SCRIPT
+from tests.client.fake_server import FAULTS_ENV
+
+TIMEOUT_SECONDS = 10
+
+HOVER = {
+    "textDocument": {"uri": utils.as_uri(os.path.abspath("example.py"))},
+    "position": {"line": 0, "character": 0},
+}
+
+
+def fake_session(**faults) -> session.LspSession:
+    return session.LspSession(
+        cwd=os.getcwd(),
+        script=FAKE_SERVER_SCRIPT,
+        env={FAULTS_ENV: json.dumps(faults)},
+    )
+
+
+class TestFakeServer(unittest.TestCase):
+    def test_latency_and_cancellation(self):
+        with fake_session(latency={"textDocument/hover": 300}) as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+            start = time.perf_counter()
+            ls_session.text_document_hover(HOVER).result(TIMEOUT_SECONDS)
+            self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+            ls_session.text_document_hover(HOVER).cancel()
+            stats = ls_session.fake_server_stats()
+            self.assertEqual(stats["received"]["textDocument/hover"], 2)
+            self.assertEqual(stats["received"]["$/cancelRequest"], 1)
+
+    def test_dropped_responses(self):
+        with fake_session(drop={"textDocument/hover": 2}) as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+            ls_session.text_document_hover(HOVER).result(TIMEOUT_SECONDS)
+            with self.assertRaises(TimeoutError):
+                ls_session.text_document_hover(HOVER).result(0.5)
+            ls_session.text_document_hover(HOVER).result(TIMEOUT_SECONDS)
+
+    def test_reordered_responses(self):
+        with fake_session(reorder=2) as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+            # Responses complete in the order the callbacks record them. The lock
+            # keeps the first callback waiting until the second one is registered.
+            lock = RLock()
+            completed = []
+            both_completed = Event()
+
+            def _record(name):
+                def _callback(_):
+                    with lock:
+                        completed.append(name)
+                        if len(completed) == 2:
+                            both_completed.set()
+
+                return _callback
+
+            first = ls_session.text_document_hover(HOVER)
+            first.add_done_callback(_record("first"))
+            time.sleep(0.2)
+            self.assertFalse(first.done())
+
+            with lock:
+                second = ls_session.text_document_hover(HOVER)
+                second.add_done_callback(_record("second"))
+            self.assertTrue(both_completed.wait(TIMEOUT_SECONDS))
+            self.assertEqual(completed, ["second", "first"])
+
+    def test_flooded_diagnostics(self):
+        with tempfile.NamedTemporaryFile(suffix=".py") as fp:
+            uri = utils.as_uri(fp.name)
+            with fake_session(
+                flood={"notifications": 50, "diagnostics": 20}
+            ) as ls_session:
+                ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+                condition = Condition()
+                published = []
+
+                def _handler(params):
+                    with condition:
+                        published.append(params)
+                        condition.notify_all()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+                ls_session.notify_did_open(
+                    {
+                        "textDocument": {
+                            "uri": uri,
+                            "languageId": "python",
+                            "version": 1,
+                            "text": "",
+                        }
+                    }
+                )
+                with condition:
+                    self.assertTrue(
+                        condition.wait_for(
+                            lambda: len(published) == 50, TIMEOUT_SECONDS
+                        )
+                    )
+                self.assertTrue(
+                    all(len(params["diagnostics"]) == 20 for params in published)
+                )
+
+    def test_crash(self):
+        with fake_session(
+            crash={"method": "textDocument/hover", "after": 1, "exitCode": 3}
+        ) as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+            ls_session.text_document_hover(HOVER).result(TIMEOUT_SECONDS)
+            ls_session.text_document_hover(HOVER)
+            self.assertEqual(ls_session.wait(TIMEOUT_SECONDS), 3)
+
+    def test_stall_on_shutdown(self):
+        with fake_session() as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+            ls_session.set_fake_server_faults({"stallOnShutdown": True})
+
+            ls_session.shutdown(False)
+            with self.assertRaises(subprocess.TimeoutExpired):
+                ls_session.exit_lsp(0.5)
+
+            # Stopping the session escalates to terminating the server.
+            durations = ls_session.stop(shutdown_timeout=0.2, exit_timeout=0.2)
+            self.assertIn("terminate", durations)
+            self.assertNotIn("kill", durations)
+            self.assertLess(durations["total"], TIMEOUT_SECONDS)
+            self.assertNotEqual(ls_session.wait(0), 0)
+
+    @unittest.skipIf(sys.platform == "win32", "SIGTERM can't be ignored on Windows")
+    def test_ignore_terminate(self):
+        with fake_session(stallOnShutdown=True, ignoreTerminate=True) as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+            durations = ls_session.stop(
+                shutdown_timeout=0.2, exit_timeout=0.2, terminate_timeout=0.2
+            )
+            self.assertEqual(
+                list(durations), ["shutdown", "exit", "terminate", "kill", "total"]
+            )
+            self.assertGreaterEqual(durations["shutdown"], 0.2)
+            self.assertEqual(ls_session.wait(0), -signal.SIGKILL)
+
+    def test_prompt_exit(self):
+        with fake_session() as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+            durations = ls_session.stop()
+            self.assertEqual(list(durations), ["shutdown", "exit", "total"])
+            self.assertEqual(ls_session.wait(0), 0)
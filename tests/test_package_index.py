@@ -0,0 +1,106 @@
+"""Tests for the package index lookups of the release script."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from packaging.version import Version
+
+from scripts.package_index import (
+    SIMPLE_HTML_CONTENT_TYPE,
+    SIMPLE_JSON_CONTENT_TYPE,
+    PackageIndex,
+)
+
+# A remote index that must never be fetched from.
+UNREACHABLE_INDEX_URL = "https://index.invalid/simple"
+
+RUFF_PAGE = {
+    "meta": {"api-version": "1.0"},
+    "name": "ruff",
+    "files": [
+        {"filename": "ruff-0.16.4-py3-none-any.whl"},
+        {"filename": "ruff-0.16.5.tar.gz"},
+        {"filename": "ruff-0.17.0-py3-none-any.whl", "yanked": True},
+        {"filename": "ruff-0.18.0a1-py3-none-any.whl"},
+    ],
+}
+
+RUFF_LSP_PAGE = """<!DOCTYPE html>
+<html>
+  <body>
+    <a href="ruff_lsp-0.0.61-py3-none-any.whl">ruff_lsp-0.0.61-py3-none-any.whl</a>
+    <a href="ruff_lsp-0.0.62.tar.gz">ruff_lsp-0.0.62.tar.gz</a>
+    <a href="ruff_lsp-0.0.63.tar.gz" data-yanked="">ruff_lsp-0.0.63.tar.gz</a>
+  </body>
+</html>
+"""
+
+
+class TestPackageIndex(unittest.TestCase):
+    def test_local_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            (Path(directory) / "ruff").mkdir()
+            (Path(directory) / "ruff" / "index.json").write_text(json.dumps(RUFF_PAGE))
+            (Path(directory) / "ruff-lsp").mkdir()
+            (Path(directory) / "ruff-lsp" / "index.html").write_text(RUFF_LSP_PAGE)
+            expected = {"ruff": Version("0.16.5"), "ruff-lsp": Version("0.0.62")}
+
+            for url in (directory, Path(directory).as_uri()):
+                index = PackageIndex(url, cache_path=Path(directory) / "cache")
+                self.assertEqual(index.local_path, Path(directory))
+                self.assertEqual(index.latest_versions(["ruff", "ruff-lsp"]), expected)
+
+            # Local pages are never cached.
+            self.assertFalse((Path(directory) / "cache").exists())
+            with self.assertRaises(SystemExit):
+                index.latest_version("ty")
+
+    def test_cached_page(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = Path(directory)
+            url = f"{UNREACHABLE_INDEX_URL}/ruff-lsp/"
+            cache_file = cache_path / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+            cache_file.write_text(
+                json.dumps(
+                    {"content_type": SIMPLE_HTML_CONTENT_TYPE, "text": RUFF_LSP_PAGE}
+                )
+            )
+
+            # A fresh page is used without fetching it; offline, a page of any age is.
+            for index in (
+                PackageIndex(UNREACHABLE_INDEX_URL, cache_path=cache_path),
+                PackageIndex(
+                    UNREACHABLE_INDEX_URL,
+                    cache_path=cache_path,
+                    cache_ttl=0,
+                    offline=True,
+                ),
+            ):
+                self.assertIsNone(index.local_path)
+                self.assertEqual(index.latest_version("ruff_lsp"), Version("0.0.62"))
+
+            offline = PackageIndex(
+                UNREACHABLE_INDEX_URL, cache_path=cache_path, offline=True
+            )
+            with self.assertRaises(SystemExit):
+                offline.project_page("ruff")
+
+    def test_json_page_filenames(self):
+        with tempfile.TemporaryDirectory() as directory:
+            (Path(directory) / "ruff").mkdir()
+            (Path(directory) / "ruff" / "index.json").write_text(json.dumps(RUFF_PAGE))
+            page = PackageIndex(directory).project_page("Ruff")
+        self.assertEqual(page.content_type, SIMPLE_JSON_CONTENT_TYPE)
+        self.assertEqual(
+            page.filenames(),
+            [
+                "ruff-0.16.4-py3-none-any.whl",
+                "ruff-0.16.5.tar.gz",
+                "ruff-0.18.0a1-py3-none-any.whl",
+            ],
+        )
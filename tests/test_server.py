@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
+import copy
 import os
+import subprocess
+import sys
 import tempfile
+import time
 import unittest
 from threading import Event
 
-from tests.client import defaults, session, utils
+from tests.client import defaults, edits, session, utils
 from tests.client.constants import PROJECT_ROOT
 
 TIMEOUT_SECONDS = 10
@@ -203,3 +207,569 @@ class TestServer(unittest.TestCase):
 
             self.maxDiff = None
             self.assertEqual(actual, expected)
+
+    def test_linting_with_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            uris = []
+            for index in range(4):
+                path = os.path.join(directory, f"module_{index}.py")
+                with open(path, "w") as fp:
+                    fp.write(CONTENTS)
+                uris.append(utils.as_uri(path))
+
+            published = {}
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+                env={"RUFF_LSP_WORKERS": "2"},
+            ) as ls_session:
+                capabilities = {}
+                ls_session.initialize(
+                    defaults.VSCODE_DEFAULT_INITIALIZE,
+                    process_server_capabilities=capabilities.update,
+                )
+                self.assertIn("capabilities", capabilities)
+
+                done = Event()
+
+                def _handler(params):
+                    published[params["uri"]] = params["diagnostics"]
+                    if len(published) == len(uris):
+                        done.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+
+                for uri in uris:
+                    ls_session.notify_did_open(
+                        {
+                            "textDocument": {
+                                "uri": uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": CONTENTS,
+                            }
+                        }
+                    )
+
+                # Wait to receive the diagnostics of all documents.
+                done.wait(TIMEOUT_SECONDS)
+
+            self.assertEqual(sorted(published), sorted(uris))
+            for diagnostics in published.values():
+                self.assertEqual(
+                    [diagnostic["code"] for diagnostic in diagnostics],
+                    ["F401", "F821"],
+                )
+
+    def test_incremental_sync(self):
+        # Each edit is built from the text produced by the edits before it.
+        script = edits.type_text(CONTENTS, 0, "import os\n")
+        text = edits.apply_script(CONTENTS, script)
+        script += edits.paste(text, len(text), "y = sys.argv\n")
+        text = edits.apply_script(CONTENTS, script)
+        script += edits.multi_cursor(text, [0, text.index("print")], "_ = 1; ")
+        text = edits.apply_script(CONTENTS, script)
+        script += edits.delete(text, text.index("print"), text.index("y = "))
+        expected_text = edits.apply_script(CONTENTS, script)
+
+        with tempfile.TemporaryDirectory() as directory:
+            uri = utils.as_uri(os.path.join(directory, "edited.py"))
+            expected_uri = utils.as_uri(os.path.join(directory, "expected.py"))
+
+            published = {}
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+            ) as ls_session:
+                ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+                received = Event()
+
+                def _handler(params):
+                    published[params["uri"]] = params["diagnostics"]
+                    received.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+
+                def _open(uri, text):
+                    received.clear()
+                    ls_session.notify_did_open(
+                        {
+                            "textDocument": {
+                                "uri": uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": text,
+                            }
+                        }
+                    )
+                    received.wait(TIMEOUT_SECONDS)
+
+                _open(uri, CONTENTS)
+                for version, changes in enumerate(script, start=2):
+                    # Wait for each change to be linted, so that the diagnostics of an
+                    # older version can't arrive last.
+                    received.clear()
+                    ls_session.notify_did_change(
+                        {
+                            "textDocument": {"uri": uri, "version": version},
+                            "contentChanges": changes,
+                        }
+                    )
+                    received.wait(TIMEOUT_SECONDS)
+
+                _open(expected_uri, expected_text)
+
+            self.maxDiff = None
+            self.assertEqual(published[uri], published[expected_uri])
+
+    def test_notebook_linting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "notebook.ipynb")
+            cells = ["import sys\n", "print(x)\n"]
+            cell_uris = [f"vscode-notebook-cell:{path}#cell{i}" for i in range(2)]
+
+            published = {}
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+            ) as ls_session:
+                ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+                done = Event()
+
+                def _handler(params):
+                    published[params["uri"]] = params["diagnostics"]
+                    if len(published) == len(cell_uris):
+                        done.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+
+                ls_session.notify_notebook_did_open(
+                    {
+                        "notebookDocument": {
+                            "uri": utils.as_uri(path),
+                            "notebookType": "jupyter-notebook",
+                            "version": 1,
+                            "cells": [
+                                {"kind": 2, "document": cell_uri}
+                                for cell_uri in cell_uris
+                            ],
+                        },
+                        "cellTextDocuments": [
+                            {
+                                "uri": cell_uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": text,
+                            }
+                            for cell_uri, text in zip(cell_uris, cells)
+                        ],
+                    }
+                )
+
+                # Wait to receive the diagnostics of both cells.
+                done.wait(TIMEOUT_SECONDS)
+
+            self.assertEqual(
+                {
+                    uri: [diagnostic["code"] for diagnostic in diagnostics]
+                    for uri, diagnostics in published.items()
+                },
+                {cell_uris[0]: ["F401"], cell_uris[1]: ["F821"]},
+            )
+
+    def test_run_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = os.path.join(directory, "ruff.toml")
+            with open(config, "w") as fp:
+                fp.write('lint.select = ["F401"]\n')
+            uri = utils.as_uri(os.path.join(directory, "cached.py"))
+
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+                env={"RUFF_LSP_CACHE_SIZE": "16"},
+            ) as ls_session:
+                ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+                received = Event()
+                published = []
+                log_messages = []
+
+                def _handler(params):
+                    published.append(
+                        [diagnostic["code"] for diagnostic in params["diagnostics"]]
+                    )
+                    received.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+                ls_session.set_notification_callback(
+                    session.WINDOW_LOG_MESSAGE,
+                    lambda params: log_messages.append(params["message"]),
+                )
+
+                def _lint(version, text):
+                    received.clear()
+                    if version == 1:
+                        ls_session.notify_did_open(
+                            {
+                                "textDocument": {
+                                    "uri": uri,
+                                    "languageId": "python",
+                                    "version": version,
+                                    "text": text,
+                                }
+                            }
+                        )
+                    else:
+                        ls_session.notify_did_change(
+                            {
+                                "textDocument": {"uri": uri, "version": version},
+                                "contentChanges": [{"text": text}],
+                            }
+                        )
+                    received.wait(TIMEOUT_SECONDS)
+
+                _lint(1, CONTENTS)
+                _lint(2, "x = 1\n")
+                # Reverting the change reuses the result of the first run.
+                _lint(3, CONTENTS)
+                self.assertTrue(
+                    any("Using cached result" in message for message in log_messages)
+                )
+
+                # Changing the configuration invalidates the cached result.
+                with open(config, "w") as fp:
+                    fp.write('lint.select = ["F821"]\n')
+                mtime = os.stat(config).st_mtime + 10
+                os.utime(config, (mtime, mtime))
+                _lint(4, CONTENTS)
+
+            self.assertEqual(published, [["F401"], [], ["F401"], ["F821"]])
+
+    def test_code_action_cache(self):
+        initialize_params = copy.deepcopy(defaults.VSCODE_DEFAULT_INITIALIZE)
+        initialize_params["capabilities"]["textDocument"]["codeAction"][
+            "resolveSupport"
+        ] = {"properties": ["edit"]}
+
+        with tempfile.NamedTemporaryFile(suffix=".py") as fp:
+            fp.write(CONTENTS.encode())
+            fp.flush()
+            uri = utils.as_uri(fp.name)
+
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+                env={"RUFF_LSP_CODE_ACTION_CACHE_SIZE": "16"},
+            ) as ls_session:
+                ls_session.initialize(initialize_params)
+
+                done = Event()
+                diagnostics = []
+                log_messages = []
+
+                def _handler(params):
+                    diagnostics.extend(params["diagnostics"])
+                    done.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+                ls_session.set_notification_callback(
+                    session.WINDOW_LOG_MESSAGE,
+                    lambda params: log_messages.append(params["message"]),
+                )
+                ls_session.notify_did_open(
+                    {
+                        "textDocument": {
+                            "uri": uri,
+                            "languageId": "python",
+                            "version": 1,
+                            "text": CONTENTS,
+                        }
+                    }
+                )
+                done.wait(TIMEOUT_SECONDS)
+
+                log_messages.clear()
+                actions = ls_session.text_document_code_action(
+                    {
+                        "textDocument": {"uri": uri},
+                        "range": {
+                            "start": {"line": 0, "character": 0},
+                            "end": {"line": 3, "character": 0},
+                        },
+                        "context": {"diagnostics": diagnostics},
+                    }
+                ).result(timeout=TIMEOUT_SECONDS)
+
+                # With resolve support, "Fix All" is listed without an edit.
+                titles = {action["title"]: action for action in actions}
+                self.assertNotIn("edit", titles["Ruff: Fix All"])
+
+                # Resolving "Fix All" again reuses the edit of the first resolve.
+                fix_all = [
+                    ls_session.code_action_resolve(titles["Ruff: Fix All"]).result(
+                        timeout=TIMEOUT_SECONDS
+                    )
+                    for _ in range(2)
+                ]
+                self.assertEqual(fix_all[0]["edit"], fix_all[1]["edit"])
+                self.assertEqual(
+                    sum("Running Ruff" in message for message in log_messages), 1
+                )
+                self.assertTrue(
+                    any("Using cached edit" in message for message in log_messages)
+                )
+
+    def test_code_actions_with_capped_diagnostics(self):
+        with tempfile.NamedTemporaryFile(suffix=".py") as fp:
+            fp.write(CONTENTS.encode())
+            fp.flush()
+            uri = utils.as_uri(fp.name)
+
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+            ) as ls_session:
+                ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+                done = Event()
+                diagnostics = []
+
+                def _handler(params):
+                    diagnostics.extend(params["diagnostics"])
+                    done.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+                ls_session.notify_did_open(
+                    {
+                        "textDocument": {
+                            "uri": uri,
+                            "languageId": "python",
+                            "version": 1,
+                            "text": CONTENTS,
+                        }
+                    }
+                )
+                self.assertTrue(done.wait(TIMEOUT_SECONDS))
+
+                # With `ruff.diagnostics.maxPerFile`, the extension replaces the omitted
+                # diagnostics with a summary, which VS Code sends back like any other.
+                summary = {
+                    "range": {
+                        "start": {"line": 0, "character": 0},
+                        "end": {"line": 0, "character": 0},
+                    },
+                    "message": "1 more diagnostics are not shown because the file has "
+                    "more than 'ruff.diagnostics.maxPerFile' (1).",
+                    "severity": 3,
+                    "source": "Ruff (extension)",
+                }
+                actions = ls_session.text_document_code_action(
+                    {
+                        "textDocument": {"uri": uri},
+                        "range": {
+                            "start": {"line": 0, "character": 0},
+                            "end": {"line": 3, "character": 0},
+                        },
+                        "context": {"diagnostics": [diagnostics[0], summary]},
+                    }
+                ).result(timeout=TIMEOUT_SECONDS)
+
+            self.assertIn(
+                "Ruff (F401): Remove unused import: `sys`",
+                [action["title"] for action in actions],
+            )
+
+    def test_run_pool_prioritizes_visible_documents(self):
+        with tempfile.TemporaryDirectory() as directory:
+            background = [
+                utils.as_uri(os.path.join(directory, f"background_{index}.py"))
+                for index in range(4)
+            ]
+            visible = utils.as_uri(os.path.join(directory, "visible.py"))
+
+            published = []
+            log_messages = []
+            with session.LspSession(
+                cwd=os.getcwd(),
+                script=PROJECT_ROOT / "bundled" / "tool" / "server.py",
+                env={"RUFF_LSP_MAX_CONCURRENCY": "1"},
+            ) as ls_session:
+                ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+
+                done = Event()
+
+                def _handler(params):
+                    published.append(params["uri"])
+                    if len(published) == len(background) + 1:
+                        done.set()
+
+                ls_session.set_notification_callback(
+                    session.PUBLISH_DIAGNOSTICS, _handler
+                )
+                ls_session.set_notification_callback(
+                    session.WINDOW_LOG_MESSAGE,
+                    lambda params: log_messages.append(params["message"]),
+                )
+
+                ls_session.notify_visible_documents({"uris": [visible]})
+                for uri in [*background, visible]:
+                    ls_session.notify_did_open(
+                        {
+                            "textDocument": {
+                                "uri": uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": CONTENTS,
+                            }
+                        }
+                    )
+
+                # Wait to receive the diagnostics of all documents.
+                done.wait(TIMEOUT_SECONDS)
+
+            # The visible document is linted before the queued background documents.
+            self.assertEqual(len(published), len(background) + 1)
+            self.assertLess(published.index(visible), published.index(background[-1]))
+            self.assertTrue(
+                any("process slots are in use" in message for message in log_messages)
+            )
+            self.assertTrue(
+                any("process queue drained" in message for message in log_messages)
+            )
+
+    def test_shared_server(self):
+        script = PROJECT_ROOT / "bundled" / "tool" / "server.py"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "module.py")
+            with open(path, "w") as fp:
+                fp.write(CONTENTS)
+            uri = utils.as_uri(path)
+            socket_path = os.path.join(directory, "server.sock")
+
+            shared_server = subprocess.Popen(
+                [
+                    sys.executable,
+                    os.fspath(script),
+                    "--shared",
+                    socket_path,
+                    "--idle-timeout",
+                    "1",
+                    "--",
+                    sys.executable,
+                    os.fspath(script),
+                ]
+            )
+            try:
+                deadline = time.monotonic() + TIMEOUT_SECONDS
+                while not os.path.exists(socket_path):
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.05)
+
+                with session.LspSession(
+                    cwd=os.getcwd(), script=script, socket_path=socket_path
+                ) as first, session.LspSession(
+                    cwd=os.getcwd(), script=script, socket_path=socket_path
+                ) as second:
+                    published = {}
+                    events = {}
+                    for name, ls_session in (("first", first), ("second", second)):
+                        capabilities = {}
+                        ls_session.initialize(
+                            defaults.VSCODE_DEFAULT_INITIALIZE,
+                            process_server_capabilities=capabilities.update,
+                        )
+                        self.assertIn("capabilities", capabilities)
+
+                        events[name] = Event()
+
+                        def _handler(params, name=name):
+                            published[name] = params["diagnostics"]
+                            events[name].set()
+
+                        ls_session.set_notification_callback(
+                            session.PUBLISH_DIAGNOSTICS, _handler
+                        )
+
+                    first.notify_did_open(
+                        {
+                            "textDocument": {
+                                "uri": uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": CONTENTS,
+                            }
+                        }
+                    )
+                    self.assertTrue(events["first"].wait(TIMEOUT_SECONDS))
+
+                    # The second window's contents replace the first window's, and
+                    # their diagnostics only go to the second window.
+                    events["first"].clear()
+                    second.notify_did_open(
+                        {
+                            "textDocument": {
+                                "uri": uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": "import sys\n\nx  =  1\n",
+                            }
+                        }
+                    )
+                    self.assertTrue(events["second"].wait(TIMEOUT_SECONDS))
+                    self.assertEqual(
+                        [diagnostic["code"] for diagnostic in published["second"]],
+                        ["F401"],
+                    )
+                    self.assertFalse(events["first"].wait(1))
+
+                    # Changing the document in the first window restores its contents.
+                    events["second"].clear()
+                    first.notify_did_change(
+                        {
+                            "textDocument": {"uri": uri, "version": 2},
+                            "contentChanges": [{"text": "import os\nimport sys\n"}],
+                        }
+                    )
+                    self.assertTrue(events["first"].wait(TIMEOUT_SECONDS))
+                    self.assertEqual(
+                        [diagnostic["code"] for diagnostic in published["first"]],
+                        ["F401", "F401"],
+                    )
+                    self.assertFalse(events["second"].wait(1))
+
+                    # Requests from the second window run against its own contents.
+                    text_edits = second.text_document_formatting(
+                        {
+                            "textDocument": {"uri": uri},
+                            "options": {"tabSize": 4, "insertSpaces": True},
+                        }
+                    ).result(timeout=TIMEOUT_SECONDS)
+                    text = "import sys\n\nx  =  1\n"
+                    for text_edit in reversed(text_edits):
+                        text = edits.apply_change(
+                            text,
+                            {"range": text_edit["range"], "text": text_edit["newText"]},
+                        )
+                    self.assertEqual(text, "import sys\n\nx = 1\n")
+
+                # The shared server shuts down once both windows disconnected.
+                self.assertEqual(shared_server.wait(TIMEOUT_SECONDS), 0)
+                self.assertFalse(os.path.exists(socket_path))
+            finally:
+                shared_server.kill()
+                shared_server.wait()